@@ -2,16 +2,37 @@
 
 // Input
 uniform sampler2D noise_texture; 
-uniform vec4 seeds[100]; // Array of seeds (max 100 seeds), where seeds[i].xy is position, seeds[i].z is weight, and seeds[i].w is noisiness
-uniform int seed_count; // Actual number of seeds
 uniform float noise_size;
 uniform float noise_multiplier;
-uniform ivec2 corner_coord;
+uniform ivec2 output_dimensions; // Width and height of each chunk
+uniform int tiles_per_row; // Number of workgroups along x. Each workgroup is one tile of the seed binning
+uniform int tiles_per_chunk; // Number of workgroups per chunk. gl_WorkGroupID.z is the chunk being generated
 
 layout(local_size_x = 16, local_size_y = 16) in;
 
-// Output
-layout(r32f, binding = 0) writeonly uniform image2D output_image;
+// Seeds, where seeds[i].xy is position, seeds[i].z is weight, and seeds[i].w is the value written for the region
+layout(std430, binding = 1) readonly buffer seed_buffer {
+    vec4 seeds[];
+};
+
+// Candidate seeds of tile t are tile_seeds[tile_offsets[t]] up to (but excluding) tile_seeds[tile_offsets[t + 1]]
+layout(std430, binding = 2) readonly buffer tile_offset_buffer {
+    int tile_offsets[];
+};
+
+layout(std430, binding = 3) readonly buffer tile_seed_buffer {
+    int tile_seeds[];
+};
+
+// Corner of each chunk in world coordinates
+layout(std430, binding = 4) readonly buffer chunk_corner_buffer {
+    ivec2 chunk_corners[];
+};
+
+// Output, one row-major width x height block per chunk
+layout(std430, binding = 0) writeonly buffer output_buffer {
+    float output_values[];
+};
 
 float distance_to_seed(vec2 frag_coord, vec2 seed_pos, float weight) {
     vec2 diff = frag_coord - seed_pos;
@@ -20,12 +41,24 @@ float distance_to_seed(vec2 frag_coord, vec2 seed_pos, float weight) {
     return sqrt(dot(diff, diff)) * (weight + noise_value * noise_multiplier);
 }
 
+int get_output_index(ivec2 pixel_coord) {
+    return (int(gl_WorkGroupID.z) * output_dimensions.y + pixel_coord.y) * output_dimensions.x + pixel_coord.x;
+}
+
 void real_main() {
+    ivec2 pixel_coord = ivec2(gl_GlobalInvocationID.xy);
+    if (pixel_coord.x >= output_dimensions.x || pixel_coord.y >= output_dimensions.y) {
+        return;
+    }
+
     float min_distance = 1e9; // Arbitrarily large number
     int seed_index = -1; // Index of the closest seed
-    vec2 frag_coord = vec2(gl_GlobalInvocationID.xy) + vec2(corner_coord);
+    int chunk = int(gl_WorkGroupID.z);
+    vec2 frag_coord = vec2(pixel_coord) + vec2(chunk_corners[chunk]);
+    int tile = chunk * tiles_per_chunk + int(gl_WorkGroupID.y) * tiles_per_row + int(gl_WorkGroupID.x);
     
-    for (int i = 0; i < seed_count; ++i) {
+    for (int candidate = tile_offsets[tile]; candidate < tile_offsets[tile + 1]; ++candidate) {
+        int i = tile_seeds[candidate];
         float distance = distance_to_seed(frag_coord, seeds[i].xy, seeds[i].z);
         if (distance < min_distance) {
             min_distance = distance;
@@ -33,12 +66,17 @@ void real_main() {
         }
     }
 
-    imageStore(output_image, ivec2(gl_GlobalInvocationID.xy), vec4(float(seeds[seed_index].w), 0.0, 0.0, 0.0));
+    output_values[get_output_index(pixel_coord)] = seeds[seed_index].w;
 }
 
 void test_main() {
+    ivec2 pixel_coord = ivec2(gl_GlobalInvocationID.xy);
+    if (pixel_coord.x >= output_dimensions.x || pixel_coord.y >= output_dimensions.y) {
+        return;
+    }
+
     float noise_value = texture(noise_texture, gl_GlobalInvocationID.xy / noise_size).r;
-    imageStore(output_image, ivec2(gl_GlobalInvocationID.xy), vec4(noise_value, noise_value, noise_value, 1.0));
+    output_values[get_output_index(pixel_coord)] = noise_value;
 }
 
 void main() {
@@ -0,0 +1,13 @@
+#version 330 core
+
+in vec2 frag_uv;
+
+uniform sampler2D overlay;
+
+out vec4 out_color;
+
+void main()
+{
+    // The first row of the image is its top, but texture coordinates start at the bottom
+    out_color = texture(overlay, vec2(frag_uv.x, 1.0 - frag_uv.y));
+}
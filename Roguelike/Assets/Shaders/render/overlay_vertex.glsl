@@ -0,0 +1,13 @@
+#version 330 core
+
+// Notes: use snake_case whenever possible
+
+layout(location = 0) in vec2 in_position; // Unit quad covering the viewport the overlay is drawn into
+
+out vec2 frag_uv;
+
+void main()
+{
+    gl_Position = vec4(in_position, 0.0, 1.0);
+    frag_uv = (in_position + 1.0) / 2.0;
+}
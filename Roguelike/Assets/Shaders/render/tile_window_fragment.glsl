@@ -0,0 +1,58 @@
+#version 330
+
+in vec2 frag_coord;
+out vec4 out_color;
+
+uniform sampler2D spritesheet;
+uniform sampler2D tile_indices;               // Wraps around: tile (x, y) of the window is at texel ((window_origin + (x, y)) mod window_dimensions)
+uniform ivec2 view_offset_in_pixels;          // Position of the bottom left pixel of the display in the window
+uniform ivec2 window_dimensions_in_tiles;
+uniform ivec2 window_origin_in_texels;
+uniform ivec2 window_origin_in_chunk;         // Position of the window's first tile in its chunk
+uniform int chunk_size_in_tiles;
+uniform ivec2 spritesheet_dimensions_in_tiles;
+uniform ivec2 tile_dimensions_in_pixels;
+uniform int show_grid_lines;
+uniform int show_chunk_lines;
+
+void main() {
+    // Every value below is non-negative, so integer division and remainders behave
+    ivec2 window_pixel_coord = ivec2(gl_FragCoord.xy) + view_offset_in_pixels;
+    ivec2 window_tile_pos = window_pixel_coord / tile_dimensions_in_pixels;
+    ivec2 pixel_in_tile = window_pixel_coord % tile_dimensions_in_pixels;
+
+    if (window_tile_pos.x >= window_dimensions_in_tiles.x || window_tile_pos.y >= window_dimensions_in_tiles.y) {
+        out_color = vec4(0.0);
+        return;
+    }
+
+    ivec2 texel_coord = (window_origin_in_texels + window_tile_pos) % window_dimensions_in_tiles;
+    int tile_index = int(texelFetch(tile_indices, texel_coord, 0).r);
+
+    if (tile_index >= 0) {
+        ivec2 spritesheet_tile_coord = ivec2(tile_index % spritesheet_dimensions_in_tiles.x,
+                                                tile_index / spritesheet_dimensions_in_tiles.x);
+
+        ivec2 spritesheet_corner_pixel_coord = spritesheet_tile_coord * tile_dimensions_in_pixels;
+
+        // Individual tiles are "upside down" in the spritesheet
+        ivec2 pixel_offset = ivec2(pixel_in_tile.x, tile_dimensions_in_pixels.y - 1 - pixel_in_tile.y);
+
+        ivec2 spritesheet_pixel_coord = spritesheet_corner_pixel_coord + pixel_offset;
+
+        // Convert to UV coordinates for sampling
+        vec2 spritesheet_uv = (vec2(spritesheet_pixel_coord) + vec2(0.5)) / vec2(spritesheet_dimensions_in_tiles * tile_dimensions_in_pixels);
+
+        out_color = texture(spritesheet, spritesheet_uv);
+    } else {
+        out_color = vec4(0.0);
+    }
+
+    if (show_grid_lines == 1 && tile_dimensions_in_pixels.x >= 8 && (pixel_in_tile.x == 0 || pixel_in_tile.y == 0)) {
+        out_color = vec4(0.5, 0.5, 0.5, 1);
+    }
+    ivec2 tile_in_chunk = (window_origin_in_chunk + window_tile_pos) % chunk_size_in_tiles;
+    if (show_chunk_lines == 1 && ((tile_in_chunk.x == 0 && pixel_in_tile.x == 0) || (tile_in_chunk.y == 0 && pixel_in_tile.y == 0))) {
+        out_color = vec4(1.0);
+    }
+}
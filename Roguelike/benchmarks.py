@@ -0,0 +1,497 @@
+from generator_resources import GeneratorResources
+from noisy_voronoi import noisy_voronoi_batch, BACKEND_CPU, BACKEND_GPU
+from pathfinding import HierarchicalPathfinder
+from sprite_map import SpriteMap
+import argparse
+import diamond_square
+import json
+import numpy as np
+import platform
+import random
+import terrain
+import terrain_generator
+import time
+
+# Notes: every benchmark uses fixed seeds so that runs are comparable
+
+_baseline_filename = 'Assets/References/benchmark_baseline.json'
+
+
+def _create_generation_inputs(chunk_count, size, seeds_per_region=4, region_size=8192, rng_seed=42):
+    '''Noise plus one seed table per chunk, laid out like generate_seeds: seeds_per_region seeds in each of 5x5 regions.'''
+    rng = np.random.default_rng(rng_seed)
+    noise = rng.random((1024, 1024), dtype=np.float32)
+    chunks_per_row = int(np.ceil(np.sqrt(chunk_count)))
+    origins = [((i % chunks_per_row) * size, (i // chunks_per_row) * size) for i in range(chunk_count)]
+
+    seed_tables = []
+    for x, y in origins:
+        region_x = x - x % region_size
+        region_y = y - y % region_size
+        seed_count = 25 * seeds_per_region
+        seed_table = np.empty((seed_count, 4), dtype=np.float32)
+        seed_table[:, 0] = rng.uniform(region_x - 2 * region_size, region_x + 3 * region_size, seed_count)
+        seed_table[:, 1] = rng.uniform(region_y - 2 * region_size, region_y + 3 * region_size, seed_count)
+        seed_table[:, 2] = rng.integers(1, 6, seed_count)
+        seed_table[:, 3] = rng.integers(0, 9, seed_count)
+        seed_tables.append(seed_table)
+    return noise, seed_tables, origins
+
+
+def benchmark_chunk_generation(backend, chunk_count=16, size=512):
+    '''Chunks per second when generating chunk_count chunks one call at a time and in a single batch.'''
+    noise, seed_tables, origins = _create_generation_inputs(chunk_count, size)
+    resources = GeneratorResources().acquire()
+    resources.set_noise(noise, 'benchmark')
+
+    # Warm up shader compilation and allocations
+    noisy_voronoi_batch(noise, seed_tables[:1], origins[:1], size, size, backend=backend, resources=resources)
+    warm_up_bytes = resources.uploaded_bytes
+
+    start = time.perf_counter()
+    for seeds, origin in zip(seed_tables, origins):
+        noisy_voronoi_batch(noise, [seeds], [origin], size, size, backend=backend, resources=resources)
+    per_chunk_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    noisy_voronoi_batch(noise, seed_tables, origins, size, size, backend=backend, resources=resources)
+    batch_seconds = time.perf_counter() - start
+
+    uploaded_bytes_per_chunk = (resources.uploaded_bytes - warm_up_bytes) / (2 * chunk_count)
+    resources.release()
+
+    return {
+        'per_chunk_chunks_per_second': chunk_count / per_chunk_seconds,
+        'batch_chunks_per_second': chunk_count / batch_seconds,
+        'uploaded_bytes_per_chunk': uploaded_bytes_per_chunk
+    }
+
+
+def benchmark_seed_generation(neighbourhoods=256, rng_seed=42):
+    '''Neighbourhoods per second for generate_seeds (with a cold cache) and for one generate_seeds_array call.'''
+    spritesheet = SpriteMap('Terrain')
+    rng = np.random.default_rng(rng_seed)
+    xs = rng.integers(-1 << 30, 1 << 30, neighbourhoods)
+    ys = rng.integers(-1 << 30, 1 << 30, neighbourhoods)
+
+    terrain_generator._seed_cache.clear()
+    start = time.perf_counter()
+    for x, y in zip(xs, ys):
+        terrain_generator.generate_seeds(spritesheet, int(x), int(y))
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    terrain_generator.generate_seeds_array(spritesheet, xs, ys)
+    array_seconds = time.perf_counter() - start
+
+    return {
+        'scalar_neighbourhoods_per_second': neighbourhoods / scalar_seconds,
+        'array_neighbourhoods_per_second': neighbourhoods / array_seconds
+    }
+
+
+class _PassabilityGrid:
+    '''The part of World that HierarchicalPathfinder uses, over a fixed passability array with its corner at (0, 0).'''
+
+    def __init__(self, passable):
+        self.passable = passable
+
+    def get_passability(self, x0, y0, x1, y1):
+        height, width = self.passable.shape
+        passable = np.zeros((y1 - y0, x1 - x0), dtype=bool)
+        left, top, right, bottom = max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)
+        if left < right and top < bottom:
+            passable[top - y0:bottom - y0, left - x0:right - x0] = self.passable[top:bottom, left:right]
+        return passable
+
+    def is_area_resident(self, x0, y0, x1, y1):
+        return True
+
+
+def _create_passability(size, chunk_size, region_size=128, impassable=('granite', 'wall'), rng_seed=42):
+    '''
+    Passability of a size x size area of terrain generated by the CPU backend. The configured regions are thousands of
+    tiles across, so the seeds are laid out like generate_seeds with region_size regions instead, to give paths
+    obstacles to route around.
+    '''
+    names = SpriteMap('Terrain')
+    rng = np.random.default_rng(rng_seed)
+    seed_count = 4 * (size // region_size + 4) ** 2
+    seeds = np.empty((seed_count, 4), dtype=np.float32)
+    seeds[:, 0] = rng.uniform(-2 * region_size, size + 2 * region_size, seed_count)
+    seeds[:, 1] = rng.uniform(-2 * region_size, size + 2 * region_size, seed_count)
+    seeds[:, 2] = rng.integers(1, 6, seed_count)
+    seeds[:, 3] = rng.integers(0, len(names.sheet_map), seed_count)
+
+    origins = [(x, y) for y in range(0, size, chunk_size) for x in range(0, size, chunk_size)]
+    noise = diamond_square.generate_noise(1024, 5, 1, 45)
+    chunks = noisy_voronoi_batch(noise, [seeds] * len(origins), origins, chunk_size, chunk_size, backend=BACKEND_CPU)
+
+    terrain_types = terrain.Terrain(names)
+    for name in impassable:
+        terrain_types.passable[names.get_index(name)] = False
+
+    passable = np.zeros((size, size), dtype=bool)
+    for (x, y), values in zip(origins, chunks):
+        passable[y:y + chunk_size, x:x + chunk_size] = terrain_types.get_passability(values)
+    return passable
+
+
+def benchmark_pathfinding(size=1024, chunk_size=256, distances=(32, 128, 512), paths=20, cluster_size=64, warm_rounds=5, rng_seed=42):
+    '''
+    Paths per second between passable tiles about distance tiles apart (Manhattan) on generated terrain, with the
+    cluster cache cold (cleared before the paths) and warm (the same paths again, warm_rounds times, since a single
+    warm round is too short to time reliably). paths_found counts the paths that exist, so that a run that finds none
+    cannot pass for a fast one.
+    '''
+    passable = _create_passability(size, chunk_size)
+    passable_ys, passable_xs = np.nonzero(passable)
+    pathfinder = HierarchicalPathfinder(_PassabilityGrid(passable), cluster_size)
+    rng = np.random.default_rng(rng_seed)
+
+    results = {}
+    for distance in distances:
+        pairs = []
+        while len(pairs) < paths:
+            i = rng.integers(len(passable_xs))
+            start = (int(passable_xs[i]), int(passable_ys[i]))
+            dx = int(rng.integers(-distance, distance + 1))
+            dy = (distance - abs(dx)) * int(rng.choice((-1, 1)))
+            goal = (start[0] + dx, start[1] + dy)
+            if 0 <= goal[0] < size and 0 <= goal[1] < size and passable[goal[1], goal[0]]:
+                pairs.append((start, goal))
+
+        pathfinder.clear()
+        start_time = time.perf_counter()
+        found = sum(pathfinder.find_path(start, goal) is not None for start, goal in pairs)
+        cold_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        for _ in range(warm_rounds):
+            for start, goal in pairs:
+                pathfinder.find_path(start, goal)
+        warm_seconds = (time.perf_counter() - start_time) / warm_rounds
+
+        results[distance] = {
+            'cold_paths_per_second': paths / cold_seconds,
+            'warm_paths_per_second': paths / warm_seconds,
+            'paths_found': found
+        }
+    return results
+
+
+def _create_headless_world(viewport_size):
+    '''A HeadlessWorld whose chunk store is switched off, so that chunks missing from memory are always generated.'''
+    from headless import HeadlessWorld
+    headless_world = HeadlessWorld(viewport_size)
+    if headless_world.world.chunk_store is not None:
+        headless_world.world.chunk_store.stop()
+        headless_world.world.chunk_store = None
+    return headless_world
+
+
+def benchmark_chunk_residency(lookups=100000, misses=4):
+    '''TerrainChunk.get_or_create calls per second when the chunk is resident (hit) and when it has to be generated (miss).'''
+    from terrain_chunk import TerrainChunk
+    headless_world = _create_headless_world((64, 64))
+    world = headless_world.world
+    size = world.terrain_chunk_size
+    resident_origins = list(world.terrain_chunks_by_origin)
+
+    start = time.perf_counter()
+    for i in range(lookups):
+        TerrainChunk.get_or_create(*resident_origins[i % len(resident_origins)], size, world)
+    hit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(misses):
+        TerrainChunk.get_or_create(size * (1000 + i), size * 1000, size, world)
+    miss_seconds = time.perf_counter() - start
+
+    headless_world.cleanup()
+    return {
+        'hit_lookups_per_second': lookups / hit_seconds,
+        'miss_chunks_per_second': misses / miss_seconds
+    }
+
+
+def benchmark_passability(queries=100000, batch_size=1000, rng_seed=42):
+    '''
+    World.is_passable_at calls per second, and positions per second for World.are_passable, both in one call over all
+    queries and in calls of batch_size positions, over the relevant chunks. Raises if the array path is slower than
+    the scalar one or disagrees with it.
+    '''
+    headless_world = _create_headless_world((640, 480))
+    world = headless_world.world
+    origins = np.array(list(world.terrain_chunks_by_origin))
+    rng = np.random.default_rng(rng_seed)
+    xs = rng.integers(origins[:, 0].min(), origins[:, 0].max() + world.terrain_chunk_size, queries)
+    ys = rng.integers(origins[:, 1].min(), origins[:, 1].max() + world.terrain_chunk_size, queries)
+
+    start = time.perf_counter()
+    scalar_passable = [world.is_passable_at(x, y) for x, y in zip(xs.tolist(), ys.tolist())]
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    array_passable = world.are_passable(xs, ys)
+    array_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for batch_start in range(0, queries, batch_size):
+        world.are_passable(xs[batch_start:batch_start + batch_size], ys[batch_start:batch_start + batch_size])
+    batched_seconds = time.perf_counter() - start
+
+    headless_world.cleanup()
+    if not np.array_equal(array_passable, scalar_passable):
+        raise RuntimeError('World.are_passable disagrees with World.is_passable_at')
+    if array_seconds > scalar_seconds or batched_seconds > scalar_seconds:
+        raise RuntimeError(f'World.are_passable is slower than World.is_passable_at: {queries / array_seconds:.0f} '
+                           f'(batches of {batch_size}: {queries / batched_seconds:.0f}) vs {queries / scalar_seconds:.0f} positions per second')
+    return {
+        'is_passable_at_per_second': queries / scalar_seconds,
+        'are_passable_positions_per_second': queries / array_seconds,
+        'are_passable_batched_positions_per_second': queries / batched_seconds
+    }
+
+
+def benchmark_lru_cache(operations=200000, capacity=1024, key_range=2048, rng_seed=42):
+    '''Get-or-put operations per second on an LRUCache that holds half of the keys in use.'''
+    from lru_cache import LRUCache
+    keys = np.random.default_rng(rng_seed).integers(0, key_range, operations).tolist()
+    cache = LRUCache(capacity)
+
+    start = time.perf_counter()
+    for key in keys:
+        if cache.get(key) is None:
+            cache.put(key, key)
+    seconds = time.perf_counter() - start
+
+    return {
+        'operations_per_second': operations / seconds,
+        'hit_rate': cache.hits / operations
+    }
+
+
+def benchmark_configuration(reads=200000):
+    '''configuration.get calls per second, and reads per second of the value of a configuration.Setting.'''
+    import configuration
+    key = 'terrain.chunk_size'
+    setting = configuration.Setting(key, 512)
+
+    start = time.perf_counter()
+    for _ in range(reads):
+        configuration.get(key, 512)
+    get_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(reads):
+        setting.value
+    setting_seconds = time.perf_counter() - start
+
+    configuration.unsubscribe(key, setting._update)
+    return {
+        'get_per_second': reads / get_seconds,
+        'setting_reads_per_second': reads / setting_seconds
+    }
+
+
+def benchmark_l_system(iterations=2000, rng_seed=42):
+    '''LSystem.iterate calls per second on the resource rules of L_system.main.'''
+    from L_system import LSystem
+    ruleset = {'resources': [('farmland(0.9) minerals(0.7)', 1)],
+               'farmland': [('wheat(0.5) flax(0.5) barley(0.5) hops(0.5)', 1)],
+               'minerals': [('iron(0.9) copper(0.1) silver(0.01) gold(0.001)', 1)]
+               }
+    lsystem = LSystem(ruleset)
+    rng = random.Random(rng_seed)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        lsystem.iterate('resources', max_iterations=3, rng=rng)
+    seconds = time.perf_counter() - start
+
+    return {'iterations_per_second': iterations / seconds}
+
+
+def benchmark_noise(size=1024, count=3):
+    '''Noise textures per second from the NumPy diamond-square generator, and from the native one when its DLL loads.'''
+    import native_code
+    results = {}
+    start = time.perf_counter()
+    for i in range(count):
+        diamond_square.generate_noise(size, 5, 1, 45 + i)
+    results['numpy_textures_per_second'] = count / (time.perf_counter() - start)
+
+    if native_code.dll is not None:
+        start = time.perf_counter()
+        for i in range(count):
+            native_code.generate_noise(size, 5, 1, 45 + i)
+        results['native_textures_per_second'] = count / (time.perf_counter() - start)
+    return results
+
+
+def _flatten_metrics(results, prefix=''):
+    metrics = {}
+    for name, value in results.items():
+        key = f'{prefix}{name}'
+        if isinstance(value, dict):
+            metrics.update(_flatten_metrics(value, f'{key}.'))
+        else:
+            metrics[key] = float(value)
+    return metrics
+
+
+# Benchmarks use fixed seeds, so these metrics must match the baseline exactly; a change means different work was timed
+_exact_suffixes = ('_found',)
+
+
+def _is_better(metric, value, other):
+    return value < other if metric.endswith('_bytes_per_chunk') else value > other
+
+
+def run_benchmarks(benchmarks, repeats=3):
+    '''
+    Run each (name, function) pair repeats times and keep the best value of every metric, since slower runs only add
+    noise from the rest of the machine. Returns {name: {metric: value}} with nested results flattened to dotted names.
+    '''
+    results = {}
+    for name, function in benchmarks:
+        best = {}
+        for _ in range(repeats):
+            for metric, value in _flatten_metrics(function()).items():
+                if metric not in best or _is_better(metric, value, best[metric]):
+                    best[metric] = value
+        results[name] = best
+    return results
+
+
+def merge_results(results, other, keep_better):
+    '''Combine two run_benchmarks results metric by metric, keeping the better value if keep_better, else the worse.'''
+    merged = {}
+    for name in list(results) + [name for name in other if name not in results]:
+        metrics = dict(results.get(name, {}))
+        for metric, value in other.get(name, {}).items():
+            if metric not in metrics or _is_better(metric, value, metrics[metric]) == keep_better:
+                metrics[metric] = value
+        merged[name] = metrics
+    return merged
+
+
+def compare_results(results, baseline, threshold):
+    '''
+    Compare every rate (*_per_second), size (*_bytes_per_chunk) and count (*_found) metric found in both results and
+    baseline. Returns (benchmark, metric, baseline value, value, relative change) tuples, and the subset that got worse
+    by more than threshold, a fraction. Counts regress on any change, since they show whether the same work was done.
+    '''
+    comparisons = []
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            baseline_value = baseline.get(name, {}).get(metric)
+            if baseline_value is None or not metric.endswith(('_per_second', '_bytes_per_chunk') + _exact_suffixes):
+                continue
+            if metric.endswith(_exact_suffixes):
+                change = 0.0 if value == baseline_value else (value - baseline_value) / max(abs(baseline_value), 1)
+                comparison = (name, metric, baseline_value, value, change)
+                comparisons.append(comparison)
+                if value != baseline_value:
+                    regressions.append(comparison)
+                continue
+            if baseline_value == 0:
+                continue
+            change = (value - baseline_value) / baseline_value
+            comparison = (name, metric, baseline_value, value, change)
+            comparisons.append(comparison)
+            worse = -change if metric.endswith('_per_second') else change
+            if worse > threshold:
+                regressions.append(comparison)
+    return comparisons, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the Roguelike benchmarks.')
+    parser.add_argument('--backend', choices=[BACKEND_CPU, BACKEND_GPU], default=BACKEND_CPU)
+    parser.add_argument('--chunks', type=int, default=16)
+    parser.add_argument('--size', type=int, default=512)
+    parser.add_argument('--neighbourhoods', type=int, default=256)
+    parser.add_argument('--paths', type=int, default=20)
+    parser.add_argument('--only', nargs='+', help='names of the benchmarks to run')
+    parser.add_argument('--repeats', type=int, default=3, help='runs of each benchmark; the best one counts')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', default=_baseline_filename, help='JSON file of earlier results to compare against; an empty name skips the comparison')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results to the baseline file instead of comparing')
+    parser.add_argument('--baseline-runs', type=int, default=3, help='runs of the whole suite for --update-baseline; the worst value of every metric is stored')
+    parser.add_argument('--confirm-runs', type=int, default=2, help='extra runs of a regressed benchmark before its regressions count')
+    parser.add_argument('--threshold', type=float, default=0.25, help='fraction a metric may get worse before it counts as a regression')
+    arguments = parser.parse_args()
+
+    if arguments.backend == BACKEND_GPU:
+        import gpu
+        gpu.initialize_opengl_context(64, 64)
+
+    benchmarks = [
+        (f'chunk_generation_{arguments.backend}', lambda: benchmark_chunk_generation(arguments.backend, arguments.chunks, arguments.size)),
+        ('seed_generation', lambda: benchmark_seed_generation(arguments.neighbourhoods)),
+        ('chunk_residency', benchmark_chunk_residency),
+        ('passability', benchmark_passability),
+        ('pathfinding', lambda: benchmark_pathfinding(paths=arguments.paths)),
+        ('lru_cache', benchmark_lru_cache),
+        ('configuration', benchmark_configuration),
+        ('l_system', benchmark_l_system),
+        ('noise', benchmark_noise)
+    ]
+    if arguments.only:
+        unknown = set(arguments.only) - {name for name, _ in benchmarks}
+        if unknown:
+            raise SystemExit(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+        benchmarks = [(name, function) for name, function in benchmarks if name in arguments.only]
+
+    results = run_benchmarks(benchmarks, arguments.repeats)
+    if arguments.baseline and arguments.update_baseline:
+        # Timings on a busy machine vary by tens of percent between runs. The baseline holds the worst of several
+        # runs, so that an ordinary slow run does not count as a regression.
+        for _ in range(arguments.baseline_runs - 1):
+            results = merge_results(results, run_benchmarks(benchmarks, arguments.repeats), keep_better=False)
+    for name, metrics in results.items():
+        print(f'{name}:')
+        for metric, value in metrics.items():
+            print(f'  {metric}: {value:.2f}')
+
+    document = {
+        'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(), 'system': platform.system()},
+        'results': results
+    }
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(document, file, indent=2, sort_keys=True)
+
+    if arguments.baseline and arguments.update_baseline:
+        with open(arguments.baseline, 'w') as file:
+            json.dump(document, file, indent=2, sort_keys=True)
+    elif arguments.baseline:
+        try:
+            with open(arguments.baseline, 'r') as file:
+                baseline = json.load(file)['results']
+        except FileNotFoundError:
+            raise SystemExit(f'No baseline at {arguments.baseline}; write one with --update-baseline')
+        comparisons, regressions = compare_results(results, baseline, arguments.threshold)
+
+        # A regression only counts if it is still there after running its benchmark again
+        for _ in range(arguments.confirm_runs):
+            if not regressions:
+                break
+            regressed = {name for name, _, _, _, _ in regressions}
+            print(f'confirming regressions of {", ".join(sorted(regressed))}')
+            rerun = run_benchmarks([(name, function) for name, function in benchmarks if name in regressed], arguments.repeats)
+            results = merge_results(results, rerun, keep_better=True)
+            comparisons, regressions = compare_results(results, baseline, arguments.threshold)
+        print(f'compared with {arguments.baseline}:')
+        for name, metric, baseline_value, value, change in comparisons:
+            flag = '  REGRESSION' if (name, metric, baseline_value, value, change) in regressions else ''
+            print(f'  {name}.{metric}: {baseline_value:.2f} -> {value:.2f} ({change * 100:+.1f}%){flag}')
+        if regressions:
+            raise SystemExit(f'{len(regressions)} metrics regressed by more than {arguments.threshold * 100:.0f}%')
+
+
+if __name__ == '__main__':
+    main()
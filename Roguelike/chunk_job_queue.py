@@ -0,0 +1,198 @@
+from collections import deque
+import heapq
+import numpy as np
+import sys
+import threading
+import time
+import traceback
+
+
+class ChunkJobQueue:
+    '''
+    Priority queue of chunk origins waiting to be generated. generate_function takes a list of origins and returns one
+    result per origin. With threaded=True a worker thread runs the jobs; otherwise the owner calls process() from the
+    thread that owns the resources generation needs (the GL context for the GPU backend). A batch that raises is
+    retried up to max_attempts times in all; after that its origins are dropped and not queued again for
+    failure_cooldown seconds.
+    '''
+
+    def __init__(self, generate_function, threaded, batch_size=4, latency_history=256, max_attempts=3, failure_cooldown=5.0):
+        self.generate_function = generate_function
+        self.threaded = threaded
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.failure_cooldown = failure_cooldown
+
+        self._lock = threading.Condition()
+        self._heap = []                  # (priority, sequence, origin); stale entries are skipped when popped
+        self._pending = {}               # origin -> (priority, sequence, request time)
+        self._in_flight = set()
+        self._completed = deque()        # (origin, result)
+        self._completed_origins = set()  # Origins in _completed, which must not be queued again before they are collected
+        self._attempts = {}              # origin -> failed attempts so far
+        self._failed = {}                # origin -> time it was dropped after max_attempts
+        self._sequence = 0
+        self._running = True
+
+        self._latencies = deque(maxlen=latency_history)          # Request to completion, in seconds
+        self._generation_times = deque(maxlen=latency_history)   # Generation time per chunk, in seconds
+        self.completed_count = 0
+        self.cancelled_count = 0
+        self.failed_count = 0
+
+        self._worker = None
+        if threaded:
+            self._worker = threading.Thread(target=self._worker_loop, name='chunk-generation', daemon=True)
+            self._worker.start()
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            self._lock.notify_all()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def request(self, origin, priority):
+        '''Queue an origin for generation, or raise the priority of an already queued one. Lower priorities run first.'''
+        with self._lock:
+            self._request(origin, priority)
+            self._lock.notify()
+
+    def update(self, wanted):
+        '''
+        Replace the queued jobs with wanted, a dict of origin -> priority. Queued origins that are no longer wanted are
+        cancelled; jobs that are already running are left to finish.
+        '''
+        with self._lock:
+            for origin in [origin for origin in self._pending if origin not in wanted]:
+                del self._pending[origin]
+                self.cancelled_count += 1
+            if not self._pending:
+                self._heap.clear()
+            for origin, priority in wanted.items():
+                self._request(origin, priority)
+            self._lock.notify()
+
+    def cancel(self, origin):
+        with self._lock:
+            if self._pending.pop(origin, None) is not None:
+                self.cancelled_count += 1
+
+    def is_queued(self, origin):
+        with self._lock:
+            return origin in self._pending or origin in self._in_flight or origin in self._completed_origins
+
+    def has_work(self):
+        '''Whether any job is queued, running, or finished but not collected yet.'''
+        with self._lock:
+            return bool(self._pending or self._in_flight or self._completed)
+
+    def process(self, max_chunks):
+        '''Run up to max_chunks of the highest priority jobs on the calling thread.'''
+        jobs = self._take_jobs(max_chunks)
+        if jobs:
+            self._run_jobs(jobs)
+
+    def collect(self):
+        '''Return the (origin, result) pairs finished since the last call.'''
+        with self._lock:
+            completed = list(self._completed)
+            self._completed.clear()
+            self._completed_origins.clear()
+        return completed
+
+    def get_statistics(self):
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            generation_times = np.array(self._generation_times) * 1000
+            return {
+                'queue_depth': len(self._pending),
+                'in_flight': len(self._in_flight),
+                'completed': self.completed_count,
+                'cancelled': self.cancelled_count,
+                'failed': self.failed_count,
+                'latency_ms_mean': float(latencies.mean()) if len(latencies) else 0.0,
+                'latency_ms_p95': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+                'generation_ms_per_chunk': float(generation_times.mean()) if len(generation_times) else 0.0
+            }
+
+    def _request(self, origin, priority):
+        if origin in self._in_flight or origin in self._completed_origins:
+            return
+        failure_time = self._failed.get(origin)
+        if failure_time is not None:
+            if time.perf_counter() - failure_time < self.failure_cooldown:
+                return
+            del self._failed[origin]
+        current = self._pending.get(origin)
+        if current is not None and current[0] <= priority:
+            return
+        self._sequence += 1
+        request_time = current[2] if current is not None else time.perf_counter()
+        self._pending[origin] = (priority, self._sequence, request_time)
+        heapq.heappush(self._heap, (priority, self._sequence, origin))
+
+    def _take_jobs(self, max_chunks):
+        jobs = []
+        with self._lock:
+            while self._heap and len(jobs) < max_chunks:
+                priority, sequence, origin = heapq.heappop(self._heap)
+                current = self._pending.get(origin)
+                if current is None or current[1] != sequence:
+                    continue  # Cancelled or superseded by a higher priority request
+                del self._pending[origin]
+                self._in_flight.add(origin)
+                jobs.append((origin, priority, current[2]))
+        return jobs
+
+    def _run_jobs(self, jobs):
+        origins = [origin for origin, _, _ in jobs]
+        start = time.perf_counter()
+        try:
+            results = self.generate_function(origins)
+        except Exception:
+            # Keep going: an exception here must not stop the worker thread, or nothing is ever generated again
+            print(f'Generating chunks {origins} failed:', file=sys.stderr)
+            traceback.print_exc()
+            self._fail_jobs(jobs)
+            return
+
+        finish = time.perf_counter()
+        with self._lock:
+            self._in_flight.difference_update(origins)
+            for (origin, _, request_time), result in zip(jobs, results):
+                self._attempts.pop(origin, None)
+                self._completed.append((origin, result))
+                self._completed_origins.add(origin)
+                self._latencies.append(finish - request_time)
+                self._generation_times.append((finish - start) / len(jobs))
+            self.completed_count += len(jobs)
+
+    def _fail_jobs(self, jobs):
+        with self._lock:
+            for origin, priority, request_time in jobs:
+                self._in_flight.discard(origin)
+                attempts = self._attempts.get(origin, 0) + 1
+                if attempts < self.max_attempts:
+                    # Queued again as it was, keeping its request time for the latency statistics
+                    self._attempts[origin] = attempts
+                    if origin not in self._pending:
+                        self._sequence += 1
+                        self._pending[origin] = (priority, self._sequence, request_time)
+                        heapq.heappush(self._heap, (priority, self._sequence, origin))
+                else:
+                    self._attempts.pop(origin, None)
+                    self._failed[origin] = time.perf_counter()
+                    self.failed_count += 1
+
+    def _worker_loop(self):
+        while True:
+            with self._lock:
+                while self._running and not self._pending:
+                    self._lock.wait()
+                if not self._running:
+                    return
+            jobs = self._take_jobs(self.batch_size)
+            if jobs:
+                self._run_jobs(jobs)
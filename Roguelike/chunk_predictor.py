@@ -0,0 +1,95 @@
+from collections import deque
+import math
+import time
+
+
+class ChunkPredictor:
+    '''
+    Estimates the player's velocity from recently observed positions and predicts which chunks will become visible
+    while the player keeps moving in the same direction. Also keeps the hit rate of chunk residency: how often a chunk
+    had already been generated when it came into view.
+    '''
+
+    def __init__(self, window_seconds=0.25, lookahead_seconds=2.0, steps=8, heading_change_cosine=0.7):
+        self.window_seconds = window_seconds
+        self.lookahead_seconds = lookahead_seconds
+        self.steps = steps
+        self.heading_change_cosine = heading_change_cosine
+
+        self.samples = deque()  # (time, x, y)
+        self.velocity = (0.0, 0.0)
+        self.heading = None     # Unit vector, or None when standing still
+        self.predicted = set()
+        self.seen_predictions = set()  # Predicted origins that have been visible since they were predicted
+
+        self.heading_changes = 0
+        self.stale_predictions = 0
+        self.hits = 0
+        self.misses = 0
+
+    def observe(self, position, now=None):
+        '''Record the player's position and update the velocity estimate.'''
+        now = time.perf_counter() if now is None else now
+        if not self.samples or self.samples[-1][1:] != tuple(position):
+            self.samples.append((now, position[0], position[1]))
+
+            # A step against the current heading makes the older samples meaningless, so forget them right away
+            # instead of letting the average turn slowly
+            if self.heading is not None and len(self.samples) >= 2:
+                step_x = self.samples[-1][1] - self.samples[-2][1]
+                step_y = self.samples[-1][2] - self.samples[-2][2]
+                step_length = math.hypot(step_x, step_y)
+                if (step_x * self.heading[0] + step_y * self.heading[1]) < self.heading_change_cosine * step_length:
+                    while len(self.samples) > 2:
+                        self.samples.popleft()
+                    self.heading_changes += 1
+
+        while len(self.samples) > 1 and now - self.samples[0][0] > self.window_seconds:
+            self.samples.popleft()
+
+        oldest_time, oldest_x, oldest_y = self.samples[0]
+        latest_time, latest_x, latest_y = self.samples[-1]
+        elapsed = latest_time - oldest_time
+        if len(self.samples) < 2 or elapsed <= 0 or now - latest_time > self.window_seconds:
+            self.velocity = (0.0, 0.0)
+        else:
+            self.velocity = ((latest_x - oldest_x) / elapsed, (latest_y - oldest_y) / elapsed)
+
+        speed = math.hypot(*self.velocity)
+        self.heading = (self.velocity[0] / speed, self.velocity[1] / speed) if speed > 0 else None
+
+    def predict(self, position, origins_around):
+        '''
+        Map the chunks expected to come into view to the number of seconds until they do. origins_around(position)
+        must return the origins of the chunks visible from a position.
+        '''
+        predictions = {}
+        if self.heading is not None:
+            for step in range(1, self.steps + 1):
+                seconds = self.lookahead_seconds * step / self.steps
+                predicted_position = (math.floor(position[0] + self.velocity[0] * seconds), math.floor(position[1] + self.velocity[1] * seconds))
+                for origin in origins_around(predicted_position):
+                    predictions.setdefault(origin, seconds)
+
+        # Predictions from the previous update that were dropped are cancelled by the caller. Only those that were never
+        # visible were wrong; the rest were dropped because the player reached them.
+        self.stale_predictions += len(self.predicted.difference(predictions, self.seen_predictions))
+        self.seen_predictions.intersection_update(predictions)
+        self.predicted = set(predictions)
+        return predictions
+
+    def record_visibility(self, visible_origins, newly_visible_count, already_resident_count):
+        self.seen_predictions.update(self.predicted.intersection(visible_origins))
+        self.hits += already_resident_count
+        self.misses += newly_visible_count - already_resident_count
+
+    def get_statistics(self):
+        seen = self.hits + self.misses
+        return {
+            'velocity': self.velocity,
+            'heading_changes': self.heading_changes,
+            'stale_predictions': self.stale_predictions,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / seen if seen else 0.0
+        }
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+
+
+class ChunkResidency:
+    '''
+    Resident terrain_chunks keyed by (world_x, world_y, size). Valid chunks are in use and never evicted; invalid
+    chunks are kept in least-recently-invalidated order and evicted, oldest first, while the memory of all resident
+    chunks exceeds byte_budget or there are more than max_invalid invalid chunks. Every operation is O(1) apart from
+    the evictions it triggers.
+
+    Chunks must provide cleanup() and get_memory_usage(), which counts both index arrays and GL textures.
+    '''
+
+    def __init__(self, byte_budget, max_invalid=None):
+        self.byte_budget = byte_budget
+        self.max_invalid = max_invalid
+        self._chunks = {}              # key -> chunk
+        self._memory = {}              # key -> bytes at the last touch or invalidation
+        self._invalid = OrderedDict()  # key -> None, oldest invalidation first
+        self.resident_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._chunks
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def lookup(self, key):
+        '''Return the chunk for key marked as valid, or None. Counts a hit or a miss.'''
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touch(key)
+        return chunk
+
+    def peek(self, key):
+        '''Return the chunk for key without changing its validity or the counters.'''
+        return self._chunks.get(key)
+
+    def touch(self, key):
+        '''Mark a resident chunk as valid.'''
+        self._invalid.pop(key, None)
+        self._update_memory(key)
+
+    def insert(self, key, chunk, valid=True):
+        '''Add a chunk, replacing (and cleaning up) any chunk already resident under key, then enforce the budget.'''
+        previous = self._chunks.get(key)
+        if previous is not None and previous is not chunk:
+            self._remove(key)
+        self._chunks[key] = chunk
+        self._memory[key] = 0
+        self._update_memory(key)
+        if valid:
+            self._invalid.pop(key, None)
+        else:
+            self._invalid[key] = None
+        self.evict()
+
+    def invalidate(self, key):
+        '''Mark a resident chunk as no longer in use so that it can be evicted. Invalidating twice only refreshes it.'''
+        if key not in self._chunks:
+            return
+        self._invalid[key] = None
+        self._invalid.move_to_end(key)
+        self._update_memory(key)
+        self.evict()
+
+    def is_valid(self, key):
+        return key in self._chunks and key not in self._invalid
+
+    def evict(self):
+        '''Evict invalid chunks, least recently invalidated first, until the limits are met.'''
+        while self._invalid and (self.resident_bytes > self.byte_budget or (self.max_invalid is not None and len(self._invalid) > self.max_invalid)):
+            key, _ = self._invalid.popitem(last=False)
+            self._remove(key)
+            self.evictions += 1
+
+    def clear(self):
+        for chunk in self._chunks.values():
+            chunk.cleanup()
+        self._chunks.clear()
+        self._memory.clear()
+        self._invalid.clear()
+        self.resident_bytes = 0
+
+    def values(self):
+        return self._chunks.values()
+
+    def get_statistics(self):
+        lookups = self.hits + self.misses
+        return {
+            'resident': len(self._chunks),
+            'invalid': len(self._invalid),
+            'resident_bytes': self.resident_bytes,
+            'bytes_per_chunk': self.resident_bytes / len(self._chunks) if self._chunks else 0.0,
+            'byte_budget': self.byte_budget,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions
+        }
+
+    def _update_memory(self, key):
+        memory = self._chunks[key].get_memory_usage()
+        self.resident_bytes += memory - self._memory[key]
+        self._memory[key] = memory
+
+    def _remove(self, key):
+        self._chunks.pop(key).cleanup()
+        self.resident_bytes -= self._memory.pop(key)
+        self._invalid.pop(key, None)
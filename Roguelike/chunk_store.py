@@ -0,0 +1,146 @@
+import configuration
+import hashlib
+import json
+import numpy as np
+import os
+import queue
+import sys
+import threading
+import traceback
+
+# Bump whenever the layout of the chunk files changes so that old stores are ignored
+_format_version = 2
+
+
+def get_generator_hash(noise, terrain_spritesheet, backend):
+    '''
+    Hash of everything that determines generated terrain: every world.generator.* setting, except that the backend is
+    the one actually generating (the backends may differ in a few tiles), the noise itself, which differs between the
+    native and the NumPy noise generators, and the terrain sprite indices, which are what is stored.
+    '''
+    generator = dict(configuration.get('world.generator', {}))
+    generator['backend'] = backend
+    parameters = {
+        'format_version': _format_version,
+        'generator': generator,
+        'terrain_indices': terrain_spritesheet.sheet_map,
+        'noise_size': noise.shape[0],
+        'noise': hashlib.sha1(np.ascontiguousarray(noise, dtype=np.float32).tobytes()).hexdigest()
+    }
+    return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class ChunkStore:
+    '''
+    Disk cache of generated terrain. Each chunk is a fixed-layout .npy file of tile indices that is memory-mapped
+    copy-on-write when read, so loading a chunk only costs a page-in. The files are written in dtype, which should be
+    the dtype of the terrain layer, so that chunks can be used as they are loaded. Chunks are written by a background
+    thread, and index.json lists the chunks that are complete on disk.
+    '''
+
+    def __init__(self, directory, generator_hash, dtype=np.int16):
+        self.directory = os.path.join(directory, generator_hash)
+        self.dtype = np.dtype(dtype)
+        os.makedirs(self.directory, exist_ok=True)
+        self._index_filename = os.path.join(self.directory, 'index.json')
+        self._lock = threading.Lock()
+        try:
+            with open(self._index_filename, 'r') as file:
+                self._index = set(tuple(key) for key in json.load(file))
+        except (FileNotFoundError, ValueError):
+            self._index = set()
+        self._queued = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.failed_writes = 0
+
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name='chunk-store-writer', daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        '''Finish pending writes and stop the writer thread.'''
+        if self._writer is not None:
+            self._write_queue.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def contains(self, x, y, size):
+        with self._lock:
+            return (x, y, size) in self._index
+
+    def get(self, x, y, size):
+        '''Return the stored tile indices of a chunk, or None if it has not been stored.'''
+        values = None
+        if self.contains(x, y, size):
+            try:
+                values = np.load(self._get_filename(x, y, size), mmap_mode='c')
+            except (FileNotFoundError, ValueError):
+                pass
+        # Called from the generation worker thread as well as the main thread
+        with self._lock:
+            if values is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return values
+
+    def put(self, x, y, size, values):
+        '''Queue a chunk to be written in the background.'''
+        key = (x, y, size)
+        with self._lock:
+            if key in self._index or key in self._queued:
+                return
+            self._queued.add(key)
+        self._write_queue.put((key, np.asarray(values).astype(self.dtype)))
+
+    def get_statistics(self):
+        with self._lock:
+            return {'stored': len(self._index), 'hits': self.hits, 'misses': self.misses, 'writes': self.writes,
+                    'failed_writes': self.failed_writes, 'pending_writes': self._write_queue.qsize()}
+
+    def _get_filename(self, x, y, size):
+        return os.path.join(self.directory, f'{x}_{y}_{size}.npy')
+
+    def _writer_loop(self):
+        index_is_stale = False
+        while True:
+            item = self._write_queue.get()
+            if item is not None:
+                key, values = item
+                filename = self._get_filename(*key)
+                try:
+                    with open(f'{filename}.tmp', 'wb') as file:
+                        np.save(file, values)
+                    os.replace(f'{filename}.tmp', filename)
+                except Exception:
+                    # The chunk is simply not stored, and may be queued again; later writes still go ahead
+                    print(f'Storing chunk {key} failed:', file=sys.stderr)
+                    traceback.print_exc()
+                    with self._lock:
+                        self._queued.discard(key)
+                        self.failed_writes += 1
+                else:
+                    with self._lock:
+                        self._index.add(key)
+                        self._queued.discard(key)
+                        self.writes += 1
+                    index_is_stale = True
+
+            # Only rewrite the index once the queue is drained so that bursts of chunks cost one index write
+            if index_is_stale and (item is None or self._write_queue.empty()):
+                with self._lock:
+                    index = sorted(self._index)
+                try:
+                    with open(f'{self._index_filename}.tmp', 'w') as file:
+                        json.dump(index, file)
+                    os.replace(f'{self._index_filename}.tmp', self._index_filename)
+                    index_is_stale = False
+                except Exception:
+                    print('Writing the chunk store index failed:', file=sys.stderr)
+                    traceback.print_exc()
+
+            if item is None:
+                return
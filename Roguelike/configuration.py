@@ -1,16 +1,86 @@
+import atexit
+import copy
 import json
+import os
+import threading
 
 _config = None
 _config_filename = "config.json"
 
+# Reads go through _snapshot, a flat copy of _config that is rebuilt after every change rather than updated, so get()
+# is a single dict lookup. Changes are written to disk in batches by a timer thread.
+_snapshot = None
+_lock = threading.RLock()
+_subscribers = {}   # key -> list of callbacks taking the new value
+_write_delay = 0.5  # Seconds that changes are collected before they are written
+_write_timer = None
+_dirty = False
+_missing = object()
+
+
+class Snapshot:
+    '''
+    Copy of the whole configuration at one version. values maps every dotted key, including the keys of nested
+    dictionaries, to its value. Its attributes cannot be reassigned, but values and the dicts and lists in it are
+    plain, unfrozen objects shared by every reader of this snapshot, so they must not be modified.
+    '''
+
+    __slots__ = ('values', 'version')
+
+    def __init__(self, config, version):
+        values = {}
+        _flatten(copy.deepcopy(config), '', values)
+        object.__setattr__(self, 'values', values)
+        object.__setattr__(self, 'version', version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Configuration snapshot attributes cannot be reassigned')
+
+    def get(self, key, default_value=None):
+        return self.values.get(key, default_value)
+
+
+class Setting:
+    '''
+    The value of one key, kept up to date as the configuration changes, so that frame code can read it as a plain
+    attribute: setting.value. convert, if given, is applied to every new value (e.g. int, or a function building a
+    lookup table).
+    '''
+
+    def __init__(self, key, default_value=None, convert=None):
+        self.key = key
+        self.default_value = default_value
+        self.convert = convert
+        self.value = None
+        self._update(get(key, default_value))
+        subscribe(key, self._update)
+
+    def _update(self, value):
+        if value is None:
+            value = self.default_value
+        self.value = value if self.convert is None or value is None else self.convert(value)
+
+
+def _flatten(value, prefix, values):
+    if prefix:
+        values[prefix] = value
+    if isinstance(value, dict):
+        for key, child in value.items():
+            _flatten(child, f'{prefix}.{key}' if prefix else key, values)
+
+
 def _load_or_create():
-    global _config
-    # Check if the configuration file exists
-    try:
-        with open(_config_filename, 'r') as file:
-            _config = json.load(file)
-    except FileNotFoundError:
-        create_default_config()
+    global _config, _snapshot
+    with _lock:
+        if _config is not None:
+            return
+        # Check if the configuration file exists
+        try:
+            with open(_config_filename, 'r') as file:
+                _config = json.load(file)
+        except FileNotFoundError:
+            create_default_config()
+        _snapshot = Snapshot(_config, 0)
 
 def create_default_config():
     global _config
@@ -18,32 +88,82 @@ def create_default_config():
         json.dump({}, file)
     _config = {}
 
+def snapshot():
+    '''The current Snapshot. It does not change; later changes produce a new one.'''
+    if _snapshot is None:
+        _load_or_create()
+    return _snapshot
+
 def get(key, default_value=None):
-    if _config is None:
+    if _snapshot is None:
         _load_or_create()
-    
-    parts = key.split(".")
-    curr_dict = _config
-    for part in parts:
-        if part not in curr_dict:
-            if default_value is not None:
-                set(key, default_value)
-            return default_value
-        curr_dict = curr_dict[part]
-    return curr_dict
+
+    value = _snapshot.values.get(key, _missing)
+    if value is _missing:
+        if default_value is not None:
+            set(key, default_value)
+        return default_value
+    return value
 
 def set(key, value):
+    global _snapshot
     if _config is None:
         _load_or_create()
-    
-    parts = key.split(".")
-    curr_dict = _config
-    for part in parts[:-1]:
-        if part not in curr_dict:
-            curr_dict[part] = {}
-        curr_dict = curr_dict[part]
-    curr_dict[parts[-1]] = value
 
-    with open(_config_filename, 'w') as file:
-        json.dump(_config, file, indent=2, sort_keys=True)
+    with _lock:
+        parts = key.split(".")
+        curr_dict = _config
+        for part in parts[:-1]:
+            if part not in curr_dict:
+                curr_dict[part] = {}
+            curr_dict = curr_dict[part]
+        curr_dict[parts[-1]] = value
+
+        previous_snapshot = _snapshot
+        _snapshot = Snapshot(_config, previous_snapshot.version + 1)
+        _schedule_write()
+
+        # A change to key also changes the keys nested inside it and the dictionaries that contain it
+        notifications = [(callback, _snapshot.values.get(subscribed_key)) for subscribed_key, callbacks in _subscribers.items()
+                         if (subscribed_key == key or subscribed_key.startswith(key + '.') or key.startswith(subscribed_key + '.'))
+                         and previous_snapshot.values.get(subscribed_key) != _snapshot.values.get(subscribed_key)
+                         for callback in callbacks]
+
+    for callback, new_value in notifications:
+        callback(new_value)
+
+def subscribe(key, callback):
+    '''Call callback(new_value) whenever the value of key changes.'''
+    with _lock:
+        _subscribers.setdefault(key, []).append(callback)
+
+def unsubscribe(key, callback):
+    with _lock:
+        callbacks = _subscribers.get(key, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+def flush():
+    '''Write pending changes to disk now.'''
+    global _write_timer, _dirty
+    with _lock:
+        if _write_timer is not None:
+            _write_timer.cancel()
+            _write_timer = None
+        if not _dirty:
+            return
+        with open(f'{_config_filename}.tmp', 'w') as file:
+            json.dump(_config, file, indent=2, sort_keys=True)
+        os.replace(f'{_config_filename}.tmp', _config_filename)
+        _dirty = False
+
+def _schedule_write():
+    # Changes made while a write is pending join it, so a burst of changes costs one write
+    global _write_timer, _dirty
+    _dirty = True
+    if _write_timer is None:
+        _write_timer = threading.Timer(_write_delay, flush)
+        _write_timer.daemon = True
+        _write_timer.start()
 
+atexit.register(flush)
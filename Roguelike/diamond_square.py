@@ -0,0 +1,51 @@
+from lcg import LCG
+import numpy as np
+
+
+def generate_noise(size, initialization_depth, roughness, seed=42):
+    '''
+    Tileable diamond-square noise, normalized to [0, 1]. Same signature as native_code.generate_noise.
+
+    The coarsest 2**initialization_depth by 2**initialization_depth lattice is filled with random values, then every
+    level halves the step with one diamond and one square pass over whole array slices, wrapping around the edges.
+    Displacements are scaled by roughness times the step as a fraction of size.
+    '''
+    if size <= 0 or size & (size - 1):
+        raise RuntimeError(f'Diamond-square noise needs a power of two size, not {size}')
+
+    lcg = LCG(seed=seed)
+    grid = np.zeros((size, size), dtype=np.float64)
+
+    step = max(1, size >> max(0, initialization_depth))
+    count = size // step
+    grid[0::step, 0::step] = lcg.random_block(count * count).reshape(count, count)
+
+    while step > 1:
+        half_step = step // 2
+        scale = roughness * step / size
+
+        # Diamond step: the center of every square is the average of its four corners
+        corners = grid[0::step, 0::step]
+        centers = (corners + np.roll(corners, -1, axis=0) + np.roll(corners, -1, axis=1) + np.roll(corners, (-1, -1), axis=(0, 1))) / 4
+        centers += (lcg.random_block(count * count).reshape(count, count) - 0.5) * scale
+        grid[half_step::step, half_step::step] = centers
+
+        # Square step: the midpoint of every edge is the average of the two corners and the two centers around it
+        # Edges at (x, y + half_step): corners at y and y + step, centers at x - half_step and x + half_step
+        edges = (corners + np.roll(corners, -1, axis=1) + centers + np.roll(centers, 1, axis=0)) / 4
+        grid[0::step, half_step::step] = edges + (lcg.random_block(count * count).reshape(count, count) - 0.5) * scale
+
+        # Edges at (x + half_step, y): corners at x and x + step, centers at y - half_step and y + half_step
+        edges = (corners + np.roll(corners, -1, axis=0) + centers + np.roll(centers, 1, axis=1)) / 4
+        grid[half_step::step, 0::step] = edges + (lcg.random_block(count * count).reshape(count, count) - 0.5) * scale
+
+        step = half_step
+        count *= 2
+
+    minimum = grid.min()
+    maximum = grid.max()
+    if maximum > minimum:
+        grid = (grid - minimum) / (maximum - minimum)
+    else:
+        grid[:] = 0
+    return grid.astype(np.float32)
@@ -0,0 +1,11 @@
+from constants import *
+import configuration
+
+# Shared by TerrainChunk and TileWindow, which draw the same layers the same way
+
+# Read by every draw each frame
+show_grid_lines = configuration.Setting('debug.rendering.show_grid_lines', False)
+show_chunk_lines = configuration.Setting('debug.rendering.show_chunk_lines', False)
+
+# Profiler stage of each layer, built once so that drawing does not format strings
+draw_scope_names = {TYPE_TERRAIN: 'draw.terrain', TYPE_VEGETATION: 'draw.vegetation', TYPE_CONSTRUCTION: 'draw.construction'}
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+class EntityStore:
+    '''
+    Creatures, items and other entities kept as parallel arrays (struct of arrays) instead of one object each. An
+    entity's id is its slot in the arrays and stays the same for its whole life; the slots of removed entities are
+    reused through a free list. Every bulk operation takes and returns id arrays so that simulation and rendering
+    never loop over entities in Python. With a SpatialHash, positions are mirrored into it so that area queries only
+    look at the entities nearby.
+    '''
+
+    def __init__(self, capacity=1024, spatial_hash=None):
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.sprite = np.zeros(capacity, dtype=np.int32)  # Index into the spritesheet of the entity's type
+        self.type = np.zeros(capacity, dtype=np.int32)    # One of the TYPE_* constants
+        self.state = np.zeros(capacity, dtype=np.int32)   # Meaning is up to the systems that use it
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.high_water = 0   # Slots at or beyond this index have never been used
+        self._free = []       # Reusable slots of removed entities
+        self.spatial_hash = spatial_hash
+
+    def __len__(self):
+        return self.high_water - len(self._free)
+
+    def spawn(self, x, y, sprite, entity_type, state=0):
+        return int(self.spawn_many([x], [y], [sprite], entity_type, [state])[0])
+
+    def spawn_many(self, xs, ys, sprites, entity_type, states=None):
+        '''Add len(xs) entities of one type and return their ids. Free slots are reused first.'''
+        count = len(xs)
+        reused = [self._free.pop() for _ in range(min(count, len(self._free)))]
+        fresh_count = count - len(reused)
+        self._reserve(self.high_water + fresh_count)
+        ids = np.concatenate((np.array(reused, dtype=np.int64), np.arange(self.high_water, self.high_water + fresh_count)))
+        self.high_water += fresh_count
+
+        self.x[ids] = xs
+        self.y[ids] = ys
+        self.sprite[ids] = sprites
+        self.type[ids] = entity_type
+        self.state[ids] = 0 if states is None else states
+        self.alive[ids] = True
+        if self.spatial_hash is not None:
+            self.spatial_hash.insert(ids, self.x[ids], self.y[ids])
+        return ids
+
+    def remove(self, entity_id):
+        self.remove_many([entity_id])
+
+    def remove_many(self, ids):
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        ids = ids[self.alive[ids]]
+        self.alive[ids] = False
+        self._free.extend(ids.tolist())
+        if self.spatial_hash is not None:
+            self.spatial_hash.remove(ids)
+
+    def set_positions(self, ids, xs, ys):
+        self.x[ids] = xs
+        self.y[ids] = ys
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(ids, self.x[ids], self.y[ids])
+
+    def move(self, ids, dxs, dys):
+        self.x[ids] += dxs
+        self.y[ids] += dys
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(ids, self.x[ids], self.y[ids])
+
+    def get_ids(self, entity_type=None):
+        '''Ids of the living entities, optionally only those of one type.'''
+        alive = self.alive[:self.high_water]
+        if entity_type is not None:
+            alive = alive & (self.type[:self.high_water] == entity_type)
+        return np.flatnonzero(alive)
+
+    def get_ids_in_rectangle(self, x0, y0, x1, y1, entity_type=None):
+        '''Ids of the living entities with x0 <= x < x1 and y0 <= y < y1.'''
+        if self.spatial_hash is not None:
+            return self._filter_type(np.sort(self.spatial_hash.query_rectangle(x0, y0, x1, y1)), entity_type)
+        ids = self.get_ids(entity_type)
+        xs = self.x[ids]
+        ys = self.y[ids]
+        return ids[(xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)]
+
+    def get_ids_in_radius(self, x, y, radius, entity_type=None):
+        '''Ids of the living entities within a Euclidean distance of radius tiles of (x, y).'''
+        if self.spatial_hash is not None:
+            return self._filter_type(np.sort(self.spatial_hash.query_radius(x, y, radius)), entity_type)
+        ids = self.get_ids(entity_type)
+        dx = self.x[ids].astype(np.int64) - x
+        dy = self.y[ids].astype(np.int64) - y
+        return ids[dx * dx + dy * dy <= radius * radius]
+
+    def get_sprite_parameters(self, ids):
+        '''The flat (x, y, index) int32 buffer that SpriteSheet.render draws, for the given entities.'''
+        sprite_parameters = np.empty((len(ids), 3), dtype=np.int32)
+        sprite_parameters[:, 0] = self.x[ids]
+        sprite_parameters[:, 1] = self.y[ids]
+        sprite_parameters[:, 2] = self.sprite[ids]
+        return sprite_parameters.reshape(-1)
+
+    def _filter_type(self, ids, entity_type):
+        return ids if entity_type is None else ids[self.type[ids] == entity_type]
+
+    def _reserve(self, capacity):
+        if capacity <= len(self.x):
+            return
+        new_capacity = max(capacity, 2 * len(self.x))
+        for name in ('x', 'y', 'sprite', 'type', 'state', 'alive'):
+            array = getattr(self, name)
+            grown = np.zeros(new_capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
@@ -0,0 +1,98 @@
+from constants import *
+from grid_search import NEIGHBOR_OFFSETS, get_direction_field, get_distance_map
+from lru_cache import LRUCache
+import numpy as np
+
+# Step (dx, dy) for every direction index; the last row is the "stay" step of index -1
+_steps = np.array(list(NEIGHBOR_OFFSETS) + [(0, 0)], dtype=np.int32)
+
+
+class FlowField:
+    '''
+    Navigation towards one goal for every tile of a square around it. distances is the integration field (steps to
+    the goal, -1 where the goal cannot be reached) and directions the index into NEIGHBOR_OFFSETS of the next step,
+    both indexed [y - top, x - left].
+    '''
+
+    def __init__(self, goal, left, top, passable, complete):
+        self.goal = goal
+        self.left = left
+        self.top = top
+        self.complete = complete
+        self.distances = get_distance_map(passable, [(goal[0] - left, goal[1] - top)])
+        self.directions = get_direction_field(self.distances)
+
+    def contains(self, world_x, world_y):
+        height, width = self.directions.shape
+        return self.left <= world_x < self.left + width and self.top <= world_y < self.top + height
+
+    def get_distance(self, world_x, world_y):
+        if not self.contains(world_x, world_y):
+            return -1
+        return int(self.distances[world_y - self.top, world_x - self.left])
+
+    def get_step(self, world_x, world_y):
+        '''The (dx, dy) to move from a tile towards the goal; (0, 0) at the goal, outside the field or when there is no way.'''
+        if not self.contains(world_x, world_y):
+            return 0, 0
+        dx, dy = _steps[self.directions[world_y - self.top, world_x - self.left]]
+        return int(dx), int(dy)
+
+    def get_steps(self, world_xs, world_ys):
+        '''Vectorized get_step: arrays of dx and dy for arrays of positions.'''
+        world_xs = np.asarray(world_xs)
+        world_ys = np.asarray(world_ys)
+        height, width = self.directions.shape
+        columns = world_xs - self.left
+        rows = world_ys - self.top
+        inside = (columns >= 0) & (columns < width) & (rows >= 0) & (rows < height)
+        directions = np.full(world_xs.shape, -1, dtype=np.int8)
+        directions[inside] = self.directions[rows[inside], columns[inside]]
+        steps = _steps[directions]
+        return steps[..., 0], steps[..., 1]
+
+    def get_memory_usage(self):
+        return self.distances.nbytes + self.directions.nbytes
+
+
+class FlowFieldService:
+    '''
+    Flow fields shared by everything heading for the same goal. A field covers the tiles within radius of its goal
+    (Chebyshev) and is built from world.get_passability with one wavefront expansion. Fields are cached by goal while
+    all of their terrain is resident, and dropped when a terrain tile inside them changes.
+    '''
+
+    def __init__(self, world, radius=128, max_cache_bytes=67108864):
+        self.world = world
+        self.radius = radius
+        self._fields = LRUCache(max_weight=max_cache_bytes)
+
+        self.builds = 0
+        self.invalidations = 0
+
+    def get_field(self, goal):
+        goal = tuple(goal)
+        field = self._fields.get(goal)
+        if field is None:
+            area = (goal[0] - self.radius, goal[1] - self.radius, goal[0] + self.radius + 1, goal[1] + self.radius + 1)
+            field = FlowField(goal, area[0], area[1], self.world.get_passability(*area), self.world.is_area_resident(*area))
+            self.builds += 1
+            if field.complete:
+                self._fields.put(goal, field, field.get_memory_usage())
+        return field
+
+    def on_tile_changed(self, layer_type, world_x, world_y):
+        if layer_type != TYPE_TERRAIN:
+            return
+        for goal in self._fields.keys():
+            if abs(goal[0] - world_x) <= self.radius and abs(goal[1] - world_y) <= self.radius:
+                if self._fields.discard(goal):
+                    self.invalidations += 1
+
+    def clear(self):
+        self._fields.clear()
+
+    def get_statistics(self):
+        statistics = self._fields.get_statistics()
+        statistics.update({'builds': self.builds, 'invalidations': self.invalidations})
+        return statistics
@@ -0,0 +1,114 @@
+from collections import deque
+import numpy as np
+import time
+
+
+class Histogram:
+    '''
+    Durations in milliseconds counted into fixed buckets since the start, plus a window of recent samples for the mean
+    and percentiles.
+    '''
+
+    BUCKET_EDGES_MS = (1, 2, 4, 8, 16.7, 33.3, 66.7, 100, 250)
+
+    def __init__(self, history=512):
+        self.counts = [0] * (len(self.BUCKET_EDGES_MS) + 1)
+        self._samples = deque(maxlen=history)
+
+    def add(self, seconds):
+        milliseconds = seconds * 1000
+        self.counts[int(np.searchsorted(self.BUCKET_EDGES_MS, milliseconds, side='right'))] += 1
+        self._samples.append(milliseconds)
+
+    def get_statistics(self):
+        samples = np.array(self._samples)
+        labels = [f'<{edge}ms' for edge in self.BUCKET_EDGES_MS] + [f'>={self.BUCKET_EDGES_MS[-1]}ms']
+        return {
+            'count': sum(self.counts),
+            'mean_ms': float(samples.mean()) if len(samples) else 0.0,
+            'p50_ms': float(np.percentile(samples, 50)) if len(samples) else 0.0,
+            'p95_ms': float(np.percentile(samples, 95)) if len(samples) else 0.0,
+            'max_ms': float(samples.max()) if len(samples) else 0.0,
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class FrameScheduler:
+    '''
+    Runs the simulation at a fixed number of ticks per second, independently of the frame rate. Each frame, begin_frame
+    returns how many ticks are due and get_interpolation how far the frame lies between the last two ticks, so that
+    rendering can blend the previous and current state. end_frame sleeps to hold the frame cap, which drops to
+    idle_fps while the caller reports that nothing is changing.
+    '''
+
+    def __init__(self, ticks_per_second=60, max_fps=144, idle_fps=20, max_ticks_per_frame=8):
+        self.tick_seconds = 1.0 / ticks_per_second
+        self.max_fps = max_fps
+        self.idle_fps = idle_fps
+        self.max_ticks_per_frame = max_ticks_per_frame
+
+        self.tick_times = Histogram()
+        self.frame_times = Histogram()      # Work done in a frame, without the sleep that holds the cap
+        self.frame_intervals = Histogram()  # Start to start, including the sleep
+        self.ticks = 0
+        self.frames = 0
+        self.idle_frames = 0
+        self.dropped_ticks = 0
+
+        self._accumulator = 0.0
+        self._frame_start = None
+        self._tick_start = None
+
+    def begin_frame(self):
+        '''Start a frame and return the number of simulation ticks due.'''
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            elapsed = now - self._frame_start
+            self.frame_intervals.add(elapsed)
+            self._accumulator += elapsed
+        self._frame_start = now
+
+        due = int(self._accumulator / self.tick_seconds)
+        if due > self.max_ticks_per_frame:
+            # Falling further and further behind helps nobody; forget the time that cannot be caught up
+            self.dropped_ticks += due - self.max_ticks_per_frame
+            self._accumulator -= (due - self.max_ticks_per_frame) * self.tick_seconds
+            due = self.max_ticks_per_frame
+        return due
+
+    def begin_tick(self):
+        self._tick_start = time.perf_counter()
+
+    def end_tick(self):
+        self.tick_times.add(time.perf_counter() - self._tick_start)
+        self._accumulator -= self.tick_seconds
+        self.ticks += 1
+
+    def get_interpolation(self):
+        '''Fraction of a tick between the last tick and now, for blending the previous and current state.'''
+        return min(1.0, max(0.0, self._accumulator / self.tick_seconds))
+
+    def end_frame(self, idle=False):
+        '''Finish a frame and sleep until the next one is due. With idle set, frames are capped at idle_fps.'''
+        now = time.perf_counter()
+        self.frame_times.add(now - self._frame_start)
+        self.frames += 1
+        if idle:
+            self.idle_frames += 1
+
+        fps = self.idle_fps if idle else self.max_fps
+        if fps:
+            remaining = self._frame_start + 1.0 / fps - now
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def get_statistics(self):
+        return {
+            'ticks': self.ticks,
+            'frames': self.frames,
+            'idle_frames': self.idle_frames,
+            'dropped_ticks': self.dropped_ticks,
+            'tick_times': self.tick_times.get_statistics(),
+            'frame_times': self.frame_times.get_statistics(),
+            'frame_intervals': self.frame_intervals.get_statistics()
+        }
@@ -0,0 +1,87 @@
+import numpy as np
+
+# Notes: GL objects are created on first use from the thread that dispatches the generator, so creating a
+# GeneratorResources does not need OpenGL. The CPU backend only uses the cached noise range.
+
+
+class GeneratorResources:
+    '''
+    GPU resources that stay resident between chunk generations: the noise texture, uploaded once per noise key (noise
+    seed and size), and a pool of shader storage buffers that are reused and only grow. Owners acquire() and release()
+    the resources; the GL objects are deleted when the last reference is released.
+    '''
+
+    def __init__(self):
+        self.noise = None
+        self.noise_key = None
+        self.noise_range = None
+        self._noise_texture = None
+        self._buffers = {}   # name -> SSBO
+        self._references = 0
+
+        self.uploaded_bytes = 0
+        self.noise_uploads = 0
+        self.generated_chunks = 0
+
+    def acquire(self):
+        self._references += 1
+        return self
+
+    def release(self):
+        self._references -= 1
+        if self._references <= 0:
+            self._references = 0
+            self.cleanup()
+
+    def set_noise(self, noise, key):
+        '''Use noise for generation. The texture is only rebuilt when key differs from the current one.'''
+        if key == self.noise_key and self.noise is not None:
+            return
+        self.noise = noise
+        self.noise_key = key
+        self.noise_range = (float(np.min(noise)), float(np.max(noise)))
+        self._delete_noise_texture()
+
+    def get_noise_texture(self):
+        if self._noise_texture is None:
+            from gpu_texture import Texture
+            self._noise_texture = Texture({'type': 'numpy', 'data_format': 'R', 'data': {'red': self.noise}},
+                                          min_filter='linear', mag_filter='linear', wrap_s='repeat', wrap_t='repeat')
+            self.uploaded_bytes += np.asarray(self.noise, dtype=np.float32).nbytes
+            self.noise_uploads += 1
+        return self._noise_texture
+
+    def get_buffer(self, name, data_type, num_elements, data=None):
+        '''A pooled SSBO with room for at least num_elements, filled with data if given.'''
+        from gpu_ssbo import SSBO
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.data_type != data_type or buffer.num_elements < num_elements:
+            if buffer is not None:
+                buffer.cleanup()
+            buffer = SSBO(num_elements, data_type)
+            self._buffers[name] = buffer
+        if data is not None:
+            data = np.ascontiguousarray(data, dtype=SSBO.DATA_TYPE_INFO[data_type]['numpy_type'])
+            buffer.set_data(data)
+            self.uploaded_bytes += data.nbytes
+        return buffer
+
+    def cleanup(self):
+        self._delete_noise_texture()
+        for buffer in self._buffers.values():
+            buffer.cleanup()
+        self._buffers.clear()
+
+    def get_statistics(self):
+        return {
+            'uploaded_bytes': self.uploaded_bytes,
+            'noise_uploads': self.noise_uploads,
+            'generated_chunks': self.generated_chunks,
+            'uploaded_bytes_per_chunk': self.uploaded_bytes / self.generated_chunks if self.generated_chunks else 0.0,
+            'pooled_buffers': len(self._buffers)
+        }
+
+    def _delete_noise_texture(self):
+        if self._noise_texture is not None:
+            self._noise_texture.cleanup()
+            self._noise_texture = None
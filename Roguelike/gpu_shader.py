@@ -78,7 +78,7 @@ def get_shader(kind, name):
 
         def get_workgroup_count(self, width, height):
             wg_width, wg_height = self.get_workgroup_size()
-            return width // wg_width, height // wg_height
+            return -(-width // wg_width), -(-height // wg_height)
 
         def use(self):
             glUseProgram(self.shader_program)
@@ -110,7 +110,8 @@ def get_shader(kind, name):
             elif instance_count > 0:
                 glDrawArraysInstanced(vertex_buffer.mode, 0, vertex_buffer.count, instance_count)
 
-        def compute(self, workgroup_count_x, workgroup_count_y, pre_invoke_function=None, post_invoke_function=None, iterations=1):
+        def compute(self, workgroup_count_x, workgroup_count_y, pre_invoke_function=None, post_invoke_function=None, iterations=1,
+                    workgroup_count_z=1, barrier=GL_SHADER_IMAGE_ACCESS_BARRIER_BIT):
             # Use the shader program
             self.use()
 
@@ -120,11 +121,11 @@ def get_shader(kind, name):
                     gpu.check_opengl_error()
 
                 # Dispatch the compute shader
-                glDispatchCompute(workgroup_count_x, workgroup_count_y, 1)
+                glDispatchCompute(workgroup_count_x, workgroup_count_y, workgroup_count_z)
                 gpu.check_opengl_error()
 
                 # Wait for the compute shader to complete
-                glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
+                glMemoryBarrier(barrier)
                 gpu.check_opengl_error()
         
                 if post_invoke_function is not None:
@@ -17,13 +17,29 @@ class SSBO:
             'type': GL_UNSIGNED_INT,
             'numpy_type': np.uint32,
             'size': 4
+        },
+        'int32': {
+            'gl_type': GL_R32I,
+            'format': GL_RED_INTEGER,
+            'type': GL_INT,
+            'numpy_type': np.int32,
+            'size': 4
+        },
+        'vec4': {
+            'gl_type': GL_RGBA32F,
+            'format': GL_RGBA,
+            'type': GL_FLOAT,
+            'numpy_type': np.float32,
+            'size': 16
         }
     }
     
-    def __init__(self, num_elements, data_type='float'):
-        self.num_elements = num_elements
+    def __init__(self, num_elements, data_type='float', data=None):
+        self.num_elements = max(1, num_elements)
         self.data_type = data_type
-        self.ssbo = self.create_empty_ssbo(num_elements, data_type)
+        self.ssbo = self.create_empty_ssbo(self.num_elements, data_type)
+        if data is not None:
+            self.set_data(data)
     
     def create_empty_ssbo(self, num_elements, data_type):
         """Create an empty SSBO based on the specified data type."""
@@ -33,6 +49,18 @@ class SSBO:
         glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
         return ssbo
     
+    def set_data(self, data):
+        """Upload a numpy array to the start of the SSBO, growing the buffer if the data does not fit."""
+        info = self.DATA_TYPE_INFO[self.data_type]
+        data = np.ascontiguousarray(data, dtype=info['numpy_type'])
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.ssbo)
+        if data.nbytes > self.num_elements * info['size']:
+            self.num_elements = data.nbytes // info['size']
+            glBufferData(GL_SHADER_STORAGE_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+        elif data.nbytes > 0:
+            glBufferSubData(GL_SHADER_STORAGE_BUFFER, 0, data.nbytes, data)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+
     def cleanup(self):
         """Release the SSBO resources."""
         glDeleteBuffers(1, [self.ssbo])
@@ -50,6 +78,15 @@ class SSBO:
         buffer_data = glGetBufferSubData(GL_SHADER_STORAGE_BUFFER, 0, num_workgroups_x * num_workgroups_y * self.DATA_TYPE_INFO[self.data_type]['size'])
         return np.sum(np.frombuffer(buffer_data, dtype=self.DATA_TYPE_INFO[self.data_type]['numpy_type']))
 
+    def get_data(self, num_elements=None):
+        """Read the first num_elements elements of the SSBO (all of them by default) into a numpy array."""
+        info = self.DATA_TYPE_INFO[self.data_type]
+        num_elements = self.num_elements if num_elements is None else num_elements
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.ssbo)
+        buffer_data = glGetBufferSubData(GL_SHADER_STORAGE_BUFFER, 0, num_elements * info['size'])
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, 0)
+        return np.frombuffer(buffer_data, dtype=info['numpy_type']).copy()
+
     def bind(self, binding_point):
         """Bind the SSBO to a specific binding point and block name in a shader program."""
         glBindBufferBase(GL_SHADER_STORAGE_BUFFER, binding_point, self.ssbo)
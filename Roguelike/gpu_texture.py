@@ -105,6 +105,18 @@ class Texture:
             glBindTexture(GL_TEXTURE_2D, 0)
             gpu.check_opengl_error()
     
+    def update_region(self, x, y, array):
+        '''
+        Overwrite the texels x <= column < x + width, y <= row < y + height of a single channel texture with a numpy
+        array of shape (height, width), without reallocating the texture.
+        '''
+        height, width = array.shape
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, x, y, width, height, self.PIXEL_FORMAT_MAPPING[self.data_format], GL_FLOAT,
+                        np.ascontiguousarray(array, dtype=np.float32))
+        gpu.check_opengl_error()
+        glBindTexture(GL_TEXTURE_2D, 0)
+
     def to_numpy(self):
         '''
         Convert the texture to a dictionary of numpy arrays based on its format.
@@ -0,0 +1,83 @@
+import numpy as np
+
+# 4-connected moves as (dx, dy), in the order trace_path tries them
+NEIGHBOR_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+def get_distance_map(passable, sources, max_distance=None, dtype=np.int32):
+    '''
+    Breadth-first step counts over a boolean grid indexed [y, x], 4-connected with unit costs, from every (x, y) in
+    sources. The whole frontier is expanded with array shifts at every step instead of one cell at a time. Returns an
+    array of distances with -1 where a cell is unreachable (or farther than max_distance).
+    '''
+    distances = np.full(passable.shape, -1, dtype=dtype)
+    frontier = np.zeros(passable.shape, dtype=bool)
+    for x, y in sources:
+        if 0 <= y < passable.shape[0] and 0 <= x < passable.shape[1]:
+            frontier[y, x] = True
+    frontier &= passable
+    reached = frontier.copy()
+    distances[frontier] = 0
+
+    distance = 0
+    grown = np.empty_like(frontier)
+    while frontier.any() and (max_distance is None or distance < max_distance):
+        distance += 1
+        grown[:] = False
+        grown[1:, :] |= frontier[:-1, :]
+        grown[:-1, :] |= frontier[1:, :]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        frontier = grown & passable & ~reached
+        reached |= frontier
+        distances[frontier] = distance
+    return distances
+
+
+def get_direction_field(distances):
+    '''
+    For every cell of a distance map, the index into NEIGHBOR_OFFSETS of the neighbour one step closer to a source,
+    as an int8 array. Sources and unreachable cells get -1.
+    '''
+    height, width = distances.shape
+    unreachable = np.iinfo(np.int64).max
+    own = distances.astype(np.int64)
+    own[distances < 0] = unreachable
+    best = own.copy()
+    directions = np.full(distances.shape, -1, dtype=np.int8)
+    for i, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+        # neighbor[y, x] = own[y + dy, x + dx]
+        neighbor = np.full(distances.shape, unreachable, dtype=np.int64)
+        neighbor[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)] = own[max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+        closer = neighbor < best
+        directions[closer] = i
+        best[closer] = neighbor[closer]
+    directions[distances < 0] = -1
+    return directions
+
+
+def trace_path(distances, start):
+    '''
+    Walk downhill on a distance map from start (x, y) to its nearest source. Returns the list of (x, y) cells from
+    start to the source, both included, or None if start is unreachable.
+    '''
+    x, y = start
+    if distances[y, x] < 0:
+        return None
+    height, width = distances.shape
+    path = [(x, y)]
+    while distances[y, x] > 0:
+        for dx, dy in NEIGHBOR_OFFSETS:
+            next_x, next_y = x + dx, y + dy
+            if 0 <= next_x < width and 0 <= next_y < height and distances[next_y, next_x] == distances[y, x] - 1:
+                x, y = next_x, next_y
+                break
+        path.append((x, y))
+    return path
+
+
+def get_runs(mask):
+    '''(first, last) index pairs of the runs of True in a one-dimensional boolean array.'''
+    padded = np.concatenate(([0], mask.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[0::2], edges[1::2] - 1))
@@ -0,0 +1,105 @@
+from constants import *
+from grid_search import NEIGHBOR_OFFSETS
+from noisy_voronoi import BACKEND_CPU
+from sprite_map import get_sprite_maps
+from world import World
+import argparse
+import configuration
+import json
+import numpy as np
+import player
+import time
+
+
+class HeadlessWorld:
+    '''
+    A World and its player run without pygame or OpenGL, for batch jobs and tests. Terrain is generated with the CPU
+    backend and nothing is drawn; viewport_size, in pixels, still decides which chunks are relevant, as if a display of
+    that size were showing the world.
+    '''
+
+    def __init__(self, viewport_size=(1920, 1080), tile_size=None, player_position=(0, 0), rng_seed=42):
+        if tile_size is None:
+            tile_size = configuration.get('terrain.tile_size', 32)
+        self.viewport_size = viewport_size
+        self.rng = np.random.default_rng(rng_seed)
+        self.player = player.Player(*player_position)
+        self.world = World(viewport_size, self.player.get_position(), configuration.get('terrain.chunk_size', 512), get_sprite_maps(tile_size),
+                           [TYPE_TERRAIN, TYPE_VEGETATION, TYPE_CONSTRUCTION], backend=BACKEND_CPU)
+        self.player.world = self.world
+        self.ticks = 0
+
+    def cleanup(self):
+        self.world.cleanup()
+
+    def spawn_creatures(self, count, radius, sprite=0):
+        '''Spawn count creatures on passable tiles within radius tiles of the player. Returns their ids.'''
+        player_x, player_y = self.player.get_position()
+        xs = player_x + self.rng.integers(-radius, radius + 1, count)
+        ys = player_y + self.rng.integers(-radius, radius + 1, count)
+        passable = self.world.are_passable(xs, ys)
+        return self.world.entities.spawn_many(xs[passable], ys[passable], np.full(np.count_nonzero(passable), sprite), TYPE_CREATURE)
+
+    def step(self, direction=None, blocking=False):
+        '''
+        Advance one simulation tick: move the player one tile in direction, if given, let every creature take a random
+        step, and update the relevant terrain_chunks. With blocking set, missing chunks are generated before returning.
+        '''
+        if direction is not None:
+            self.player.move(*direction)
+        self.wander_creatures()
+        self.world.update_positions(self.viewport_size, self.player.get_position(), blocking)
+        self.ticks += 1
+
+    def wander_creatures(self):
+        '''Move every creature one tile in a random direction, unless that tile cannot be walked on.'''
+        entities = self.world.entities
+        ids = entities.get_ids(TYPE_CREATURE)
+        if len(ids) == 0:
+            return
+        offsets = np.array(NEIGHBOR_OFFSETS)[self.rng.integers(len(NEIGHBOR_OFFSETS), size=len(ids))]
+        xs = entities.x[ids] + offsets[:, 0]
+        ys = entities.y[ids] + offsets[:, 1]
+        passable = self.world.are_passable(xs, ys)
+        entities.set_positions(ids[passable], xs[passable], ys[passable])
+
+    def wait_for_generation(self, timeout=60.0):
+        '''Keep updating until no chunks are waiting to be generated. Returns False if timeout seconds pass first.'''
+        deadline = time.perf_counter() + timeout
+        while self.world.has_pending_work():
+            if time.perf_counter() > deadline:
+                return False
+            time.sleep(0.01)
+            self.world.update_positions(self.viewport_size, self.player.get_position())
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate and simulate a world without a display.')
+    parser.add_argument('--ticks', type=int, default=600)
+    parser.add_argument('--direction', type=int, nargs=2, default=[1, 0], help='tiles the player moves each tick')
+    parser.add_argument('--creatures', type=int, default=1000)
+    parser.add_argument('--viewport', type=int, nargs=2, default=[1920, 1080], help='viewport size in pixels')
+    parser.add_argument('--blocking', action='store_true', help='generate missing chunks before each tick returns')
+    arguments = parser.parse_args()
+
+    headless_world = HeadlessWorld(tuple(arguments.viewport))
+    headless_world.spawn_creatures(arguments.creatures, 256)
+
+    start = time.perf_counter()
+    for _ in range(arguments.ticks):
+        headless_world.step(tuple(arguments.direction), arguments.blocking)
+    seconds = time.perf_counter() - start
+    headless_world.wait_for_generation()
+
+    print(json.dumps({
+        'ticks_per_second': arguments.ticks / seconds,
+        'player_position': headless_world.player.get_position(),
+        'creatures': len(headless_world.world.entities.get_ids(TYPE_CREATURE)),
+        'generation': headless_world.world.get_generation_statistics()
+    }, indent=2))
+    headless_world.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class LCG:
     def __init__(self, seed=0, a=1664525, c=1013904223, m=2**32):
         self.state = seed
@@ -5,9 +8,76 @@ class LCG:
         self.c = c
         self.m = m
 
+        # With a power of two modulus, uint64 wraparound keeps every product exact modulo m; anything else falls back to
+        # arrays of Python integers
+        self._dtype = np.uint64 if m <= 2**32 and (m & (m - 1)) == 0 else object
+
     def random(self):
         self.state = (self.a * self.state + self.c) % self.m
         return self.state / self.m
 
     def random_range(self, low, high):
         return self.random() * (high-low) + low
+
+    def random_block(self, n):
+        '''Return the next n values of random() as a float64 array and advance the state past them.'''
+        states = np.empty(n, dtype=self._dtype)
+        if n == 0:
+            return states.astype(np.float64)
+
+        # Doubling: once the first k states are known, the next k are all one k-step jump away
+        states[0] = (self.a * self.state + self.c) % self.m
+        filled = 1
+        multiplier, increment = self.a, self.c
+        while filled < n:
+            count = min(filled, n - filled)
+            states[filled:filled + count] = self._apply(multiplier, increment, states[:count])
+            multiplier, increment = (multiplier * multiplier) % self.m, (multiplier * increment + increment) % self.m
+            filled += count
+
+        self.state = int(states[-1])
+        return (states / self.m).astype(np.float64)
+
+    def jump(self, n):
+        '''Advance the state by n steps in O(log n) time.'''
+        multiplier, increment = self._get_jump(n)
+        self.state = (multiplier * self.state + increment) % self.m
+
+    def seed_states(self, seeds):
+        '''An array of states for many independent generators, one per seed. Seeds may be negative or out of range.'''
+        states = np.asarray(seeds)
+        if self._dtype is object:
+            return np.vectorize(lambda seed: int(seed) % self.m, otypes=[object])(states)
+        return (states.astype(np.int64) % self.m).astype(np.uint64)
+
+    def advance_states(self, states, steps=1):
+        '''Advance every state of an array from seed_states by steps.'''
+        multiplier, increment = self._get_jump(steps)
+        return self._apply(multiplier, increment, states)
+
+    def random_states_block(self, states, n):
+        '''
+        Draw n values from each of many independent generators. Returns (values, states) where values has the shape
+        states.shape + (n,) and values[..., i] is what the (i + 1)th random() call of each generator would return.
+        '''
+        values = np.empty(np.shape(states) + (n,), dtype=np.float64)
+        for i in range(n):
+            states = self._apply(self.a, self.c, states)
+            values[..., i] = (states / self.m).astype(np.float64)
+        return values, states
+
+    def _apply(self, multiplier, increment, states):
+        if self._dtype is object:
+            return (states * multiplier + increment) % self.m
+        return (states * np.uint64(multiplier) + np.uint64(increment)) & np.uint64(self.m - 1)
+
+    def _get_jump(self, steps):
+        # Compose the affine map s -> a * s + c with itself by repeated squaring
+        multiplier, increment = 1, 0
+        a, c = self.a, self.c
+        while steps > 0:
+            if steps & 1:
+                multiplier, increment = (a * multiplier) % self.m, (a * increment + c) % self.m
+            a, c = (a * a) % self.m, (a * c + c) % self.m
+            steps >>= 1
+        return multiplier, increment
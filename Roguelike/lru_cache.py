@@ -1,41 +1,105 @@
+from collections import OrderedDict
+import threading
+
+
 class LRUCache:
-    def __init__(self, capacity):
+    '''
+    Least-recently-used cache with O(1) get and put that can be shared between threads. Entries are evicted when there
+    are more than capacity of them or, if max_weight is set, when their total weight exceeds max_weight. Evicted values
+    that have a cleanup method are cleaned up.
+    '''
+
+    def __init__(self, capacity=None, max_weight=None):
         self.capacity = capacity
-        self.cache = {}  # Actual cache storage
-        self.access_order = []  # Keeps track of access order for LRU eviction
+        self.max_weight = max_weight
+        self.cache = OrderedDict()  # key -> (value, weight), least recently used first
+        self.weight = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self.cache
+
+    def __len__(self):
+        return len(self.cache)
 
     def get(self, key):
-        if key in self.cache:
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
             # Move the accessed key to the end (most recently used)
-            self.access_order.remove(key)
-            self.access_order.append(key)
-            return self.cache[key]
-        return None
-
-    def put(self, key, value):
-        if key in self.cache:
-            # If key already exists, move it to the end
-            self.access_order.remove(key)
-        else:
-            # If cache is full, remove the least recently used entry
-            if len(self.access_order) >= self.capacity:
-                lru_key = self.access_order.pop(0)
-                
-                # Check if the object has a cleanup method and call it before deletion
-                if hasattr(self.cache[lru_key], 'cleanup') and callable(self.cache[lru_key].cleanup):
-                    self.cache[lru_key].cleanup()
-                
-                del self.cache[lru_key]
-        
-        # Add the new key and value to the cache and access order
-        self.cache[key] = value
-        self.access_order.append(key)
-    
-    # New method to clear the cache
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, weight=1):
+        with self._lock:
+            previous = self.cache.pop(key, None)
+            if previous is not None:
+                self.weight -= previous[1]
+            self.cache[key] = (value, weight)
+            self.weight += weight
+
+            # Remove least recently used entries, but never the one just added
+            evicted = []
+            while len(self.cache) > 1 and self._is_over_limit():
+                _, (lru_value, lru_weight) = self.cache.popitem(last=False)
+                self.weight -= lru_weight
+                self.evictions += 1
+                evicted.append(lru_value)
+
+        # Cleanup can be slow (GL calls), so it runs without holding the lock
+        for lru_value in evicted:
+            _cleanup(lru_value)
+
+    def keys(self):
+        '''A snapshot of the keys, least recently used first.'''
+        with self._lock:
+            return list(self.cache.keys())
+
+    def discard(self, key):
+        '''Remove an entry, cleaning it up. Returns whether it was present.'''
+        with self._lock:
+            entry = self.cache.pop(key, None)
+            if entry is not None:
+                self.weight -= entry[1]
+        if entry is None:
+            return False
+        _cleanup(entry[0])
+        return True
+
     def clear(self):
+        with self._lock:
+            values = [value for value, _ in self.cache.values()]
+            self.cache.clear()
+            self.weight = 0
         # Before clearing, check and call cleanup method for each item in the cache
-        for key, value in self.cache.items():
-            if hasattr(value, 'cleanup') and callable(value.cleanup):
-                value.cleanup()
-        self.cache.clear()
-        self.access_order.clear()
+        for value in values:
+            _cleanup(value)
+
+    def get_statistics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.cache),
+                'weight': self.weight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+    def _is_over_limit(self):
+        return (self.capacity is not None and len(self.cache) > self.capacity) or (self.max_weight is not None and self.weight > self.max_weight)
+
+
+def _cleanup(value):
+    # Check if the object has a cleanup method and call it before deletion
+    if hasattr(value, 'cleanup') and callable(value.cleanup):
+        value.cleanup()
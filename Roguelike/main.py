@@ -1,7 +1,12 @@
 from constants import *
+from frame_scheduler import FrameScheduler
+from profiler_overlay import ProfilerOverlay
+from sprite_map import get_sprite_directories
 import configuration
 import gpu_shader
+import json
 import player
+import profiler
 import pygame
 import spritesheet
 import utility
@@ -9,16 +14,19 @@ import world
 
 
 def get_assets(tile_size):
-    new_spritesheets = {
-        TYPE_TERRAIN: spritesheet.SpriteSheet(configuration.get('assets.spritesheets.terrain', 'Terrain'), tile_size, tile_size),
-        TYPE_VEGETATION: spritesheet.SpriteSheet(configuration.get('assets.spritesheets.vegetation', 'Vegetation'), tile_size, tile_size),
-        TYPE_CONSTRUCTION: spritesheet.SpriteSheet(configuration.get('assets.spritesheets.construction', 'Construction'), tile_size, tile_size),
-        TYPE_PLACEABLE: spritesheet.SpriteSheet(configuration.get('assets.spritesheets.placeables', 'Placeables'), tile_size, tile_size),
-        TYPE_ITEM: spritesheet.SpriteSheet(configuration.get('assets.spritesheets.items', 'Items'), tile_size, tile_size),
-        TYPE_CREATURE: spritesheet.SpriteSheet(configuration.get('assets.spritesheets.creatures', 'Creatures'), tile_size, tile_size),
-        TYPE_AVATAR: spritesheet.SpriteSheet(configuration.get('assets.spritesheets.avatars', 'Avatars'), tile_size, tile_size)
-    }
-    return new_spritesheets
+    return {sprite_type: spritesheet.SpriteSheet(directory, tile_size, tile_size) for sprite_type, directory in get_sprite_directories().items()}
+
+def toggle_trace(overlay):
+    '''Start recording a trace, or stop recording and write it to debug.profiler.trace_file.'''
+    game_profiler = profiler.get_profiler()
+    if not game_profiler.tracing:
+        game_profiler.start_trace()
+        return
+    game_profiler.stop_trace()
+    filename = configuration.get('debug.profiler.trace_file', 'profile_trace.json')
+    event_count = game_profiler.export_trace(filename)
+    print(f'Wrote {event_count} trace events to {filename}')
+    game_profiler.set_enabled(overlay.visible)
 
 def main():
     tile_sizes = [tile_size for tile_size in configuration.get('ui.map.zoom.levels', [4, 6, 8, 10, 12, 16, 20, 24, 32, 48, 64]) if tile_size <= 64 and tile_size >= 4]
@@ -41,70 +49,119 @@ def main():
     movement_stack = []  # Stack to store the movement directions based on key presses
 
     current_movement = None  # Variable to store the current movement direction
-    last_move_time = 0       # Variable to store the time of the last movement
-    move_rate_limit = 1.0 / configuration.get('movement.moves_per_second', 100)    # Rate limit for movement 
+    moves_per_second = configuration.get('movement.moves_per_second', 100)
+    move_budget = 0.0        # Moves earned by the ticks so far and not made yet
+
+    # The simulation runs at a fixed tick rate; frames are capped and drop to the idle rate when nothing changes
+    scheduler = FrameScheduler(configuration.get('simulation.ticks_per_second', 60), configuration.get('ui.max_fps', 144),
+                               configuration.get('ui.idle_fps', 20), configuration.get('simulation.max_ticks_per_frame', 8))
+    previous_player_position = current_player_position = game_player.get_position()
+    world_changed = True     # Forces the relevant terrain_chunks to be recomputed on the next tick
+
+    # JSON keys are strings, while pygame reports keys as integers
+    key_to_movement_setting = configuration.Setting('movement.key_to_movement', {
+        pygame.K_KP7: [-1, 1],
+        pygame.K_KP8: [0, 1],
+        pygame.K_KP9: [1, 1],
+        pygame.K_KP4: [-1, 0],
+        pygame.K_KP6: [1, 0],
+        pygame.K_KP1: [-1, -1],
+        pygame.K_KP2: [0, -1],
+        pygame.K_KP3: [1, -1]
+    }, lambda key_to_movement: {int(key): value for key, value in key_to_movement.items()})
+
+    # F3 shows the stage timings, F4 starts and stops recording a trace
+    overlay = ProfilerOverlay(profiler.get_profiler())
 
     running = True
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-
-            key_to_movement = configuration.get('movement.key_to_movement', {
-                pygame.K_KP7: [-1, 1],
-                pygame.K_KP8: [0, 1],
-                pygame.K_KP9: [1, 1],
-                pygame.K_KP4: [-1, 0],
-                pygame.K_KP6: [1, 0],
-                pygame.K_KP1: [-1, -1],
-                pygame.K_KP2: [0, -1],
-                pygame.K_KP3: [1, -1]
-            })
-            key_to_movement = {int(key): value for key, value in key_to_movement.items()}
-            
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_q:
+        due_ticks = scheduler.begin_frame()
+        profiler.get_profiler().begin_frame()
+        had_events = False
+        with profiler.scope('events'):
+            for event in pygame.event.get():
+                had_events = True
+                if event.type == pygame.QUIT:
                     running = False
-                elif event.key in key_to_movement:
-                    direction = key_to_movement[event.key]
-                    if direction not in movement_stack:
-                        movement_stack.append(direction)
-                    current_movement = movement_stack[-1]
-                elif event.key == pygame.K_KP_MINUS:
-                    new_tile_size = utility.find_before(tile_sizes, current_tile_size)
-                    current_tile_size = new_tile_size
-                    spritesheets = get_assets(current_tile_size)
-                    game_world.set_spritesheets(spritesheets)
-                    configuration.set('terrain.tile_size', current_tile_size)
-                elif event.key == pygame.K_KP_PLUS:
-                    new_tile_size = utility.find_after(tile_sizes, current_tile_size)
-                    current_tile_size = new_tile_size
-                    spritesheets = get_assets(current_tile_size)
-                    game_world.set_spritesheets(spritesheets)
-                    configuration.set('terrain.tile_size', current_tile_size)
-
-            if event.type == pygame.KEYUP:
-                # If the key released is a movement key, remove its corresponding movement from the stack
-                if event.key in key_to_movement:
-                    movement = key_to_movement[event.key]
-                    if movement in movement_stack:
-                        movement_stack.remove(movement)
-                    current_movement = movement_stack[-1] if movement_stack else None
-        
-        # Continuous movement handling
-        current_time = pygame.time.get_ticks() / 1000  # Get the current time in seconds
-        if current_movement and current_time - last_move_time > move_rate_limit:
-            game_player.move(*current_movement)
-            last_move_time = current_time
-
-        # Update the world based on the player's current position
-        current_player_position = game_player.get_position()
-        game_world.update_positions(screen, current_player_position)
-
-        game_world.render(screen, current_player_position[0], current_player_position[1])
-
-        pygame.display.flip()
 
+                key_to_movement = key_to_movement_setting.value
+            
+                if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_q:
+                        running = False
+                    elif event.key in key_to_movement:
+                        direction = key_to_movement[event.key]
+                        if direction not in movement_stack:
+                            movement_stack.append(direction)
+                        current_movement = movement_stack[-1]
+                    elif event.key == pygame.K_KP_MINUS:
+                        new_tile_size = utility.find_before(tile_sizes, current_tile_size)
+                        current_tile_size = new_tile_size
+                        spritesheets = get_assets(current_tile_size)
+                        game_world.set_spritesheets(spritesheets)
+                        configuration.set('terrain.tile_size', current_tile_size)
+                        world_changed = True
+                    elif event.key == pygame.K_KP_PLUS:
+                        new_tile_size = utility.find_after(tile_sizes, current_tile_size)
+                        current_tile_size = new_tile_size
+                        spritesheets = get_assets(current_tile_size)
+                        game_world.set_spritesheets(spritesheets)
+                        configuration.set('terrain.tile_size', current_tile_size)
+                        world_changed = True
+                    elif event.key == pygame.K_F3:
+                        overlay.toggle()
+                    elif event.key == pygame.K_F4:
+                        toggle_trace(overlay)
+
+                if event.type == pygame.KEYUP:
+                    # If the key released is a movement key, remove its corresponding movement from the stack
+                    if event.key in key_to_movement:
+                        movement = key_to_movement[event.key]
+                        if movement in movement_stack:
+                            movement_stack.remove(movement)
+                        current_movement = movement_stack[-1] if movement_stack else None
+        
+        for _ in range(due_ticks):
+            scheduler.begin_tick()
+            with profiler.scope('tick'):
+                previous_player_position = current_player_position
+
+                # Continuous movement handling
+                if current_movement:
+                    move_budget += moves_per_second * scheduler.tick_seconds
+                    while move_budget >= 1:
+                        game_player.move(*current_movement)
+                        move_budget -= 1
+                else:
+                    move_budget = 0.0
+
+                # Update the world based on the player's current position. Recomputing the relevant terrain_chunks is only
+                # needed when the player moved, the view changed or chunks are still being generated.
+                current_player_position = game_player.get_position()
+                if world_changed or current_player_position != previous_player_position or game_world.has_pending_work():
+                    game_world.update_positions(screen, current_player_position)
+                    world_changed = False
+            scheduler.end_tick()
+
+        # Render between the previous and the current tick
+        alpha = scheduler.get_interpolation()
+        render_x = previous_player_position[0] + (current_player_position[0] - previous_player_position[0]) * alpha
+        render_y = previous_player_position[1] + (current_player_position[1] - previous_player_position[1]) * alpha
+        with profiler.scope('render'):
+            game_world.render(screen, render_x, render_y, (render_x, render_y))
+        overlay.render(screen)
+
+        with profiler.scope('flip'):
+            pygame.display.flip()
+        profiler.get_profiler().end_frame()
+
+        idle = not had_events and current_movement is None and previous_player_position == current_player_position and not game_world.has_pending_work()
+        scheduler.end_frame(idle)
+
+    if configuration.get('debug.timing.report', False):
+        print(json.dumps(scheduler.get_statistics(), indent=2))
+
+    overlay.cleanup()
     game_world.cleanup()
     gpu_shader.cleanup_shaders()
     for _, spritesheet in spritesheets.items():
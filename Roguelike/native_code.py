@@ -1,10 +1,15 @@
 
 import configuration
 import ctypes
+import diamond_square
 import numpy as np
 
-# Load the DLL
-dll = ctypes.CDLL(f'./Assets/SharedObjects/{configuration.get("files.shared_objects.windows.aztec", "AztecClientBL.dll")}')
+# Load the DLL. It is only built for Windows; without it generate_noise falls back to the NumPy implementation and
+# the other functions raise a RuntimeError
+try:
+    dll = ctypes.CDLL(f'./Assets/SharedObjects/{configuration.get("files.shared_objects.windows.aztec", "AztecClientBL.dll")}')
+except OSError:
+    dll = None
 
 # Define the constants and structures as per the provided definitions
 MAX_NEIGHBORS = 20
@@ -18,74 +23,86 @@ class RegionInfo(ctypes.Structure):
                 ("neighbors", ctypes.c_int * MAX_NEIGHBORS),
                 ("neighbor_count", ctypes.c_int)]
 
-# Define function prototypes
-dll.generate_regions.argtypes = [
-    ctypes.c_int,  # width
-    ctypes.c_int,  # height
-    ctypes.POINTER(Location), # seeds
-    ctypes.c_int,  # seed_count
-    ctypes.POINTER(ctypes.c_float),  # weights
-    ctypes.POINTER(ctypes.c_int),  # ownership
-    ctypes.POINTER(ctypes.c_float)  # distances
-]
-
-dll.generate_regions_with_borders.argtypes = [
-    ctypes.POINTER(ctypes.c_int),  # ownership
-    ctypes.c_int,  # num_owners
-    ctypes.c_int,  # width
-    ctypes.c_int,  # height
-    ctypes.POINTER(ctypes.c_float),  # distances
-    ctypes.POINTER(ctypes.c_float)  # normalized
-]
-        
-
-dll.generate_heightmap.argtypes = [
-    ctypes.POINTER(ctypes.c_float),  # minimum_values
-    ctypes.POINTER(ctypes.c_float),  # maximum_values
-    ctypes.c_int,  # width
-    ctypes.c_int,  # height
-    ctypes.POINTER(ctypes.c_float)  # heightmap
-]
-
-dll.calculate_region_info.argtypes = [
-    ctypes.POINTER(ctypes.c_int),  # ownership
-    ctypes.c_int,  # width
-    ctypes.c_int,  # height
-    ctypes.c_int  # seed_count
-]
-dll.calculate_region_info.restype = ctypes.POINTER(RegionInfo)
-
-dll.find_river_paths.argtypes = [
-    ctypes.POINTER(ctypes.c_float),  # heightmap
-    ctypes.c_int,                    # width
-    ctypes.c_int,                    # height
-    ctypes.POINTER(ctypes.c_int)     # water_volume
-]
-
-dll.find_river_paths.argtypes = [
-    ctypes.POINTER(ctypes.c_float),  # float* heights
-    ctypes.c_int,                    # int width
-    ctypes.c_int,                    # int height
-    ctypes.POINTER(ctypes.c_float)   # float* water_volume
-]
-
-dll.remap.argtypes = [
-    ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.c_int
-]
-dll.remap.restype = ctypes.POINTER(ctypes.c_int)
-
-dll.free_array_1d.argtypes = [ctypes.POINTER(ctypes.c_int)]
-
-dll.free_region_info_array.argtypes = [ctypes.POINTER(RegionInfo)]
-
-# Define the prototype for the get_noise function in the DLL
-dll.get_noise.argtypes = [
-    ctypes.c_int,                      # size
-    ctypes.c_int,                      # initialization_depth
-    ctypes.c_float,                   # roughness
-    ctypes.c_ulong,                    # seed
-    ctypes.POINTER(ctypes.c_float)    # output
-]
+
+def _declare_prototypes():
+    # Define function prototypes
+    dll.generate_regions.argtypes = [
+        ctypes.c_int,  # width
+        ctypes.c_int,  # height
+        ctypes.POINTER(Location), # seeds
+        ctypes.c_int,  # seed_count
+        ctypes.POINTER(ctypes.c_float),  # weights
+        ctypes.POINTER(ctypes.c_int),  # ownership
+        ctypes.POINTER(ctypes.c_float)  # distances
+    ]
+
+    dll.generate_regions_with_borders.argtypes = [
+        ctypes.POINTER(ctypes.c_int),  # ownership
+        ctypes.c_int,  # num_owners
+        ctypes.c_int,  # width
+        ctypes.c_int,  # height
+        ctypes.POINTER(ctypes.c_float),  # distances
+        ctypes.POINTER(ctypes.c_float)  # normalized
+    ]
+
+
+    dll.generate_heightmap.argtypes = [
+        ctypes.POINTER(ctypes.c_float),  # minimum_values
+        ctypes.POINTER(ctypes.c_float),  # maximum_values
+        ctypes.c_int,  # width
+        ctypes.c_int,  # height
+        ctypes.POINTER(ctypes.c_float)  # heightmap
+    ]
+
+    dll.calculate_region_info.argtypes = [
+        ctypes.POINTER(ctypes.c_int),  # ownership
+        ctypes.c_int,  # width
+        ctypes.c_int,  # height
+        ctypes.c_int  # seed_count
+    ]
+    dll.calculate_region_info.restype = ctypes.POINTER(RegionInfo)
+
+    dll.find_river_paths.argtypes = [
+        ctypes.POINTER(ctypes.c_float),  # heightmap
+        ctypes.c_int,                    # width
+        ctypes.c_int,                    # height
+        ctypes.POINTER(ctypes.c_int)     # water_volume
+    ]
+
+    dll.find_river_paths.argtypes = [
+        ctypes.POINTER(ctypes.c_float),  # float* heights
+        ctypes.c_int,                    # int width
+        ctypes.c_int,                    # int height
+        ctypes.POINTER(ctypes.c_float)   # float* water_volume
+    ]
+
+    dll.remap.argtypes = [
+        ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int), ctypes.c_int
+    ]
+    dll.remap.restype = ctypes.POINTER(ctypes.c_int)
+
+    dll.free_array_1d.argtypes = [ctypes.POINTER(ctypes.c_int)]
+
+    dll.free_region_info_array.argtypes = [ctypes.POINTER(RegionInfo)]
+
+    # Define the prototype for the get_noise function in the DLL
+    dll.get_noise.argtypes = [
+        ctypes.c_int,                      # size
+        ctypes.c_int,                      # initialization_depth
+        ctypes.c_float,                   # roughness
+        ctypes.c_ulong,                    # seed
+        ctypes.POINTER(ctypes.c_float)    # output
+    ]
+
+
+if dll is not None:
+    _declare_prototypes()
+
+
+def _require_dll():
+    if dll is None:
+        raise RuntimeError('The native code library could not be loaded')
+
 
 def convert_1d_to_numpy_2d(one_dee, width, height):
     two_dee_np = np.zeros((height, width), dtype=np.int32)
@@ -97,6 +114,8 @@ def convert_1d_to_numpy_2d(one_dee, width, height):
 
 # Updated to reflect new function signature and float type
 def generate_noisy_region_map(width, height, seeds, weights):
+    _require_dll()
+
     seed_count = len(seeds)
     
     seed_array = (Location * seed_count)(*[Location(s[0], s[1]) for s in seeds])
@@ -115,6 +134,8 @@ def generate_noisy_region_map(width, height, seeds, weights):
 
 # This function remains mostly unchanged
 def get_region_info(ownership, width, height, seeds):
+    _require_dll()
+
     seed_count = len(seeds)
     
     region_info_ptr = dll.calculate_region_info(ownership.ctypes.data_as(ctypes.POINTER(ctypes.c_int)), width, height, seed_count)
@@ -135,6 +156,8 @@ def get_region_info(ownership, width, height, seeds):
 
 # Updated to reflect float type
 def generate_heightmap(minimum_altitudes, maximum_altitudes, width, height):
+    _require_dll()
+
     min_vals_flat = minimum_altitudes.flatten().astype(np.float32)
     max_vals_flat = maximum_altitudes.flatten().astype(np.float32)
     
@@ -153,6 +176,8 @@ def generate_heightmap(minimum_altitudes, maximum_altitudes, width, height):
     return output
 
 def generate_regions_with_borders(ownership, num_owners, width, height):
+    _require_dll()
+
     # Create arrays to hold the output data
     distances = np.zeros((width * height,), dtype=np.float32)
     normalized = np.zeros((width * height,), dtype=np.float32)
@@ -170,6 +195,8 @@ def generate_regions_with_borders(ownership, num_owners, width, height):
     return distances.reshape((height, width)), normalized.reshape((height, width))
 
 def find_river_paths(heights):
+    _require_dll()
+
     # Convert the input heightmap to a numpy array with float32 type (which corresponds to float in C++)
     heights_np = np.array(heights, dtype=np.float32)
 
@@ -190,6 +217,9 @@ def find_river_paths(heights):
     return water_volume_np
 
 def generate_noise(size, initialization_depth, roughness, seed=42):
+    if dll is None:
+        return diamond_square.generate_noise(size, initialization_depth, roughness, seed)
+
     # Create an output numpy array
     output = np.zeros((size, size), dtype=np.float32)
     
@@ -1,36 +1,229 @@
-from OpenGL.converters import Output
-from gpu_shader import get_shader, COMPUTE
-from gpu_texture import Texture
-import gpu
+from generator_resources import GeneratorResources
+from noisy_voronoi_cpu import noisy_voronoi_cpu
+from seed_binning import bin_seeds, get_tile_count
+import argparse
+import configuration
 import numpy as np
 
-max_seeds = 100
+# Generator backends
+BACKEND_GPU = 'gpu'
+BACKEND_CPU = 'cpu'
+
+_golden_chunks_filename = 'Assets/References/noisy_voronoi_golden.npz'
+
+# Golden chunks are produced by the GPU backend or by _noisy_voronoi_reference, a transcription of the original
+# single-chunk shader, never by the CPU backend they check
+_GOLDEN_REFERENCE = 'reference'
+
+# Hardware bilinear filtering only has a few bits of sub-texel precision, so near-ties on region borders can
+# resolve differently on the GPU. The CPU backend must reproduce the golden chunks exactly.
+_max_gpu_golden_mismatch = 0.005
+
 
 def noisy_voronoi(noise_texture_data, seeds, x, y, width, height, noise_multiplier=1):
+    result = noisy_voronoi_batch(noise_texture_data, [seeds], [(x, y)], width, height, noise_multiplier)[0]
+    return result, seeds
+
+
+def noisy_voronoi_batch(noise_texture_data, seed_tables, origins, width, height, noise_multiplier=1, backend=None, resources=None):
+    '''
+    Generate one (height, width) chunk per origin, where seed_tables[i] holds the seeds for the chunk at origins[i].
+    The GPU backend generates up to world.generator.batch.max_chunks chunks per dispatch. The backend defaults to
+    world.generator.backend. resources is a GeneratorResources whose noise is noise_texture_data; without one, GPU
+    resources are created and deleted for this call.
+    '''
+    if backend is None:
+        backend = configuration.get('world.generator.backend', BACKEND_GPU)
+    noise_range = resources.noise_range if resources is not None else None
+    if backend == BACKEND_GPU:
+        max_chunks = configuration.get('world.generator.batch.max_chunks', 16)
+        results = []
+        for start in range(0, len(origins), max_chunks):
+            results.extend(noisy_voronoi_gpu(noise_texture_data, seed_tables[start:start + max_chunks], origins[start:start + max_chunks],
+                                             width, height, noise_multiplier, noise_range, resources))
+        return results
+    elif backend == BACKEND_CPU:
+        return [noisy_voronoi_cpu(noise_texture_data, seeds, x, y, width, height, noise_multiplier, noise_range) for seeds, (x, y) in zip(seed_tables, origins)]
+    raise RuntimeError(f'Unknown world generator backend {backend}. Values must be one of {BACKEND_GPU}, {BACKEND_CPU}.')
+
+
+def noisy_voronoi_gpu(noise_texture_data, seed_tables, origins, width, height, noise_multiplier=1, noise_range=None, resources=None):
+    # Imported here so that the CPU backend works on machines without OpenGL
+    from gpu_shader import get_shader, COMPUTE
+    from OpenGL.GL import GL_BUFFER_UPDATE_BARRIER_BIT, GL_SHADER_STORAGE_BARRIER_BIT
+
     assert noise_texture_data.shape[0] == noise_texture_data.shape[1]
-    
+
+    # The noise texture and the buffers stay resident in resources; a temporary set is used when none is given
+    temporary_resources = resources is None
+    if temporary_resources:
+        resources = GeneratorResources().acquire()
+        resources.set_noise(noise_texture_data, None)
+
     shader = get_shader(COMPUTE, 'noisy_voronoi')
-    flat_seeds = np.array(seeds, dtype=np.float32).flatten()
     num_workgroups_x, num_workgroups_y = shader.get_workgroup_count(width, height)
+    chunk_count = len(origins)
+
+    # Each workgroup only loops over the seeds binned to its tile. The seed tables of all chunks are packed into one
+    # buffer, so candidate indices and tile offsets are shifted to index into the packed arrays.
+    if noise_range is None:
+        noise_range = resources.noise_range
+    tile_size, _ = shader.get_workgroup_size()
+    tiles_per_row, tiles_per_column = get_tile_count(width, height, tile_size)
 
-    noise_texture = Texture({'type': 'numpy', 'data_format': 'R', 'data': {'red': noise_texture_data}}, min_filter='linear', mag_filter='linear', wrap_s='repeat', wrap_t='repeat')
-    output_texture = Texture({'type': 'empty', 'data_format': 'R', 'width': width, 'height': height})
+    packed_seeds = []
+    packed_tile_offsets = [np.zeros(1, dtype=np.int32)]
+    packed_tile_seeds = []
+    seed_base = 0
+    candidate_base = 0
+    for seeds, (x, y) in zip(seed_tables, origins):
+        seed_table = np.array(seeds, dtype=np.float32).reshape(-1, 4)
+        tile_offsets, tile_seeds = bin_seeds(seed_table, x, y, width, height, noise_range, noise_multiplier, tile_size)
+        packed_seeds.append(seed_table)
+        packed_tile_offsets.append(tile_offsets[1:] + candidate_base)
+        packed_tile_seeds.append(tile_seeds + seed_base)
+        seed_base += len(seed_table)
+        candidate_base += len(tile_seeds)
+
+    seed_buffer = resources.get_buffer('seeds', 'vec4', seed_base, np.concatenate(packed_seeds))
+    tile_offset_buffer = resources.get_buffer('tile_offsets', 'int32', chunk_count * tiles_per_row * tiles_per_column + 1, np.concatenate(packed_tile_offsets))
+    tile_seed_buffer = resources.get_buffer('tile_seeds', 'int32', candidate_base, np.concatenate(packed_tile_seeds))
+    chunk_corner_buffer = resources.get_buffer('chunk_corners', 'int32', chunk_count * 2, np.array(origins, dtype=np.int32).reshape(-1))
+    output_buffer = resources.get_buffer(f'output_{width}_{height}', 'float', chunk_count * width * height)
+    noise_texture = resources.get_noise_texture()
 
     def pre_invoke():
-        output_texture.bind(0, False, True)
+        output_buffer.bind(0)
+        seed_buffer.bind(1)
+        tile_offset_buffer.bind(2)
+        tile_seed_buffer.bind(3)
+        chunk_corner_buffer.bind(4)
         shader.set_uniform('noise_texture', 'sampler2D', noise_texture.texture, 0)
-        shader.set_uniform('seeds', '1fv', len(flat_seeds), flat_seeds)
-        shader.set_uniform('seed_count', '1i', len(seeds))
+        shader.set_uniform('output_dimensions', '2i', width, height)
+        shader.set_uniform('tiles_per_row', '1i', tiles_per_row)
+        shader.set_uniform('tiles_per_chunk', '1i', tiles_per_row * tiles_per_column)
         shader.set_uniform('noise_size', '1f', noise_texture_data.shape[0])
-        shader.set_uniform('noise_multiplier', '1f', noise_multiplier)        
-        shader.set_uniform('corner_coord', '2i', x, y)
+        shader.set_uniform('noise_multiplier', '1f', noise_multiplier)
 
-    shader.compute(num_workgroups_x, num_workgroups_y, pre_invoke_function=pre_invoke, iterations=1)
+    # One workgroup layer per chunk
+    shader.compute(num_workgroups_x, num_workgroups_y, pre_invoke_function=pre_invoke, iterations=1,
+                   workgroup_count_z=chunk_count, barrier=GL_SHADER_STORAGE_BARRIER_BIT | GL_BUFFER_UPDATE_BARRIER_BIT)
 
-    numpy_data = output_texture.to_numpy()
-    result = numpy_data['red']
-    
-    noise_texture.cleanup()
-    output_texture.cleanup()
+    results = output_buffer.get_data(chunk_count * width * height).reshape(chunk_count, height, width)
+    resources.generated_chunks += chunk_count
 
-    return result, seeds
+    if temporary_resources:
+        resources.release()
+
+    return list(results)
+
+
+def _noisy_voronoi_reference(noise, seeds, x, y, width, height, noise_multiplier):
+    '''
+    Line by line transcription of the original single-chunk noisy_voronoi shader: every seed is tested at every
+    pixel, in float32, with the noise sampled by the OpenGL formula for linear filtering and repeat wrapping.
+    Deliberately shares no code with the backends, so that golden chunks made with it can catch their bugs.
+    '''
+    noise_size = np.float32(noise.shape[0])
+    frag_x, frag_y = np.meshgrid(np.arange(width, dtype=np.float32) + np.float32(x), np.arange(height, dtype=np.float32) + np.float32(y))
+
+    min_distance = np.full((height, width), 1e9, dtype=np.float32)
+    seed_index = np.full((height, width), -1)
+    for i, (seed_x, seed_y, weight, _) in enumerate(np.asarray(seeds, dtype=np.float32)):
+        diff_x = frag_x - seed_x
+        diff_y = frag_y - seed_y
+
+        # texture(noise_texture, diff / noise_size).r
+        u = diff_x / noise_size * noise_size - np.float32(0.5)
+        v = diff_y / noise_size * noise_size - np.float32(0.5)
+        i0, j0 = np.floor(u), np.floor(v)
+        alpha, beta = u - i0, v - j0
+        i0 = i0.astype(np.int64) % noise.shape[1]
+        j0 = j0.astype(np.int64) % noise.shape[0]
+        i1, j1 = (i0 + 1) % noise.shape[1], (j0 + 1) % noise.shape[0]
+        noise_value = ((1 - alpha) * (1 - beta) * noise[j0, i0] + alpha * (1 - beta) * noise[j0, i1]
+                       + (1 - alpha) * beta * noise[j1, i0] + alpha * beta * noise[j1, i1])
+
+        distance = np.sqrt(diff_x * diff_x + diff_y * diff_y) * (weight + noise_value * np.float32(noise_multiplier))
+        closer = distance < min_distance
+        min_distance[closer] = distance[closer]
+        seed_index[closer] = i
+
+    return np.asarray(seeds, dtype=np.float32)[seed_index, 3]
+
+
+def create_golden_chunks(source, filename=_golden_chunks_filename):
+    '''
+    Regenerate the stored golden chunks with the GPU backend (source BACKEND_GPU) or with the NumPy transcription of
+    the original shader (source _GOLDEN_REFERENCE). Inputs are synthetic so no DLL is needed.
+    '''
+    rng = np.random.default_rng(1234)
+    noise = rng.random((128, 128), dtype=np.float32)
+    corners = np.array([[0, 0], [-1000, 3000], [40000, -25000]], dtype=np.int32)
+    noise_multipliers = np.array([1, 1, 2], dtype=np.float32)
+    size = 64
+
+    seeds = []
+    for corner_x, corner_y in corners:
+        chunk_seeds = np.empty((100, 4), dtype=np.float32)
+        chunk_seeds[:, 0] = rng.uniform(corner_x - 64, corner_x + size + 64, 100)
+        chunk_seeds[:, 1] = rng.uniform(corner_y - 64, corner_y + size + 64, 100)
+        chunk_seeds[:, 2] = rng.integers(1, 6, 100)
+        chunk_seeds[:, 3] = rng.integers(0, 9, 100)
+        seeds.append(chunk_seeds)
+    seeds = np.stack(seeds)
+
+    if source == BACKEND_GPU:
+        expected = np.stack([_run_backend(BACKEND_GPU, noise, seeds[i], corners[i], size, noise_multipliers[i]) for i in range(len(corners))])
+    else:
+        expected = np.stack([_noisy_voronoi_reference(noise, seeds[i], int(corners[i][0]), int(corners[i][1]), size, size, noise_multipliers[i])
+                             for i in range(len(corners))])
+    np.savez_compressed(filename, noise=noise, seeds=seeds, corners=corners, noise_multipliers=noise_multipliers, expected=expected.astype(np.int8),
+                        source=np.array(source))
+
+
+def check_golden_chunks(backend, filename=_golden_chunks_filename):
+    '''Compare a backend against the stored golden chunks. Returns the fraction of mismatched tiles for each chunk.'''
+    golden = np.load(filename)
+    size = golden['expected'].shape[1]
+    mismatches = []
+    for i, corner in enumerate(golden['corners']):
+        result = _run_backend(backend, golden['noise'], golden['seeds'][i], corner, size, golden['noise_multipliers'][i])
+        mismatches.append(np.count_nonzero(result != golden['expected'][i]) / result.size)
+    return mismatches
+
+
+def _run_backend(backend, noise, seeds, corner, size, noise_multiplier):
+    if backend == BACKEND_GPU:
+        result = noisy_voronoi_gpu(noise, [seeds], [(int(corner[0]), int(corner[1]))], size, size, noise_multiplier)[0]
+    else:
+        result = noisy_voronoi_cpu(noise, seeds, int(corner[0]), int(corner[1]), size, size, noise_multiplier)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check a noisy_voronoi backend against the stored golden chunks.')
+    parser.add_argument('--backend', choices=[BACKEND_CPU, BACKEND_GPU], default=BACKEND_CPU)
+    parser.add_argument('--regenerate', choices=[_GOLDEN_REFERENCE, BACKEND_GPU],
+                        help='first overwrite the golden chunks with the output of the GPU backend or of the NumPy transcription of the original shader')
+    arguments = parser.parse_args()
+
+    if BACKEND_GPU in (arguments.backend, arguments.regenerate):
+        import gpu
+        gpu.initialize_opengl_context(64, 64)
+
+    if arguments.regenerate:
+        create_golden_chunks(arguments.regenerate)
+
+    allowed_mismatch = _max_gpu_golden_mismatch if arguments.backend == BACKEND_GPU else 0
+    mismatches = check_golden_chunks(arguments.backend)
+    print(f'golden chunks produced by {np.load(_golden_chunks_filename)["source"]}')
+    for i, mismatch in enumerate(mismatches):
+        print(f'chunk {i}: {mismatch * 100:.3f}% of tiles differ')
+    if any(mismatch > allowed_mismatch for mismatch in mismatches):
+        raise SystemExit(f'{arguments.backend} backend has drifted from the golden chunks')
+    print(f'{arguments.backend} backend matches the golden chunks')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+from seed_binning import TILE_SIZE, bin_seeds, get_padded_candidates, get_tile_count
+import configuration
+import numpy as np
+
+# Notes: this module mirrors Assets/Shaders/compute/noisy_voronoi.glsl and must not import anything that needs OpenGL
+
+
+def sample_linear_repeat(texture_data, u, v):
+    '''
+    Sample a single channel texture the way texture() does for a sampler with linear filtering and repeat wrapping.
+    u and v are normalized texture coordinates and may be any broadcastable shape.
+    '''
+    texture_size = np.float32(texture_data.shape[0])
+
+    # Texel centers sit at half-integer coordinates, so shift by half a texel before splitting into cell and fraction
+    s = u * texture_size - np.float32(0.5)
+    t = v * texture_size - np.float32(0.5)
+    s_floor = np.floor(s)
+    t_floor = np.floor(t)
+    s_fraction = s - s_floor
+    t_fraction = t - t_floor
+
+    # Repeat wrapping
+    column_0 = s_floor.astype(np.int64) % texture_data.shape[1]
+    row_0 = t_floor.astype(np.int64) % texture_data.shape[0]
+    column_1 = (column_0 + 1) % texture_data.shape[1]
+    row_1 = (row_0 + 1) % texture_data.shape[0]
+
+    top = texture_data[row_0, column_0] * (1 - s_fraction) + texture_data[row_0, column_1] * s_fraction
+    bottom = texture_data[row_1, column_0] * (1 - s_fraction) + texture_data[row_1, column_1] * s_fraction
+    return top * (1 - t_fraction) + bottom * t_fraction
+
+
+def noisy_voronoi_cpu(noise_texture_data, seeds, x, y, width, height, noise_multiplier=1, noise_range=None):
+    '''
+    NumPy implementation of the noisy_voronoi compute shader. Returns a (height, width) float32 array holding the
+    value (seeds[i][3]) of the closest seed for every tile of the chunk whose corner is at (x, y).
+    '''
+    assert noise_texture_data.shape[0] == noise_texture_data.shape[1]
+
+    noise = np.asarray(noise_texture_data, dtype=np.float32)
+    noise_size = np.float32(noise.shape[0])
+    if noise_range is None:
+        noise_range = (float(noise.min()), float(noise.max()))
+
+    seed_table = np.asarray(seeds, dtype=np.float32).reshape(-1, 4)
+    if len(seed_table) == 0:
+        # The shader would index seeds[-1]; there is nothing meaningful to return
+        return np.full((height, width), -1, dtype=np.float32)
+
+    # Only the seeds that can win somewhere in a tile are evaluated for that tile
+    tile_offsets, tile_seeds = bin_seeds(seed_table, x, y, width, height, noise_range, noise_multiplier)
+    candidates = get_padded_candidates(tile_offsets, tile_seeds)
+    tiles_x, tiles_y = get_tile_count(width, height)
+    candidate_count = candidates.shape[1]
+
+    # Tile-local pixel offsets, flattened row-major
+    pixel_x = np.tile(np.arange(TILE_SIZE), TILE_SIZE)
+    pixel_y = np.repeat(np.arange(TILE_SIZE), TILE_SIZE)
+
+    # Bound the size of the (tiles, pixels, candidates) temporaries by evaluating a block of tiles at a time
+    block_elements = configuration.get('world.generator.cpu.block_elements', 1048576)
+    tiles_per_block = max(1, block_elements // (TILE_SIZE * TILE_SIZE * candidate_count))
+
+    tile_values = np.empty((tiles_x * tiles_y, TILE_SIZE * TILE_SIZE), dtype=np.float32)
+    for tile_start in range(0, tiles_x * tiles_y, tiles_per_block):
+        tile_end = min(tiles_x * tiles_y, tile_start + tiles_per_block)
+        tile_index = np.arange(tile_start, tile_end)
+
+        # Matches vec2(gl_GlobalInvocationID.xy) + vec2(corner_coord)
+        frag_x = ((tile_index % tiles_x)[:, np.newaxis] * TILE_SIZE + pixel_x).astype(np.float32) + np.float32(x)
+        frag_y = ((tile_index // tiles_x)[:, np.newaxis] * TILE_SIZE + pixel_y).astype(np.float32) + np.float32(y)
+
+        block_candidates = candidates[tile_start:tile_end]
+        valid = block_candidates >= 0
+        block_seeds = seed_table[np.where(valid, block_candidates, 0)][:, np.newaxis, :, :]
+
+        diff_x = frag_x[:, :, np.newaxis] - block_seeds[..., 0]
+        diff_y = frag_y[:, :, np.newaxis] - block_seeds[..., 1]
+        noise_value = sample_linear_repeat(noise, diff_x / noise_size, diff_y / noise_size)
+        distance = np.sqrt(diff_x * diff_x + diff_y * diff_y) * (block_seeds[..., 2] + noise_value * np.float32(noise_multiplier))
+        distance = np.where(valid[:, np.newaxis, :], distance, np.inf)
+
+        # Candidates are in ascending seed order and argmin keeps the first of equal distances, just like the strict
+        # comparison in the shader loop
+        closest = np.argmin(distance, axis=2)
+        tile_values[tile_start:tile_end] = np.take_along_axis(block_seeds[:, 0, :, 3], closest, axis=1)
+
+    result = tile_values.reshape(tiles_y, tiles_x, TILE_SIZE, TILE_SIZE).transpose(0, 2, 1, 3)
+    return np.ascontiguousarray(result.reshape(tiles_y * TILE_SIZE, tiles_x * TILE_SIZE)[:height, :width])
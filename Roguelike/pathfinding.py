@@ -0,0 +1,215 @@
+from constants import *
+from grid_search import get_distance_map, get_runs, trace_path
+from lru_cache import LRUCache
+import heapq
+import numpy as np
+
+# Border runs at least this long get an entrance at each end instead of one in the middle, which keeps paths along
+# wide openings from zigzagging through a single entrance
+_long_entrance_length = 6
+
+
+class _Cluster:
+    '''
+    A square of cluster_size tiles and its entrances: tiles on its border that are passable together with the tile just
+    across the border. Keeps the distance map of every entrance inside the cluster, which gives both the edge costs of
+    the abstract graph and the tile paths that refine them.
+    '''
+
+    def __init__(self, left, top, size, passable_with_border, complete):
+        self.left = left
+        self.top = top
+        self.size = size
+        self.complete = complete
+        self.passable = passable_with_border[1:-1, 1:-1]
+
+        # Border lines as (inside, outside, inside tile, outside tile) for position i along the side
+        sides = [
+            (self.passable[:, 0], passable_with_border[1:-1, 0], lambda i: (left, top + i), lambda i: (left - 1, top + i)),
+            (self.passable[:, -1], passable_with_border[1:-1, -1], lambda i: (left + size - 1, top + i), lambda i: (left + size, top + i)),
+            (self.passable[0, :], passable_with_border[0, 1:-1], lambda i: (left + i, top), lambda i: (left + i, top - 1)),
+            (self.passable[-1, :], passable_with_border[-1, 1:-1], lambda i: (left + i, top + size - 1), lambda i: (left + i, top + size))
+        ]
+
+        self.partners = {}  # entrance tile -> tiles across the border, in the neighbouring clusters
+        for inside, outside, inside_tile, outside_tile in sides:
+            for first, last in get_runs(inside & outside):
+                positions = (first, last) if last - first + 1 >= _long_entrance_length else ((first + last) // 2,)
+                for i in positions:
+                    self.partners.setdefault(inside_tile(int(i)), []).append(outside_tile(int(i)))
+
+        # int16 holds any distance inside a cluster of fewer than 32768 tiles
+        distance_type = np.int16 if size * size < 32768 else np.int32
+        self.distance_maps = {node: get_distance_map(self.passable, [self.to_local(node)], dtype=distance_type) for node in self.partners}
+        self.edges = {}  # entrance tile -> {entrance tile in this cluster: steps}
+        for node, distances in self.distance_maps.items():
+            self.edges[node] = {}
+            for other in self.partners:
+                local_x, local_y = self.to_local(other)
+                if other != node and distances[local_y, local_x] >= 0:
+                    self.edges[node][other] = int(distances[local_y, local_x])
+
+    def to_local(self, tile):
+        return tile[0] - self.left, tile[1] - self.top
+
+    def to_world(self, local_tile):
+        return local_tile[0] + self.left, local_tile[1] + self.top
+
+    def is_passable(self, tile):
+        local_x, local_y = self.to_local(tile)
+        return bool(self.passable[local_y, local_x])
+
+    def get_memory_usage(self):
+        return self.passable.nbytes + sum(distances.nbytes for distances in self.distance_maps.values())
+
+
+class HierarchicalPathfinder:
+    '''
+    Hierarchical pathfinding over terrain passability. The world is split into clusters of cluster_size tiles (chunks
+    should be a multiple of it); an abstract graph links the entrances on cluster borders, A* runs on that graph, and
+    each abstract step is refined into tiles with the distance maps stored in the clusters. Clusters are built on
+    demand from world.get_passability(x0, y0, x1, y1) and cached while world.is_area_resident(x0, y0, x1, y1) says all
+    of their terrain was available. on_tile_changed drops the clusters a terrain edit affects.
+    '''
+
+    def __init__(self, world, cluster_size=64, max_cache_bytes=67108864, max_expansions=50000):
+        self.world = world
+        self.cluster_size = cluster_size
+        self.max_expansions = max_expansions
+        self._clusters = LRUCache(max_weight=max_cache_bytes)
+
+        self.searches = 0
+        self.failures = 0
+        self.cluster_builds = 0
+        self.invalidations = 0
+
+    def on_tile_changed(self, layer_type, world_x, world_y):
+        if layer_type != TYPE_TERRAIN:
+            return
+        cluster_x, cluster_y = world_x // self.cluster_size, world_y // self.cluster_size
+        local_x, local_y = world_x % self.cluster_size, world_y % self.cluster_size
+
+        # A tile on a cluster's edge also changes the entrances of the cluster across that edge
+        keys = [(cluster_x, cluster_y)]
+        if local_x == 0:
+            keys.append((cluster_x - 1, cluster_y))
+        if local_x == self.cluster_size - 1:
+            keys.append((cluster_x + 1, cluster_y))
+        if local_y == 0:
+            keys.append((cluster_x, cluster_y - 1))
+        if local_y == self.cluster_size - 1:
+            keys.append((cluster_x, cluster_y + 1))
+        for key in keys:
+            if self._clusters.discard(key):
+                self.invalidations += 1
+
+    def clear(self):
+        self._clusters.clear()
+
+    def find_path(self, start, goal):
+        '''
+        A 4-connected path of world (x, y) tiles from start to goal, both included, or None if there is none through
+        resident terrain within max_expansions abstract nodes.
+        '''
+        self.searches += 1
+        start, goal = tuple(start), tuple(goal)
+        search_clusters = {}  # Clusters used by this search, including ones too incomplete to cache
+
+        start_cluster = self._get_cluster(self._get_cluster_key(start), search_clusters)
+        goal_cluster = self._get_cluster(self._get_cluster_key(goal), search_clusters)
+        if not start_cluster.is_passable(start) or not goal_cluster.is_passable(goal):
+            self.failures += 1
+            return None
+
+        goal_distances = get_distance_map(goal_cluster.passable, [goal_cluster.to_local(goal)])
+        if start_cluster is goal_cluster:
+            local_path = trace_path(goal_distances, start_cluster.to_local(start))
+            if local_path is not None:
+                return [start_cluster.to_world(tile) for tile in local_path]
+        start_distances = get_distance_map(start_cluster.passable, [start_cluster.to_local(start)])
+
+        def get_neighbors(node):
+            cluster = self._get_cluster(self._get_cluster_key(node), search_clusters)
+            if node == start:
+                for other in cluster.partners:
+                    local_x, local_y = cluster.to_local(other)
+                    if start_distances[local_y, local_x] >= 0:
+                        yield other, int(start_distances[local_y, local_x])
+            else:
+                yield from cluster.edges[node].items()
+            for partner in cluster.partners.get(node, ()):
+                yield partner, 1
+            if cluster is goal_cluster:
+                local_x, local_y = cluster.to_local(node)
+                if goal_distances[local_y, local_x] >= 0:
+                    yield goal, int(goal_distances[local_y, local_x])
+
+        def get_heuristic(node):
+            return abs(node[0] - goal[0]) + abs(node[1] - goal[1])
+
+        costs = {start: 0}
+        came_from = {}
+        open_nodes = [(get_heuristic(start), 0, start)]
+        expansions = 0
+        while open_nodes:
+            _, cost, node = heapq.heappop(open_nodes)
+            if node == goal:
+                return self._refine(self._reconstruct(came_from, start, goal), start, goal, goal_distances, search_clusters)
+            if cost > costs[node]:
+                continue
+            expansions += 1
+            if expansions > self.max_expansions:
+                break
+            for neighbor, step_cost in get_neighbors(node):
+                new_cost = cost + step_cost
+                if new_cost < costs.get(neighbor, new_cost + 1):
+                    costs[neighbor] = new_cost
+                    came_from[neighbor] = node
+                    heapq.heappush(open_nodes, (new_cost + get_heuristic(neighbor), new_cost, neighbor))
+
+        self.failures += 1
+        return None
+
+    def get_statistics(self):
+        statistics = self._clusters.get_statistics()
+        statistics.update({'searches': self.searches, 'failures': self.failures, 'cluster_builds': self.cluster_builds, 'invalidations': self.invalidations})
+        return statistics
+
+    def _get_cluster_key(self, tile):
+        return tile[0] // self.cluster_size, tile[1] // self.cluster_size
+
+    def _get_cluster(self, key, search_clusters):
+        cluster = search_clusters.get(key)
+        if cluster is None:
+            cluster = self._clusters.get(key)
+        if cluster is None:
+            left, top = key[0] * self.cluster_size, key[1] * self.cluster_size
+            area = (left - 1, top - 1, left + self.cluster_size + 1, top + self.cluster_size + 1)
+            complete = self.world.is_area_resident(*area)
+            cluster = _Cluster(left, top, self.cluster_size, self.world.get_passability(*area), complete)
+            self.cluster_builds += 1
+            if complete:
+                self._clusters.put(key, cluster, cluster.get_memory_usage())
+        search_clusters[key] = cluster
+        return cluster
+
+    @staticmethod
+    def _reconstruct(came_from, start, goal):
+        nodes = [goal]
+        while nodes[-1] != start:
+            nodes.append(came_from[nodes[-1]])
+        nodes.reverse()
+        return nodes
+
+    def _refine(self, nodes, start, goal, goal_distances, search_clusters):
+        path = [start]
+        for node, next_node in zip(nodes, nodes[1:]):
+            cluster = self._get_cluster(self._get_cluster_key(node), search_clusters)
+            if self._get_cluster_key(next_node) != self._get_cluster_key(node):
+                # Crossing into the neighbouring cluster
+                path.append(next_node)
+                continue
+            distances = goal_distances if next_node == goal else cluster.distance_maps[next_node]
+            local_path = trace_path(distances, cluster.to_local(node))
+            path.extend(cluster.to_world(tile) for tile in local_path[1:])
+        return path
@@ -0,0 +1,159 @@
+from collections import deque
+import json
+import numpy as np
+import os
+import threading
+import time
+
+# Notes: scope() is called on hot paths, so while profiling is disabled it must do no more than check a flag
+
+
+class _NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+
+_null_scope = _NullScope()
+
+
+class _Scope:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    '''
+    Scoped stage timers. Time spent in each named stage is summed per frame (between begin_frame and end_frame) and
+    the last history frames are kept for percentiles. While tracing, every scope is also kept as a Chrome trace event
+    (chrome://tracing or Perfetto) until export_trace writes them out.
+    '''
+
+    def __init__(self, history=240, max_trace_events=1000000):
+        self.enabled = False
+        self.tracing = False
+        self.max_trace_events = max_trace_events
+        self.frames = deque(maxlen=history)  # Per frame: name -> (seconds, calls)
+        self.dropped_trace_events = 0
+
+        self._lock = threading.Lock()  # Stages may be timed on worker threads
+        self._current_frame = {}
+        self._frame_start = None
+        self._trace_events = []
+        self._trace_start = 0.0
+        self._thread_names = {}
+
+    def scope(self, name):
+        if not self.enabled:
+            return _null_scope
+        return _Scope(self, name)
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            self.tracing = False
+
+    def record(self, name, start, end):
+        with self._lock:
+            seconds, calls = self._current_frame.get(name, (0.0, 0))
+            self._current_frame[name] = (seconds + end - start, calls + 1)
+            if self.tracing:
+                if len(self._trace_events) < self.max_trace_events:
+                    thread = threading.current_thread()
+                    self._thread_names.setdefault(thread.ident, thread.name)
+                    self._trace_events.append((name, start, end, thread.ident))
+                else:
+                    self.dropped_trace_events += 1
+
+    def begin_frame(self):
+        if self.enabled:
+            self._frame_start = time.perf_counter()
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+        self.record('frame', self._frame_start, time.perf_counter())
+        with self._lock:
+            self.frames.append(self._current_frame)
+            self._current_frame = {}
+        self._frame_start = None
+
+    def get_statistics(self):
+        '''Per stage: milliseconds per frame at the 50th and 95th percentile and at most, and the mean calls per frame.'''
+        with self._lock:
+            frames = list(self.frames)
+        names = sorted(set(name for frame in frames for name in frame))
+        statistics = {}
+        for name in names:
+            # Frames in which a stage did not run count as zero, so rare stages show up in max_ms rather than p50_ms
+            milliseconds = np.array([frame.get(name, (0.0, 0))[0] * 1000 for frame in frames])
+            calls = np.array([frame.get(name, (0.0, 0))[1] for frame in frames])
+            statistics[name] = {
+                'p50_ms': float(np.percentile(milliseconds, 50)),
+                'p95_ms': float(np.percentile(milliseconds, 95)),
+                'max_ms': float(milliseconds.max()),
+                'calls_per_frame': float(calls.mean())
+            }
+        return statistics
+
+    def start_trace(self):
+        self.set_enabled(True)
+        with self._lock:
+            self._trace_events = []
+            self._thread_names = {}
+            self.dropped_trace_events = 0
+            self._trace_start = time.perf_counter()
+        self.tracing = True
+
+    def stop_trace(self):
+        self.tracing = False
+
+    def export_trace(self, filename):
+        '''Write the traced scopes as Chrome trace-event JSON. Returns the number of events written.'''
+        with self._lock:
+            events = list(self._trace_events)
+            thread_names = dict(self._thread_names)
+            trace_start = self._trace_start
+
+        process_id = os.getpid()
+        trace_events = [{'name': 'thread_name', 'ph': 'M', 'pid': process_id, 'tid': thread_id, 'args': {'name': thread_name}}
+                        for thread_id, thread_name in thread_names.items()]
+        trace_events.extend({
+            'name': name,
+            'ph': 'X',
+            'ts': (start - trace_start) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': process_id,
+            'tid': thread_id
+        } for name, start, end, thread_id in events)
+
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, file)
+        return len(events)
+
+
+_profiler = Profiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+def scope(name):
+    '''Time a stage: with profiler.scope('name'): ... Costs one flag check while profiling is disabled.'''
+    if not _profiler.enabled:
+        return _null_scope
+    return _Scope(_profiler, name)
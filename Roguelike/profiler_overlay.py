@@ -0,0 +1,77 @@
+from gpu_shader import get_shader, RENDER
+from gpu_texture import Texture
+from gpu_vertex_array import VertexArray
+from gpu_vertex_buffer import get_unit_quad
+from PIL import Image
+import gpu
+import pygame
+import time
+
+
+class ProfilerOverlay:
+    '''
+    Debug overlay in the top left corner of the display listing the per-frame time of every profiled stage. The text is
+    only re-rendered a few times per second, since turning it into a texture costs more than drawing it.
+    '''
+
+    def __init__(self, profiler, font_size=16, refresh_seconds=0.25, margin=8):
+        self.profiler = profiler
+        self.refresh_seconds = refresh_seconds
+        self.margin = margin
+        self.visible = False
+        self.font = pygame.font.SysFont('consolas,couriernew,dejavusansmono,monospace', font_size)  # Monospaced so the columns line up
+        self.texture = None
+        self.size = (0, 0)
+        self._last_refresh = 0.0
+
+    def cleanup(self):
+        if self.texture is not None:
+            self.texture.cleanup()
+            self.texture = None
+
+    def toggle(self):
+        '''Show or hide the overlay. Profiling runs while the overlay is shown.'''
+        self.visible = not self.visible
+        self.profiler.set_enabled(self.visible or self.profiler.tracing)
+
+    def render(self, display):
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if self.texture is None or now - self._last_refresh >= self.refresh_seconds:
+            self._refresh()
+            self._last_refresh = now
+
+        width, height = self.size
+        shader = get_shader(RENDER, 'overlay')
+        shader.use()
+        shader.set_uniform('overlay', 'sampler2D', self.texture.texture, 0)
+        unit_quad = get_unit_quad()
+        vertex_array = VertexArray(shader, {'in_position': unit_quad})
+        vertex_array.bind()
+        gpu.start_blending()
+        shader.render(display, unit_quad, self.margin, display.get_height() - height - self.margin, width, height)
+        gpu.stop_blending()
+        vertex_array.unbind()
+        vertex_array.cleanup()
+
+    def _refresh(self):
+        lines = [f'{"stage":<24}{"p50 ms":>9}{"p95 ms":>9}{"max ms":>9}{"calls":>8}']
+        for name, statistics in self.profiler.get_statistics().items():
+            lines.append(f'{name:<24}{statistics["p50_ms"]:>9.2f}{statistics["p95_ms"]:>9.2f}{statistics["max_ms"]:>9.2f}{statistics["calls_per_frame"]:>8.1f}')
+        if self.profiler.tracing:
+            lines.append('tracing...')
+
+        rendered_lines = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        line_height = self.font.get_linesize()
+        width = max(line.get_width() for line in rendered_lines) + 2 * self.margin
+        height = line_height * len(rendered_lines) + 2 * self.margin
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 160))
+        for i, line in enumerate(rendered_lines):
+            surface.blit(line, (self.margin, self.margin + i * line_height))
+
+        self.cleanup()
+        image = Image.frombytes('RGBA', surface.get_size(), pygame.image.tostring(surface, 'RGBA'))
+        self.texture = Texture({'type': 'image', 'data': image}, wrap_s='clamp', wrap_t='clamp')
+        self.size = (width, height)
@@ -0,0 +1,211 @@
+import numpy as np
+
+# Tiles match the 16x16 local workgroup of the noisy_voronoi compute shader so that one workgroup reads one candidate list
+TILE_SIZE = 16
+
+# Slack added to the per-tile cutoff so that float32 rounding in the distance evaluation can never drop the true winner
+_relative_slack = 1e-4
+_absolute_slack = 1e-3
+
+
+def get_tile_count(width, height, tile_size=TILE_SIZE):
+    return -(-width // tile_size), -(-height // tile_size)
+
+
+def _get_distances(tile_left, tile_top, tile_right, tile_bottom, left, top, right, bottom):
+    # Nearest and farthest distance between the tile rectangles and the rectangles left..right, top..bottom, which
+    # broadcast against each other
+    near_x = np.maximum(np.maximum(tile_left - right, left - tile_right), 0)
+    near_y = np.maximum(np.maximum(tile_top - bottom, top - tile_bottom), 0)
+    far_x = np.maximum(np.abs(tile_left - right), np.abs(tile_right - left))
+    far_y = np.maximum(np.abs(tile_top - bottom), np.abs(tile_bottom - top))
+    return np.sqrt(near_y ** 2 + near_x ** 2), np.sqrt(far_y ** 2 + far_x ** 2)
+
+
+def _get_point_distances(tile_left, tile_top, tile_right, tile_bottom, x, y):
+    # As _get_distances for points; the same arithmetic as for rectangles of no size, so the bounds agree exactly
+    near_x = np.maximum(np.maximum(tile_left - x, x - tile_right), 0)
+    near_y = np.maximum(np.maximum(tile_top - y, y - tile_bottom), 0)
+    far_x = np.maximum(np.abs(tile_left - x), np.abs(tile_right - x))
+    far_y = np.maximum(np.abs(tile_top - y), np.abs(tile_bottom - y))
+    return np.sqrt(near_y ** 2 + near_x ** 2), np.sqrt(far_y ** 2 + far_x ** 2)
+
+
+def _get_bounds(near, far, factor_low, factor_high):
+    lower_bound = np.where(factor_low >= 0, near * factor_low, far * factor_low)
+    upper_bound = np.where(factor_high >= 0, far * factor_high, near * factor_high)
+    return lower_bound, upper_bound
+
+
+def _add_slack(cutoff):
+    return cutoff + np.abs(cutoff) * _relative_slack + _absolute_slack
+
+
+def _get_cell_pairs(mask, cells, cell_starts, cell_counts, cell_seeds):
+    # (tile, seed) pairs for every seed of every (tile, cell) set in mask, ordered by tile
+    pair_tiles, pair_cells = np.nonzero(mask)
+    pair_cells = cells[pair_cells]
+    counts = cell_counts[pair_cells]
+    first_seeds = np.repeat(cell_starts[pair_cells] - np.cumsum(counts) + counts, counts)
+    return np.repeat(pair_tiles, counts), cell_seeds[first_seeds + np.arange(counts.sum())]
+
+
+def _bin_seeds_densely(seed_table, x, y, width, height, noise_low, noise_high, tile_size):
+    # bin_seeds by testing every seed against every tile, which is quicker than building a grid for a few seeds
+    tiles_x, tiles_y = get_tile_count(width, height, tile_size)
+    tile_left = x + np.arange(tiles_x, dtype=np.float64) * tile_size
+    tile_top = y + np.arange(tiles_y, dtype=np.float64) * tile_size
+    tile_right = np.minimum(tile_left + tile_size, x + width) - 1
+    tile_bottom = np.minimum(tile_top + tile_size, y + height) - 1
+
+    seed_x = seed_table[:, 0]
+    seed_y = seed_table[:, 1]
+
+    # Per axis distances, shaped (tiles, seeds)
+    near_x = np.maximum(np.maximum(tile_left[:, np.newaxis] - seed_x, seed_x - tile_right[:, np.newaxis]), 0)
+    near_y = np.maximum(np.maximum(tile_top[:, np.newaxis] - seed_y, seed_y - tile_bottom[:, np.newaxis]), 0)
+    far_x = np.maximum(np.abs(tile_left[:, np.newaxis] - seed_x), np.abs(tile_right[:, np.newaxis] - seed_x))
+    far_y = np.maximum(np.abs(tile_top[:, np.newaxis] - seed_y), np.abs(tile_bottom[:, np.newaxis] - seed_y))
+
+    near = np.sqrt(near_y[:, np.newaxis, :] ** 2 + near_x[np.newaxis, :, :] ** 2).reshape(-1, len(seed_table))
+    far = np.sqrt(far_y[:, np.newaxis, :] ** 2 + far_x[np.newaxis, :, :] ** 2).reshape(-1, len(seed_table))
+
+    lower_bound, upper_bound = _get_bounds(near, far, seed_table[:, 2] + noise_low, seed_table[:, 2] + noise_high)
+    cutoff = _add_slack(upper_bound.min(axis=1, keepdims=True))
+    tile_indices, seed_indices = np.nonzero(lower_bound <= cutoff)
+
+    tile_offsets = np.zeros(tiles_x * tiles_y + 1, dtype=np.int32)
+    np.cumsum(np.bincount(tile_indices, minlength=tiles_x * tiles_y), out=tile_offsets[1:])
+    return tile_offsets, seed_indices.astype(np.int32)
+
+
+def bin_seeds(seeds, x, y, width, height, noise_range, noise_multiplier=1, tile_size=TILE_SIZE, seeds_per_cell=8, dense_seed_limit=512):
+    '''
+    Build a candidate list of seeds for every tile of the chunk whose corner is at (x, y).
+
+    A seed's weighted distance to a tile is bounded below by its nearest point on the tile times the smallest factor
+    (weight + noise * noise_multiplier) it can have, and above by the farthest point times the largest factor. A seed
+    can only win somewhere in the tile if its lower bound does not exceed the smallest upper bound of any seed.
+
+    Seeds are first put in a coarse grid of about seeds_per_cell seeds per cell, and the same bounds, taken over the
+    bounding box of each cell, rule out whole cells per tile; only the seeds of the remaining cells are tested one by
+    one, and cells out of reach of the chunk are not looked at at all. The result is the same as testing every seed
+    against every tile, which is what is done for up to dense_seed_limit seeds.
+
+    Returns (tile_offsets, tile_seeds) in compressed row form: the candidates of tile t (tiles are row-major) are
+    tile_seeds[tile_offsets[t]:tile_offsets[t + 1]], in ascending seed order so that ties resolve like a full scan.
+    '''
+    seed_table = np.asarray(seeds, dtype=np.float32).reshape(-1, 4).astype(np.float64)
+    tiles_x, tiles_y = get_tile_count(width, height, tile_size)
+    tile_count = tiles_x * tiles_y
+    if len(seed_table) == 0:
+        return np.zeros(tile_count + 1, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    noise_low, noise_high = sorted((noise_range[0] * noise_multiplier, noise_range[1] * noise_multiplier))
+    if len(seed_table) <= dense_seed_limit:
+        return _bin_seeds_densely(seed_table, x, y, width, height, noise_low, noise_high, tile_size)
+
+    # Tile bounds in world coordinates, inclusive of the last tile center on each side, as (tiles, 1) columns
+    tile_left = x + np.arange(tiles_x, dtype=np.float64) * tile_size
+    tile_top = y + np.arange(tiles_y, dtype=np.float64) * tile_size
+    tile_right = np.minimum(tile_left + tile_size, x + width) - 1
+    tile_bottom = np.minimum(tile_top + tile_size, y + height) - 1
+    tile_left, tile_right = np.tile(tile_left, tiles_y)[:, np.newaxis], np.tile(tile_right, tiles_y)[:, np.newaxis]
+    tile_top, tile_bottom = np.repeat(tile_top, tiles_x)[:, np.newaxis], np.repeat(tile_bottom, tiles_x)[:, np.newaxis]
+
+    seed_x = seed_table[:, 0]
+    seed_y = seed_table[:, 1]
+    factor_low = seed_table[:, 2] + noise_low
+    factor_high = seed_table[:, 2] + noise_high
+
+    # The cell bounds only hold for seeds whose factor cannot be negative; any others are tested against every tile
+    gridded = np.flatnonzero(factor_low >= 0)
+    ungridded = np.flatnonzero(factor_low < 0)
+    cutoff = np.full((tile_count, 1), np.inf)
+
+    if len(ungridded):
+        near, far = _get_point_distances(tile_left, tile_top, tile_right, tile_bottom, seed_x[ungridded], seed_y[ungridded])
+        ungridded_lower, ungridded_upper = _get_bounds(near, far, factor_low[ungridded], factor_high[ungridded])
+        cutoff = np.minimum(cutoff, ungridded_upper.min(axis=1, keepdims=True))
+
+    if len(gridded):
+        # Grid over the bounding box of the seeds, sorted so that the seeds of each cell are contiguous
+        min_x, min_y = seed_x[gridded].min(), seed_y[gridded].min()
+        area = max(seed_x[gridded].max() - min_x, 1.0) * max(seed_y[gridded].max() - min_y, 1.0)
+        cell_size = max(float(tile_size), np.sqrt(area * seeds_per_cell / len(gridded)))
+        cell_x = ((seed_x[gridded] - min_x) // cell_size).astype(np.int64)
+        cell_y = ((seed_y[gridded] - min_y) // cell_size).astype(np.int64)
+        cell_keys = cell_y * (cell_x.max() + 1) + cell_x
+        order = np.argsort(cell_keys, kind='stable')
+        cell_seeds = gridded[order]
+        _, cell_starts, cell_counts = np.unique(cell_keys[order], return_index=True, return_counts=True)
+
+        cell_left = np.minimum.reduceat(seed_x[cell_seeds], cell_starts)
+        cell_right = np.maximum.reduceat(seed_x[cell_seeds], cell_starts)
+        cell_top = np.minimum.reduceat(seed_y[cell_seeds], cell_starts)
+        cell_bottom = np.maximum.reduceat(seed_y[cell_seeds], cell_starts)
+        cell_factor_low = np.minimum.reduceat(factor_low[cell_seeds], cell_starts)
+        cell_factor_high = np.maximum.reduceat(factor_high[cell_seeds], cell_starts)
+        cell_least_factor_high = np.minimum.reduceat(factor_high[cell_seeds], cell_starts)
+
+        # Cells around the chunk give an upper bound on every tile's cutoff, which limits how far a candidate can be
+        chunk_left, chunk_top, chunk_right, chunk_bottom = tile_left.min(), tile_top.min(), tile_right.max(), tile_bottom.max()
+        chunk_near, _ = _get_distances(chunk_left, chunk_top, chunk_right, chunk_bottom, cell_left, cell_top, cell_right, cell_bottom)
+        cells = np.flatnonzero(chunk_near <= cell_size)
+        smallest_factor = cell_factor_low.min()
+        if len(cells) and smallest_factor > 0:
+            _, far = _get_distances(tile_left, tile_top, tile_right, tile_bottom, cell_left[cells], cell_top[cells], cell_right[cells], cell_bottom[cells])
+            reach = _add_slack(np.minimum(cutoff, (far * cell_factor_high[cells]).min(axis=1, keepdims=True))).max() / smallest_factor
+            cells = np.flatnonzero((chunk_near <= cell_size) | (chunk_near <= reach))
+        else:
+            cells = np.arange(len(cell_starts))
+
+        near, far = _get_distances(tile_left, tile_top, tile_right, tile_bottom, cell_left[cells], cell_top[cells], cell_right[cells], cell_bottom[cells])
+        cell_lower, cell_upper = _get_bounds(near, far, cell_factor_low[cells], cell_factor_high[cells])
+
+        # The smallest upper bound of a tile can only come from cells whose nearest point, at their smallest high
+        # factor, is not beyond the upper bound of some whole cell
+        coarse_cutoff = np.minimum(cutoff, cell_upper.min(axis=1, keepdims=True))
+        pair_tiles, pair_seeds = _get_cell_pairs(near * cell_least_factor_high[cells] <= coarse_cutoff, cells, cell_starts, cell_counts, cell_seeds)
+        _, far = _get_point_distances(tile_left[pair_tiles, 0], tile_top[pair_tiles, 0], tile_right[pair_tiles, 0], tile_bottom[pair_tiles, 0],
+                                      seed_x[pair_seeds], seed_y[pair_seeds])
+        np.minimum.at(cutoff[:, 0], pair_tiles, far * factor_high[pair_seeds])
+
+        # Then only cells whose lower bound is within the cutoff can hold candidates
+        pair_tiles, pair_seeds = _get_cell_pairs(cell_lower <= _add_slack(cutoff), cells, cell_starts, cell_counts, cell_seeds)
+        near, far = _get_point_distances(tile_left[pair_tiles, 0], tile_top[pair_tiles, 0], tile_right[pair_tiles, 0], tile_bottom[pair_tiles, 0],
+                                         seed_x[pair_seeds], seed_y[pair_seeds])
+        gridded_lower, _ = _get_bounds(near, far, factor_low[pair_seeds], factor_high[pair_seeds])
+
+    cutoff = _add_slack(cutoff)
+    tile_indices = [np.zeros(0, dtype=np.int64)]
+    seed_indices = [np.zeros(0, dtype=np.int64)]
+    if len(ungridded):
+        ungridded_tiles, ungridded_columns = np.nonzero(ungridded_lower <= cutoff)
+        tile_indices.append(ungridded_tiles)
+        seed_indices.append(ungridded[ungridded_columns])
+    if len(gridded):
+        kept = gridded_lower <= cutoff[pair_tiles, 0]
+        tile_indices.append(pair_tiles[kept])
+        seed_indices.append(pair_seeds[kept])
+    tile_indices = np.concatenate(tile_indices)
+    seed_indices = np.concatenate(seed_indices)
+    order = np.lexsort((seed_indices, tile_indices))
+
+    tile_offsets = np.zeros(tile_count + 1, dtype=np.int32)
+    np.cumsum(np.bincount(tile_indices, minlength=tile_count), out=tile_offsets[1:])
+    return tile_offsets, seed_indices[order].astype(np.int32)
+
+
+def get_padded_candidates(tile_offsets, tile_seeds):
+    '''
+    Expand the compressed candidate lists into a (tiles, max_candidates) array padded with -1, which is easier to
+    evaluate with whole-array operations.
+    '''
+    counts = np.diff(tile_offsets)
+    tile_count = len(counts)
+    max_candidates = int(counts.max()) if tile_count else 0
+    candidates = np.full((tile_count, max(1, max_candidates)), -1, dtype=np.int32)
+    rows = np.repeat(np.arange(tile_count), counts)
+    columns = np.arange(len(tile_seeds)) - np.repeat(tile_offsets[:-1], counts)
+    candidates[rows, columns] = tile_seeds
+    return candidates
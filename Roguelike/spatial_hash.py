@@ -0,0 +1,158 @@
+import numpy as np
+
+_NO_CELL = np.iinfo(np.int64).min
+
+
+class SpatialHash:
+    '''
+    Uniform grid over world tiles for proximity queries. Members are identified by small non-negative integer ids (the
+    slots of an EntityStore) and every operation takes arrays of ids and coordinates. The cell size divides the terrain
+    chunk size, so a cell never straddles two chunks and the occupied chunks follow directly from the occupied cells.
+
+    Members are kept sorted by cell, which is only redone when some member changes cell; a query looks up the ranges of
+    the overlapped cells with a binary search and then filters the candidates on their exact coordinates.
+    '''
+
+    def __init__(self, cell_size, chunk_size, capacity=1024):
+        if cell_size <= 0 or chunk_size % cell_size != 0:
+            raise RuntimeError(f'The spatial hash cell size {cell_size} must divide the terrain chunk size {chunk_size}')
+        self.cell_size = cell_size
+        self.chunk_size = chunk_size
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.cell = np.full(capacity, _NO_CELL, dtype=np.int64)  # Packed cell key of every id, _NO_CELL if absent
+        self.rebuilds = 0
+        self.queries = 0
+        self._dirty = False
+        self._sorted_ids = np.zeros(0, dtype=np.int64)
+        self._cell_keys = np.zeros(0, dtype=np.int64)     # Occupied cells, ascending
+        self._cell_starts = np.zeros(0, dtype=np.int64)   # Where each occupied cell begins in _sorted_ids
+        self._cell_counts = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.cell != _NO_CELL))
+
+    def insert(self, ids, xs, ys):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) and ids.max() >= len(self.x):
+            self._reserve(int(ids.max()) + 1)
+        self.x[ids] = xs
+        self.y[ids] = ys
+        self.cell[ids] = self._get_cell_keys(self.x[ids], self.y[ids])
+        self._dirty = True
+
+    def move(self, ids, xs, ys):
+        '''Set new positions of members. Only moves that cross a cell boundary make the next query re-sort.'''
+        ids = np.asarray(ids, dtype=np.int64)
+        present = self.cell[ids] != _NO_CELL
+        if not np.all(present):
+            ids = ids[present]
+            xs = np.broadcast_to(xs, present.shape)[present]
+            ys = np.broadcast_to(ys, present.shape)[present]
+        self.x[ids] = xs
+        self.y[ids] = ys
+        cells = self._get_cell_keys(self.x[ids], self.y[ids])
+        if np.any(cells != self.cell[ids]):
+            self.cell[ids] = cells
+            self._dirty = True
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[ids < len(self.cell)]
+        self.cell[ids] = _NO_CELL
+        self._dirty = True
+
+    def clear(self):
+        self.cell[:] = _NO_CELL
+        self._dirty = True
+
+    def query_rectangle(self, x0, y0, x1, y1):
+        '''Ids of the members with x0 <= x < x1 and y0 <= y < y1, in no particular order.'''
+        ids = self._get_candidates(x0, y0, x1 - 1, y1 - 1)
+        xs = self.x[ids]
+        ys = self.y[ids]
+        return ids[(xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)]
+
+    def query_radius(self, x, y, radius):
+        '''Ids of the members within a Euclidean distance of radius tiles of (x, y), in no particular order.'''
+        ids = self._get_candidates(x - radius, y - radius, x + radius, y + radius)
+        dx = self.x[ids].astype(np.int64) - x
+        dy = self.y[ids].astype(np.int64) - y
+        return ids[dx * dx + dy * dy <= radius * radius]
+
+    def get_chunk_origins(self, ids=None):
+        '''The set of (world_x, world_y) origins of the chunks holding the given members, or any member.'''
+        if ids is None:
+            self._update()
+            cell_x, cell_y = self._unpack(self._cell_keys)
+            xs = cell_x * self.cell_size
+            ys = cell_y * self.cell_size
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            xs = self.x[ids].astype(np.int64)
+            ys = self.y[ids].astype(np.int64)
+        origins = np.unique(np.stack((xs - xs % self.chunk_size, ys - ys % self.chunk_size), axis=1), axis=0)
+        return set(map(tuple, origins.tolist()))
+
+    def get_statistics(self):
+        self._update()
+        return {
+            'members': len(self._sorted_ids),
+            'occupied_cells': len(self._cell_keys),
+            'max_per_cell': int(self._cell_counts.max()) if len(self._cell_counts) else 0,
+            'rebuilds': self.rebuilds,
+            'queries': self.queries
+        }
+
+    def _get_candidates(self, x0, y0, x1, y1):
+        '''Ids of the members in the cells overlapping the inclusive tile rectangle (x0, y0)-(x1, y1).'''
+        self._update()
+        self.queries += 1
+        if x1 < x0 or y1 < y0 or len(self._cell_keys) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        cell_xs = np.arange(x0 // self.cell_size, x1 // self.cell_size + 1, dtype=np.int64)
+        cell_ys = np.arange(y0 // self.cell_size, y1 // self.cell_size + 1, dtype=np.int64)
+        keys = self._pack(cell_xs[:, np.newaxis], cell_ys[np.newaxis, :]).reshape(-1)
+
+        positions = np.minimum(np.searchsorted(self._cell_keys, keys), len(self._cell_keys) - 1)
+        positions = positions[self._cell_keys[positions] == keys]
+        starts = self._cell_starts[positions]
+        counts = self._cell_counts[positions]
+
+        # Concatenate the ranges starts[i]:starts[i] + counts[i] without a Python loop
+        offsets = np.cumsum(counts) - counts
+        indices = np.repeat(starts - offsets, counts) + np.arange(int(counts.sum()))
+        return self._sorted_ids[indices]
+
+    def _update(self):
+        if not self._dirty:
+            return
+        ids = np.flatnonzero(self.cell != _NO_CELL)
+        keys = self.cell[ids]
+        order = np.argsort(keys, kind='stable')
+        self._sorted_ids = ids[order]
+        self._cell_keys, self._cell_starts, self._cell_counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self._dirty = False
+        self.rebuilds += 1
+
+    def _get_cell_keys(self, xs, ys):
+        return self._pack(np.asarray(xs, dtype=np.int64) // self.cell_size, np.asarray(ys, dtype=np.int64) // self.cell_size)
+
+    @staticmethod
+    def _pack(cell_x, cell_y):
+        # Cell coordinates of int32 positions fit in 32 bits, so the row-major key fits in an int64
+        return cell_x * (1 << 32) + (cell_y + (1 << 31))
+
+    @staticmethod
+    def _unpack(keys):
+        cell_y = (keys & 0xFFFFFFFF) - (1 << 31)
+        return (keys - (cell_y + (1 << 31))) >> 32, cell_y
+
+    def _reserve(self, capacity):
+        new_capacity = max(capacity, 2 * len(self.x))
+        for name, fill_value in (('x', 0), ('y', 0), ('cell', _NO_CELL)):
+            array = getattr(self, name)
+            grown = np.full(new_capacity, fill_value, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
@@ -0,0 +1,57 @@
+from constants import *
+import configuration
+import json
+import os
+
+
+def get_sprite_directories():
+    '''The sprite directory under Assets/Sprites of every sprite type.'''
+    return {
+        TYPE_TERRAIN: configuration.get('assets.spritesheets.terrain', 'Terrain'),
+        TYPE_VEGETATION: configuration.get('assets.spritesheets.vegetation', 'Vegetation'),
+        TYPE_CONSTRUCTION: configuration.get('assets.spritesheets.construction', 'Construction'),
+        TYPE_PLACEABLE: configuration.get('assets.spritesheets.placeables', 'Placeables'),
+        TYPE_ITEM: configuration.get('assets.spritesheets.items', 'Items'),
+        TYPE_CREATURE: configuration.get('assets.spritesheets.creatures', 'Creatures'),
+        TYPE_AVATAR: configuration.get('assets.spritesheets.avatars', 'Avatars')
+    }
+
+
+def get_sprite_maps(tile_size):
+    return {sprite_type: SpriteMap(directory, tile_size, tile_size) for sprite_type, directory in get_sprite_directories().items()}
+
+
+class SpriteMap:
+    '''
+    The names and indices of the sprites in a directory, read from its spritemap.json, together with the tile size the
+    sprites are drawn at. Loads no images and needs neither pygame nor OpenGL, so worlds can be generated and simulated
+    without a display; SpriteSheet adds the texture.
+    '''
+
+    def __init__(self, directory, tile_width=32, tile_height=32):
+        self.directory = f'Assets/Sprites/{directory}'
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self._load_map()
+
+    def _load_map(self):
+        try:
+            with open(f'{self.directory}/spritemap.json', 'r') as file:
+                self.sheet_map = json.load(file)
+        except FileNotFoundError:
+            # No sheet has been built yet; number the originals the way SpriteSheet will when it builds one
+            image_paths = [f for f in os.listdir(f'{self.directory}/originals') if f.endswith(('.png', '.jpg', '.jpeg'))]
+            self.sheet_map = {os.path.basename(path).split('.')[0]: i for i, path in enumerate(image_paths)}
+        self._names_by_index = {index: name for name, index in self.sheet_map.items()}
+
+    def get_index(self, tile_name):
+        return self.sheet_map[tile_name] if tile_name in self.sheet_map else -1
+
+    def get_name(self, tile_index):
+        return self._names_by_index[tile_index]
+
+    def get_all_terrain_names(self):
+        return self.sheet_map.keys()
+
+    def get_tile_count(self):
+        return len(self.sheet_map)
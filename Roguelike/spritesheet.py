@@ -3,23 +3,20 @@ from gpu_texture import Texture
 from gpu_vertex_array import VertexArray
 from gpu_vertex_buffer import VertexBuffer, get_unit_quad
 from PIL import Image
-import bidict
+from sprite_map import SpriteMap
 import json
 import math
 import os
 import pygame
 
 
-class SpriteSheet:
+class SpriteSheet(SpriteMap):
     def __init__(self, directory, tile_width=32, tile_height=32):
-        self.directory = f'Assets/Sprites/{directory}'
-        self.tile_width = tile_width
-        self.tile_height = tile_height
+        super().__init__(directory, tile_width, tile_height)
         self.sheet_path = self._find_or_create_sheet()
         self.sheet_image = pygame.image.load(self.sheet_path)
         pil_image = Image.frombytes("RGBA", self.sheet_image.get_size(), pygame.image.tostring(self.sheet_image, "RGBA"))
         self.texture = Texture({"type": "image", "data": pil_image}, wrap_s='clamp', wrap_t='clamp')
-        self.sheet_map = bidict.bidict(json.load(open(f'{self.directory}/spritemap.json', 'r')))
 
     def cleanup(self):
         self.texture.cleanup()
@@ -64,6 +61,7 @@ class SpriteSheet:
         # If no existing sheet, create a new one
         sheet_path = os.path.join(self.directory, f'spritesheet_{self.tile_width}_{self.tile_height}.png')
         self._create_image_grid(self.directory, sheet_path)
+        self._load_map()
         return sheet_path
 
     def get_dimensions_in_tiles(self):
@@ -76,15 +74,6 @@ class SpriteSheet:
 
         return (tiles_width, tiles_height)
     
-    def get_index(self, tile_name):
-        return self.sheet_map[tile_name] if tile_name in self.sheet_map else -1
-    
-    def get_name(self, tile_index):
-        return self.sheet_map.inverse[tile_index]
-    
-    def get_all_terrain_names(self):
-        return self.sheet_map.keys()
-
     def screen_to_world(self, display, screen_x, screen_y, center_x, center_y):
         world_x = (screen_x - (display.get_width() - self.tile_width) / 2) / self.tile_width + center_x
         world_y = (screen_y - (display.get_height() - self.tile_height) / 2) / self.tile_height + center_y
@@ -1,4 +1,4 @@
-
+import numpy as np
 
 
 class Terrain:
@@ -22,6 +22,17 @@ class Terrain:
         for key, value in terrain_types_map.items():
              self.terrain_types[key] = value
 
+        # Passability by terrain index, for looking up whole arrays at once. The extra entry at the end makes the
+        # index -1 (no terrain) impassable
+        self.passable = np.zeros(len(self.terrain_types) + 1, dtype=bool)
+        for index, terrain_type in enumerate(self.terrain_types):
+            if terrain_type is not None:
+                self.passable[index] = terrain_type[1]
+
     def is_passable(self, terrain_index):
-        return self.terrain_types[int(terrain_index)][1]
+        return bool(self.passable[int(terrain_index)])
+
+    def get_passability(self, terrain_indices):
+        '''Boolean array of the same shape as terrain_indices that is True where the terrain can be walked on.'''
+        return self.passable[np.asarray(terrain_indices, dtype=np.intp)]
     
\ No newline at end of file
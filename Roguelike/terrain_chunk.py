@@ -1,24 +1,43 @@
-from collections import deque
+from chunk_residency import ChunkResidency
 from constants import *
-from gpu_shader import get_shader, RENDER
-from gpu_texture import Texture
-from gpu_vertex_array import VertexArray
-from gpu_vertex_buffer import get_unit_quad
+from draw_settings import show_grid_lines, show_chunk_lines, draw_scope_names
 import configuration
-import gpu
+import math
 import numpy as np
+import profiler
+
+
+_empty_indices = {}  # (size, dtype) -> read-only array of -1 shared by every empty layer
+
+
+def get_index_dtype(tile_count):
+    '''The smallest signed integer type that holds every tile index of a spritesheet as well as -1 for no tile.'''
+    for dtype in (np.int8, np.int16, np.int32):
+        if tile_count - 1 <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def get_empty_indices(size, dtype):
+    key = (size, np.dtype(dtype))
+    if key not in _empty_indices:
+        indices = np.full((size, size), -1, dtype=dtype)
+        indices.flags.writeable = False
+        _empty_indices[key] = indices
+    return _empty_indices[key]
 
 
 class TerrainChunk:
-    _terrain_chunk_cache = {}  # Cache for terrain_chunks
-    _terrain_chunk_validity = {}  # Validity status of terrain_chunks
-    _invalid_terrain_chunks_LRU = deque()  # LRU queue for invalid terrain_chunks
+    # Cache for terrain_chunks; invalid ones are evicted to stay within the byte budget
+    _residency = ChunkResidency(configuration.get('terrain.residency.byte_budget', 1073741824), configuration.get('terrain.max_invalid_chunks', 100))
     
     class Layer:
-        def __init__(self):        
+        def __init__(self, dtype=np.int16):        
             self.indices = None
             self.texture = None
+            self.dtype = dtype
             self._dirty  = True
+            self._is_empty = False
             
         def cleanup(self):
             if self.texture is not None:
@@ -26,20 +45,51 @@ class TerrainChunk:
                 self.texture = None
                 
         def assign_indices(self, indices):
-            self.indices = indices
+            self.indices = np.asarray(indices).astype(self.dtype, copy=False)
+            self._dirty = True
+            self._is_empty = False
+
+        def assign_empty(self, size):
+            '''Share the read-only empty layer until the first tile is set.'''
+            self.indices = get_empty_indices(size, self.dtype)
             self._dirty = True
+            self._is_empty = True
+
+        @property
+        def is_empty(self):
+            return self._is_empty
             
         def get_index_at(self, x, y):
             return self.indices[y][x]
+
+        def get_memory_usage(self):
+            '''Bytes held by the index array (none for the shared empty layer) plus the single channel float texture made from it.'''
+            if self.indices is None:
+                return 0
+            return (0 if self._is_empty else self.indices.nbytes) + (self.indices.size * 4 if self.texture is not None else 0)
         
         def set_index_at(self, x, y, new_index):
+            if self._is_empty:
+                self.indices = self.indices.copy()
+                self._is_empty = False
             self.indices[y][x] = new_index
+            self._dirty = True
             
         def render(self, display, shader, spritesheet, size, world_x, world_y, center_x, center_y):
+            # Imported here so that chunks can be generated and simulated without a GL context
+            from gpu_shader import get_shader, RENDER
+            from gpu_texture import Texture
+            from gpu_vertex_array import VertexArray
+            from gpu_vertex_buffer import get_unit_quad
+
+            if self._is_empty:
+                return
+
             if self._dirty:
-                self.cleanup()
-                self.texture = Texture({"type": "numpy", "data_format": "R", "data": {"red": self.indices}},
-                                           min_filter='nearest', mag_filter='nearest', wrap_s='clamp', wrap_t='clamp')
+                with profiler.scope('texture_upload'):
+                    self.cleanup()
+                    self.texture = Texture({"type": "numpy", "data_format": "R", "data": {"red": self.indices}},
+                                               min_filter='nearest', mag_filter='nearest', wrap_s='clamp', wrap_t='clamp')
                 self._dirty = False
                 
             tile_width = spritesheet.tile_width
@@ -55,12 +105,13 @@ class TerrainChunk:
             spritesheet_dimensions = spritesheet.get_dimensions_in_tiles()
             shader.set_uniform('spritesheet_dimensions_in_tiles', '2i', *spritesheet_dimensions)
             shader.set_uniform('tile_dimensions_in_pixels', '2i', tile_width, tile_height)
-            shader.set_uniform('show_grid_lines', '1i', 1 if configuration.get('debug.rendering.show_grid_lines', False) else 0)
-            shader.set_uniform('show_chunk_lines', '1i', 1 if configuration.get('debug.rendering.show_chunk_lines', False) else 0)
+            shader.set_uniform('show_grid_lines', '1i', 1 if show_grid_lines.value else 0)
+            shader.set_uniform('show_chunk_lines', '1i', 1 if show_chunk_lines.value else 0)
     
             # Render the shader to the pygame screen at display, screen_y
-            screen_x = int((world_x - center_x) * tile_width + (display.get_width() - tile_width) / 2)
-            screen_y = int((world_y - center_y) * tile_height + (display.get_height() - tile_height) / 2)
+            # Floored rather than truncated, so that chunks on either side of zero stay exactly size tiles apart
+            screen_x = math.floor((world_x - center_x) * tile_width + (display.get_width() - tile_width) / 2)
+            screen_y = math.floor((world_y - center_y) * tile_height + (display.get_height() - tile_height) / 2)
             unit_quad = get_unit_quad()
             vertex_array = VertexArray(shader, {'in_position': unit_quad})
             vertex_array.bind()
@@ -69,51 +120,108 @@ class TerrainChunk:
             vertex_array.unbind()
             vertex_array.cleanup()
             
-    def __init__(self, world_x, world_y, size, world):
+    def __init__(self, world_x, world_y, size, world, terrain_values=None):
         self.world = world
         self.world_x = world_x
         self.world_y = world_y
         self.size = size
-        self.layers = {layer_type: TerrainChunk.Layer() for layer_type in world.get_spritesheets()}
+        self.layers = {layer_type: TerrainChunk.Layer(get_index_dtype(spritesheet.get_tile_count())) for layer_type, spritesheet in world.get_spritesheets().items()}
+        self.passable = None  # (size, size) boolean bitmap, indexed [y, x]
         for layer_type in world.render_order:
-            indices = self.world.get_chunk_values(self.world_x, self.world_y, self.size) if layer_type == TYPE_TERRAIN else np.full((size, size), -1)
-            self.layers[layer_type].assign_indices(indices)
+            if layer_type == TYPE_TERRAIN:
+                indices = terrain_values if terrain_values is not None else self.world.get_chunk_values(self.world_x, self.world_y, self.size)
+                self.layers[layer_type].assign_indices(indices)
+            else:
+                self.layers[layer_type].assign_empty(size)
+        self.update_passability()
 
     def cleanup(self):
         for _, layer in self.layers.items():
             if layer is not None:
                 layer.cleanup()
+
+    def get_memory_usage(self):
+        layer_memory = sum(layer.get_memory_usage() for layer in self.layers.values() if layer is not None)
+        return layer_memory + (self.passable.nbytes if self.passable is not None else 0)
+
+    def update_passability(self):
+        """Rebuild the passability bitmap from the terrain layer."""
+        terrain_layer = self.layers.get(TYPE_TERRAIN)
+        if terrain_layer is None or terrain_layer.indices is None:
+            self.passable = np.ones((self.size, self.size), dtype=bool)
+        else:
+            self.passable = self.world.terrain_types.get_passability(terrain_layer.indices)
+
+    @property
+    def is_placeholder(self):
+        return False
                 
 
     @classmethod
     def get_or_create(cls, world_x, world_y, size, world):
         """Retrieve terrain_chunk from cache or create a new one if it doesn't exist."""
         key = (world_x, world_y, size)
-        if key in cls._terrain_chunk_cache:
-            # Mark the terrain_chunk as valid if it was previously invalid
-            cls._terrain_chunk_validity[key] = True
-            if key in cls._invalid_terrain_chunks_LRU:
-                cls._invalid_terrain_chunks_LRU.remove(key)
-        else:
-            if len(cls._invalid_terrain_chunks_LRU) > configuration.get('terrain.max_invalid_chunks', 100):
-                # Remove the least-recently-used invalid terrain_chunk
-                oldest_invalid_key = cls._invalid_terrain_chunks_LRU.popleft()
-                cls._terrain_chunk_cache[oldest_invalid_key].cleanup()
-                del cls._terrain_chunk_cache[oldest_invalid_key]
-                del cls._terrain_chunk_validity[oldest_invalid_key]
-            
-            cls._terrain_chunk_cache[key] = cls(world_x, world_y, size, world)
-            cls._terrain_chunk_validity[key] = True
+        terrain_chunk = cls._residency.lookup(key)
+        if terrain_chunk is None:
+            terrain_chunk = cls(world_x, world_y, size, world)
+            cls._residency.insert(key, terrain_chunk)
         
-        return cls._terrain_chunk_cache[key]
+        return terrain_chunk
+
+    @classmethod
+    def get_or_create_many(cls, origins, size, world):
+        """Retrieve several terrain_chunks, generating all of the missing ones in a single batch."""
+        chunks = {}
+        missing_origins = []
+        for world_x, world_y in origins:
+            if (world_x, world_y) in chunks:
+                continue
+            terrain_chunk = cls._residency.lookup((world_x, world_y, size))
+            chunks[(world_x, world_y)] = terrain_chunk
+            if terrain_chunk is None:
+                missing_origins.append((world_x, world_y))
+
+        if missing_origins:
+            for (world_x, world_y), terrain_values in zip(missing_origins, world.get_chunk_values_batch(missing_origins, size)):
+                terrain_chunk = cls(world_x, world_y, size, world, terrain_values)
+                cls._residency.insert((world_x, world_y, size), terrain_chunk)
+                chunks[(world_x, world_y)] = terrain_chunk
+
+        return [chunks[origin] for origin in origins]
+
+    @classmethod
+    def get_if_resident(cls, world_x, world_y, size):
+        """Retrieve terrain_chunk from cache and mark it as valid, or return None if it has not been generated."""
+        return cls._residency.lookup((world_x, world_y, size))
+
+    @classmethod
+    def peek_resident(cls, world_x, world_y, size):
+        """Retrieve terrain_chunk from cache without changing its validity, or return None if it has not been generated."""
+        return cls._residency.peek((world_x, world_y, size))
+
+    @classmethod
+    def is_resident(cls, world_x, world_y, size):
+        return (world_x, world_y, size) in cls._residency
+
+    @classmethod
+    def insert_generated(cls, terrain_chunk, valid):
+        """Add a terrain_chunk generated elsewhere (e.g. by a ChunkJobQueue). Invalid chunks are the first to be evicted."""
+        key = (terrain_chunk.world_x, terrain_chunk.world_y, terrain_chunk.size)
+        resident_chunk = cls._residency.peek(key)
+        if resident_chunk is not None:
+            terrain_chunk.cleanup()
+            return resident_chunk
+        cls._residency.insert(key, terrain_chunk, valid)
+        return terrain_chunk
 
     @classmethod
     def mark_as_invalid(cls, world_x, world_y, size):
         """Mark a terrain_chunk as invalid."""
-        key = (world_x, world_y, size)
-        if key in cls._terrain_chunk_cache:
-            cls._terrain_chunk_validity[key] = False
-            cls._invalid_terrain_chunks_LRU.append(key)
+        cls._residency.invalidate((world_x, world_y, size))
+
+    @classmethod
+    def get_residency_statistics(cls):
+        return cls._residency.get_statistics()
 
     def __hash__(self):
         return hash((self.world_x, self.world_y, self.size))
@@ -124,16 +232,25 @@ class TerrainChunk:
         return False
     
     def render(self, display, center_x, center_y):
+        from gpu_shader import get_shader, RENDER
+        import gpu
+
         shader = get_shader(RENDER, 'tile_grid_renderer')
         shader.use()
 
         for layer_type in self.world.render_order:
             layer = self.layers[layer_type]
             spritesheet = self.world.get_spritesheets()[layer_type]
-            layer.render(display, shader, spritesheet, self.size, self.world_x, self.world_y, center_x, center_y)
+            with profiler.scope(draw_scope_names.get(layer_type, 'draw')):
+                layer.render(display, shader, spritesheet, self.size, self.world_x, self.world_y, center_x, center_y)
             gpu.start_blending()        
         gpu.stop_blending()
 
+    def get_layer_indices(self, layer_type):
+        """The (size, size) index array of a layer, indexed [y, x], or None if the layer has none."""
+        layer = self.layers.get(layer_type)
+        return layer.indices if layer is not None else None
+
     def get_layer_index_at(self, layer_type, world_x, world_y):
         # Calculate relative coordinates within the terrain_chunk
         rel_x = world_x - self.world_x
@@ -144,15 +261,57 @@ class TerrainChunk:
         rel_x = world_x - self.world_x
         rel_y = world_y - self.world_y
         self.layers[layer_type].set_index_at(rel_x, rel_y, new_index)
+        if layer_type == TYPE_TERRAIN:
+            self.passable[rel_y, rel_x] = self.world.terrain_types.is_passable(new_index)
+        self.world.notify_tile_changed(layer_type, world_x, world_y)
 
     def contains_position(self, x, y):
         return self.world_x <= x < self.world_x + self.size and self.world_y <= y < self.world_y + self.size
     
     def is_passable_at(self, world_x, world_y):
-        return True
+        return bool(self.passable[world_y - self.world_y, world_x - self.world_x])
+
+    def are_passable(self, world_xs, world_ys):
+        """Passability of many positions inside this terrain_chunk, given as arrays of world coordinates."""
+        return self.passable[np.asarray(world_ys) - self.world_y, np.asarray(world_xs) - self.world_x]
 
     @staticmethod
     def cleanup_cache():
-        for _, chunk in TerrainChunk._terrain_chunk_cache.items():
-            chunk.cleanup()
-   
\ No newline at end of file
+        TerrainChunk._residency.clear()
+
+
+class PlaceholderChunk(TerrainChunk):
+    """Stands in for a terrain_chunk that is still being generated. It draws nothing and cannot be walked on."""
+
+    def __init__(self, world_x, world_y, size, world):
+        self.world = world
+        self.world_x = world_x
+        self.world_y = world_y
+        self.size = size
+        self.layers = {}
+        self.passable = None
+
+    @property
+    def is_placeholder(self):
+        return True
+
+    def is_passable_at(self, world_x, world_y):
+        return False
+
+    def are_passable(self, world_xs, world_ys):
+        return np.zeros(np.shape(world_xs), dtype=bool)
+
+    def render(self, display, center_x, center_y):
+        pass
+
+    def get_layer_indices(self, layer_type):
+        return None
+
+    def get_layer_index_at(self, layer_type, world_x, world_y):
+        return -1
+
+    def set_layer_index_at(self, layer_type, world_x, world_y, new_index):
+        pass
+
+    def get_memory_usage(self):
+        return 0
@@ -1,23 +1,24 @@
-from noisy_voronoi import noisy_voronoi
+from noisy_voronoi import noisy_voronoi, noisy_voronoi_batch
 from lcg import LCG
 from lru_cache import LRUCache
+from numpy.lib.recfunctions import structured_to_unstructured
 
 import configuration
+import numpy as np
 
 
+# One generated Voronoi seed. The fields match the (a, b, c, d) tuples of generate_seeds, bit for bit
+SEED_DTYPE = np.dtype([('x', np.float64), ('y', np.float64), ('weight', np.float64), ('value', np.float64)])
+
 _seed_cache = LRUCache(capacity = configuration.get('world.generator.region.seeds.cache.capacity', 100))
 
-def generate_seeds(spritesheet, x, y):
+def _get_seed_settings():
+    '''
+    The world.generator settings that determine the seeds, shared by generate_seeds and generate_seeds_array so the two
+    cannot drift apart: (region width, region height, region definitions, seeds per region, (random seeds a, b, c)).
+    '''
     region_width = configuration.get('world.generator.region.size.width', 512)
     region_height = configuration.get('world.generator.region.size.height', 512)
-    x -= x % region_width
-    y -= y % region_height
-
-    global _seed_cache
-    cached_result = _seed_cache.get((x, y))
-    if cached_result:
-        return cached_result
-
     region_definitions = configuration.get('world.generator.cells.weights', [
         ('dirt', 4),
         ('granite', 5),
@@ -26,13 +27,24 @@ def generate_seeds(spritesheet, x, y):
         ('stones-small', 5),
         ('stones-medium', 5)
     ])
-    
-    remapped_regions = [spritesheet.get_index(region_definitions[choice][0]) for choice in range(len(region_definitions))]
-
     seeds_per_region = configuration.get('world.generator.region.seed_count', 4)
-    rng_seed_a = configuration.get('world.generator.random.seed.a', 42)
-    rng_seed_b = configuration.get('world.generator.random.seed.b', 43)
-    rng_seed_c = configuration.get('world.generator.random.seed.c', 44)
+    rng_seeds = (configuration.get('world.generator.random.seed.a', 42),
+                 configuration.get('world.generator.random.seed.b', 43),
+                 configuration.get('world.generator.random.seed.c', 44))
+    return region_width, region_height, region_definitions, seeds_per_region, rng_seeds
+
+
+def generate_seeds(spritesheet, x, y):
+    region_width, region_height, region_definitions, seeds_per_region, (rng_seed_a, rng_seed_b, rng_seed_c) = _get_seed_settings()
+    x -= x % region_width
+    y -= y % region_height
+
+    global _seed_cache
+    cached_result = _seed_cache.get((x, y))
+    if cached_result:
+        return cached_result
+
+    remapped_regions = [spritesheet.get_index(region_definitions[choice][0]) for choice in range(len(region_definitions))]
 
     seeds = []
     for dy in [-2, -1, 0, 1, 2]:
@@ -56,5 +68,54 @@ def generate_seeds(spritesheet, x, y):
     return seeds
 
 
+def generate_seeds_array(spritesheet, xs, ys):
+    '''
+    Vectorized generate_seeds for many positions at once. Returns a SEED_DTYPE array of shape (len(xs), seeds) where
+    row i holds exactly the seeds generate_seeds(spritesheet, xs[i], ys[i]) returns, in the same order.
+    '''
+    region_width, region_height, region_definitions, seeds_per_region, (rng_seed_a, rng_seed_b, rng_seed_c) = _get_seed_settings()
+    xs = np.atleast_1d(np.asarray(xs, dtype=np.int64))
+    ys = np.atleast_1d(np.asarray(ys, dtype=np.int64))
+    xs = xs - xs % region_width
+    ys = ys - ys % region_height
+
+    weights = np.array([definition[1] for definition in region_definitions], dtype=np.float64)
+    remapped_regions = np.array([spritesheet.get_index(definition[0]) for definition in region_definitions], dtype=np.float64)
+
+    lcg = LCG()
+
+    # Region corners of the 5x5 neighbourhood, shaped (positions, 5)
+    offsets = np.arange(-2, 3, dtype=np.int64)
+    yy = ys[:, np.newaxis] + offsets * region_height
+    xx = xs[:, np.newaxis] + offsets * region_width
+
+    y_seed = lcg.random_states_block(lcg.seed_states(yy + rng_seed_a), 1)[0][..., 0] * float(0x7fffffff)
+    x_seed = lcg.random_states_block(lcg.seed_states(xx + rng_seed_b), 1)[0][..., 0] * float(0x7fffffff)
+    combined_seed = y_seed.astype(np.int64)[:, :, np.newaxis] ^ x_seed.astype(np.int64)[:, np.newaxis, :] ^ int(rng_seed_c)
+
+    # Every seed draws a region choice, an x and a y, in that order. Shapes are (positions, dy, dx, seed), which
+    # matches the loop order of generate_seeds
+    values, _ = lcg.random_states_block(lcg.seed_states(combined_seed), 3 * seeds_per_region)
+    choice = (values[..., 0::3] * len(region_definitions)).astype(np.int64)
+
+    seeds = np.empty(choice.shape, dtype=SEED_DTYPE)
+    seeds['x'] = values[..., 1::3] * float(region_width) + xx[:, np.newaxis, :, np.newaxis].astype(np.float64)
+    seeds['y'] = values[..., 2::3] * float(region_height) + yy[:, :, np.newaxis, np.newaxis].astype(np.float64)
+    seeds['weight'] = weights[choice]
+    seeds['value'] = remapped_regions[choice]
+
+    return seeds.reshape(len(xs), -1)
+
+
+def generate_seed_tables(spritesheet, origins):
+    '''Seeds for each (x, y) in origins as one (len(origins), seeds, 4) float64 array of (x, y, weight, value) rows.'''
+    origins = np.asarray(origins, dtype=np.int64).reshape(-1, 2)
+    return structured_to_unstructured(generate_seeds_array(spritesheet, origins[:, 0], origins[:, 1]))
+
+
 def fill_chunk(seeds, x, y, size, noise):
     return noisy_voronoi(noise, seeds, x, y, size, size, noise_multiplier=1)
+
+
+def fill_chunks(seed_tables, origins, size, noise, resources=None, backend=None):
+    return noisy_voronoi_batch(noise, seed_tables, origins, size, size, noise_multiplier=1, backend=backend, resources=resources)
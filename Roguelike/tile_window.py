@@ -0,0 +1,201 @@
+from draw_settings import show_grid_lines, show_chunk_lines, draw_scope_names
+from gpu_shader import get_shader, RENDER
+from gpu_texture import Texture
+from gpu_vertex_array import VertexArray
+from gpu_vertex_buffer import get_unit_quad
+from terrain_chunk import TerrainChunk
+import gpu
+import math
+import profiler
+
+
+def _split_wrapped(start, end, period):
+    '''Split the range start <= i < end into pieces that do not cross a multiple of period, as (start, end) pairs.'''
+    pieces = []
+    while start < end:
+        piece_end = min(end, start - start % period + period)
+        pieces.append((start, piece_end))
+        start = piece_end
+    return pieces
+
+
+class TileWindow:
+    '''
+    The tile indices of every rendered layer around the camera, kept in one texture per layer that wraps around in both
+    directions: world tile (x, y) lives at texel (x mod width, y mod height). The window covers the display plus margin
+    tiles on every side and only moves once the display would leave it, and then only the rows and columns that came
+    into the window are uploaded. Each layer is drawn in one pass over the whole display, however many chunks are
+    visible.
+    '''
+
+    def __init__(self, world, margin=16):
+        self.world = world
+        self.margin = margin
+        self.textures = {}
+        self.tile_size = None
+        self.window_size = None      # (width, height) in tiles
+        self.window_origin = None    # World tile at texel (window_origin mod window_size)
+        self.pending_origins = set() # Chunks in the window that were not resident when their tiles were uploaded
+        self.changed_tiles = []      # (layer_type, world_x, world_y) changed since the last render
+        self.vertex_array = None
+        world.add_tile_change_listener(self.on_tile_changed)
+
+    def cleanup(self):
+        self._release()
+        self.world.remove_tile_change_listener(self.on_tile_changed)
+
+    def _release(self):
+        for texture in self.textures.values():
+            texture.cleanup()
+        self.textures = {}
+        if self.vertex_array is not None:
+            self.vertex_array.cleanup()
+            self.vertex_array = None
+        self.window_size = None
+        self.window_origin = None
+
+    def invalidate(self):
+        '''Upload the whole window again on the next render, e.g. after the spritesheets changed.'''
+        self.window_origin = None
+        self.changed_tiles = []
+
+    def on_tile_changed(self, layer_type, world_x, world_y):
+        # Nothing to keep up to date until the window has been uploaded
+        if self.window_origin is not None:
+            self.changed_tiles.append((layer_type, world_x, world_y))
+
+    def render(self, display, center_x, center_y):
+        '''Draw the terrain layers with (center_x, center_y) at the center of the display.'''
+        spritesheets = self.world.get_spritesheets()
+        tile_width = spritesheets[self.world.render_order[0]].tile_width
+        tile_height = spritesheets[self.world.render_order[0]].tile_height
+        display_width, display_height = display.get_width(), display.get_height()
+
+        # World pixel at the bottom left corner of the display, matching where TerrainChunk.render puts chunks
+        offset_x = math.floor(center_x * tile_width - (display_width - tile_width) / 2)
+        offset_y = math.floor(center_y * tile_height - (display_height - tile_height) / 2)
+        visible_x0, visible_y0 = offset_x // tile_width, offset_y // tile_height
+        visible_x1, visible_y1 = (offset_x + display_width - 1) // tile_width + 1, (offset_y + display_height - 1) // tile_height + 1
+
+        window_size = (display_width // tile_width + 2 + 2 * self.margin, display_height // tile_height + 2 + 2 * self.margin)
+        if window_size != self.window_size or (tile_width, tile_height) != self.tile_size:
+            self._allocate(window_size)
+            self.tile_size = (tile_width, tile_height)
+
+        with profiler.scope('texture_upload'):
+            if self.window_origin is None:
+                self._move_window(visible_x0 - self.margin, visible_y0 - self.margin)
+            else:
+                window_x, window_y = self.window_origin
+                width, height = self.window_size
+                if visible_x0 < window_x or visible_y0 < window_y or visible_x1 > window_x + width or visible_y1 > window_y + height:
+                    self._move_window(visible_x0 - self.margin, visible_y0 - self.margin)
+            self._upload_pending()
+
+        self._draw(display, spritesheets, offset_x, offset_y)
+
+    def _allocate(self, window_size):
+        self._release()
+        width, height = window_size
+        self.window_size = window_size
+        self.window_origin = None
+        for layer_type in self.world.render_order:
+            self.textures[layer_type] = Texture({'type': 'empty', 'width': width, 'height': height, 'data_format': 'R'},
+                                                min_filter='nearest', mag_filter='nearest')
+
+    def _move_window(self, window_x, window_y):
+        width, height = self.window_size
+        previous_origin = self.window_origin
+        self.window_origin = (window_x, window_y)
+        if previous_origin is None or abs(window_x - previous_origin[0]) >= width or abs(window_y - previous_origin[1]) >= height:
+            self.pending_origins = set()
+            self.changed_tiles = []
+            self._upload(window_x, window_y, window_x + width, window_y + height)
+            return
+
+        # Columns that came into the window, over its full height
+        previous_x, previous_y = previous_origin
+        if window_x > previous_x:
+            self._upload(previous_x + width, window_y, window_x + width, window_y + height)
+        elif window_x < previous_x:
+            self._upload(window_x, window_y, previous_x, window_y + height)
+
+        # Rows that came into the window, over the columns that were already in it
+        left, right = max(window_x, previous_x), min(window_x, previous_x) + width
+        if window_y > previous_y:
+            self._upload(left, previous_y + height, right, window_y + height)
+        elif window_y < previous_y:
+            self._upload(left, window_y, right, previous_y)
+
+    def _upload(self, x0, y0, x1, y1):
+        '''Copy the tiles of the world rectangle x0 <= x < x1, y0 <= y < y1 to their texels.'''
+        if x0 >= x1 or y0 >= y1:
+            return
+        # Checked before the tiles are read, so a chunk that becomes resident in between is uploaded again rather than missed
+        size = self.world.terrain_chunk_size
+        for origin_y in range(y0 - y0 % size, y1, size):
+            for origin_x in range(x0 - x0 % size, x1, size):
+                if not TerrainChunk.is_resident(origin_x, origin_y, size):
+                    self.pending_origins.add((origin_x, origin_y))
+
+        width, height = self.window_size
+        for layer_type, texture in self.textures.items():
+            tiles = self.world.get_tiles(layer_type, x0, y0, x1, y1)
+            for piece_y0, piece_y1 in _split_wrapped(y0, y1, height):
+                for piece_x0, piece_x1 in _split_wrapped(x0, x1, width):
+                    texture.update_region(piece_x0 % width, piece_y0 % height, tiles[piece_y0 - y0:piece_y1 - y0, piece_x0 - x0:piece_x1 - x0])
+
+    def _upload_pending(self):
+        window_x, window_y = self.window_origin
+        width, height = self.window_size
+        size = self.world.terrain_chunk_size
+        for origin_x, origin_y in list(self.pending_origins):
+            x0, y0 = max(origin_x, window_x), max(origin_y, window_y)
+            x1, y1 = min(origin_x + size, window_x + width), min(origin_y + size, window_y + height)
+            if x0 >= x1 or y0 >= y1:
+                self.pending_origins.discard((origin_x, origin_y))
+            elif TerrainChunk.is_resident(origin_x, origin_y, size):
+                self.pending_origins.discard((origin_x, origin_y))
+                self._upload(x0, y0, x1, y1)
+
+        changed_tiles, self.changed_tiles = self.changed_tiles, []
+        for layer_type, world_x, world_y in changed_tiles:
+            texture = self.textures.get(layer_type)
+            if texture is not None and window_x <= world_x < window_x + width and window_y <= world_y < window_y + height:
+                texture.update_region(world_x % width, world_y % height, self.world.get_tiles(layer_type, world_x, world_y, world_x + 1, world_y + 1))
+
+    def _draw(self, display, spritesheets, offset_x, offset_y):
+        window_x, window_y = self.window_origin
+        width, height = self.window_size
+        tile_width, tile_height = self.tile_size
+        chunk_size = self.world.terrain_chunk_size
+
+        shader = get_shader(RENDER, 'tile_window')
+        shader.use()
+        unit_quad = get_unit_quad()
+        if self.vertex_array is None:
+            self.vertex_array = VertexArray(shader, {'in_position': unit_quad})
+        self.vertex_array.bind()
+
+        # Everything is passed relative to the window, so the shader only ever divides non-negative integers
+        shader.set_uniform('view_offset_in_pixels', '2i', offset_x - window_x * tile_width, offset_y - window_y * tile_height)
+        shader.set_uniform('window_dimensions_in_tiles', '2i', width, height)
+        shader.set_uniform('window_origin_in_texels', '2i', window_x % width, window_y % height)
+        shader.set_uniform('window_origin_in_chunk', '2i', window_x % chunk_size, window_y % chunk_size)
+        shader.set_uniform('chunk_size_in_tiles', '1i', chunk_size)
+        shader.set_uniform('tile_dimensions_in_pixels', '2i', tile_width, tile_height)
+        shader.set_uniform('show_grid_lines', '1i', 1 if show_grid_lines.value else 0)
+        shader.set_uniform('show_chunk_lines', '1i', 1 if show_chunk_lines.value else 0)
+
+        for i, layer_type in enumerate(self.world.render_order):
+            spritesheet = spritesheets[layer_type]
+            with profiler.scope(draw_scope_names.get(layer_type, 'draw')):
+                shader.set_uniform('spritesheet', 'sampler2D', spritesheet.texture.texture, 0)
+                shader.set_uniform('tile_indices', 'sampler2D', self.textures[layer_type].texture, 1)
+                shader.set_uniform('spritesheet_dimensions_in_tiles', '2i', *spritesheet.get_dimensions_in_tiles())
+                # Only the layers above the first are blended onto what is below them
+                if i == 1:
+                    gpu.start_blending()
+                shader.render(display, unit_quad)
+        gpu.stop_blending()
+        self.vertex_array.unbind()
@@ -1,102 +1,424 @@
+from chunk_job_queue import ChunkJobQueue
+from chunk_predictor import ChunkPredictor
+from chunk_store import ChunkStore, get_generator_hash
 from constants import *
+from entity_store import EntityStore
+from flow_field import FlowFieldService
+from generator_resources import GeneratorResources
 from native_code import generate_noise
-from terrain_chunk import TerrainChunk
-from terrain_generator import generate_seeds, fill_chunk
+from pathfinding import HierarchicalPathfinder
+from noisy_voronoi import BACKEND_CPU, BACKEND_GPU
+from spatial_hash import SpatialHash
+from terrain_chunk import TerrainChunk, PlaceholderChunk, get_index_dtype
+from terrain_generator import generate_seed_tables, fill_chunks
 import configuration
 import math
 import numpy as np
+import profiler
 import terrain
 
+# Read on every update of the relevant terrain_chunks
+_chunks_per_frame = configuration.Setting('terrain.generation.chunks_per_frame', 2)
+_prefetch_ring = configuration.Setting('terrain.generation.prefetch_ring', 1)
+_active_margin = configuration.Setting('entities.active_margin', 1)
+_per_chunk_terrain = configuration.Setting('debug.rendering.per_chunk_terrain', False)  # Draw every chunk on its own instead of through the TileWindow
+
+
+def get_viewport_size(viewport):
+    '''Width and height in pixels of a viewport, which is either a pygame surface or a (width, height) pair.'''
+    if hasattr(viewport, 'get_width'):
+        return viewport.get_width(), viewport.get_height()
+    return tuple(viewport)
+
 
 class World:
-    def __init__(self, screen, player_position, terrain_chunk_size, spritesheets, render_order):
+    def __init__(self, viewport, player_position, terrain_chunk_size, spritesheets, render_order, backend=None):
+        """
+        viewport is the display surface or just its (width, height) in pixels. spritesheets maps each sprite type to a
+        SpriteSheet, or to a SpriteMap when nothing will be rendered. backend overrides world.generator.backend.
+        """
         self.voronoi_seeds = None
         self.noise = None
+        self.noise_key = None
+        self.generator_resources = GeneratorResources().acquire()
+        self.chunk_store = None
         self.terrain_types = terrain.Terrain(spritesheets[TYPE_TERRAIN])
         self.player_position = player_position
         self.spritesheets = spritesheets
         self.render_order = render_order
         self.terrain_chunk_size = terrain_chunk_size
         self.terrain_chunks = set()  # We need to create an empty set first because calling self.get_relevant_terrain_chunks() needs this to be defined as a set instead of as None
+        self.terrain_chunks_by_origin = {}  # (world_x, world_y) -> terrain_chunk for every chunk in self.terrain_chunks
+
+        # Chunks are generated off the render path: on a worker thread for the CPU backend, or a few per frame for the
+        # GPU backend, which needs the GL context of the main thread
+        self.backend = configuration.get('world.generator.backend', BACKEND_GPU) if backend is None else backend
+        threaded = self.backend == BACKEND_CPU
+        self.chunk_jobs = ChunkJobQueue(self.generate_terrain_chunks, threaded, configuration.get('terrain.generation.batch_size', 4))
+        self.chunk_predictor = ChunkPredictor(lookahead_seconds=configuration.get('terrain.prediction.lookahead_seconds', 2.0),
+                                              steps=configuration.get('terrain.prediction.steps', 8))
+        self.visible_origins = {}
+        self.tile_window = None  # Created by the first render, since it needs a GL context
+
+        initial_capacity = configuration.get('entities.initial_capacity', 1024)
+        self.entity_hash = SpatialHash(configuration.get('entities.spatial_hash.cell_size', 32), terrain_chunk_size, initial_capacity)
+        self.entities = EntityStore(initial_capacity, self.entity_hash)
+
+        self.tile_change_listeners = []
+        self.pathfinder = HierarchicalPathfinder(self, configuration.get('pathfinding.cluster_size', 64),
+                                                 configuration.get('pathfinding.cache.max_bytes', 67108864),
+                                                 configuration.get('pathfinding.max_expansions', 50000))
+        self.add_tile_change_listener(self.pathfinder.on_tile_changed)
+        self.flow_fields = FlowFieldService(self, configuration.get('flow_fields.radius', 128), configuration.get('flow_fields.cache.max_bytes', 67108864))
+        self.add_tile_change_listener(self.flow_fields.on_tile_changed)
 
         self.define_world()
-        self.terrain_chunks = self.get_relevant_terrain_chunks(screen)
+        self.set_terrain_chunks(self.get_relevant_terrain_chunks(viewport, blocking=True))
 
     def cleanup(self):
+        if self.tile_window is not None:
+            self.tile_window.cleanup()
+        self.chunk_jobs.stop()
+        if self.chunk_store is not None:
+            self.chunk_store.stop()
+        self.generator_resources.release()
         TerrainChunk.cleanup_cache()            
 
     def define_world(self):
         rng_seed_noise = configuration.get('world.generator.random.seed.noise', 45)
-        self.noise = generate_noise(1024, 5, 1, rng_seed_noise)
+        noise_size = configuration.get('world.generator.noise.size', 1024)
+
+        # The noise and its GPU texture only change with the noise seed or size
+        noise_key = (rng_seed_noise, noise_size)
+        if self.noise is None or noise_key != self.noise_key:
+            self.noise = generate_noise(noise_size, 5, 1, rng_seed_noise)
+            self.noise_key = noise_key
+        self.generator_resources.set_noise(self.noise, noise_key)
+        self.pathfinder.clear()
+        self.flow_fields.clear()
+
+        # Generated terrain is kept on disk, keyed by everything that affects generation
+        if self.chunk_store is not None:
+            self.chunk_store.stop()
+            self.chunk_store = None
+        if configuration.get('terrain.store.enabled', True):
+            terrain_spritesheet = self.get_spritesheets()[TYPE_TERRAIN]
+            self.chunk_store = ChunkStore(configuration.get('terrain.store.directory', 'ChunkStore'), get_generator_hash(self.noise, terrain_spritesheet, self.backend),
+                                          get_index_dtype(terrain_spritesheet.get_tile_count()))
         
     def get_chunk_values(self, x, y, size):
-        terrain_spritesheet = self.get_spritesheets()[TYPE_TERRAIN]
-        seeds = generate_seeds(terrain_spritesheet, x, y)
-        coverage, _ = fill_chunk(seeds, x, y, size, self.noise)
-        return coverage
+        return self.get_chunk_values_batch([(x, y)], size)[0]
+
+    def get_chunk_values_batch(self, origins, size):
+        """
+        Get the terrain of several chunks at once. origins is a list of (x, y) chunk corners. Chunks found in the chunk
+        store are paged in; the rest are generated in one batch and written to the store in the background.
+        """
+        values = [self.chunk_store.get(x, y, size) if self.chunk_store is not None else None for x, y in origins]
+        missing_origins = [origin for origin, chunk_values in zip(origins, values) if chunk_values is None]
+        if missing_origins:
+            terrain_spritesheet = self.get_spritesheets()[TYPE_TERRAIN]
+            seed_tables = generate_seed_tables(terrain_spritesheet, missing_origins)
+            generated = iter(fill_chunks(seed_tables, missing_origins, size, self.noise, self.generator_resources, self.backend))
+            for i, (x, y) in enumerate(origins):
+                if values[i] is None:
+                    values[i] = next(generated)
+                    if self.chunk_store is not None:
+                        self.chunk_store.put(x, y, size, values[i])
+        return values
+
+    def generate_terrain_chunks(self, origins):
+        """Job function of self.chunk_jobs: generate and build the terrain_chunks at origins without touching the cache."""
+        with profiler.scope('generate_chunks'):
+            values = self.get_chunk_values_batch(origins, self.terrain_chunk_size)
+            return [TerrainChunk(x, y, self.terrain_chunk_size, self, terrain_values) for (x, y), terrain_values in zip(origins, values)]
+
+    def get_generation_statistics(self):
+        statistics = self.chunk_jobs.get_statistics()
+        statistics['prediction'] = self.chunk_predictor.get_statistics()
+        statistics['resources'] = self.generator_resources.get_statistics()
+        statistics['residency'] = TerrainChunk.get_residency_statistics()
+        statistics['pathfinding'] = self.pathfinder.get_statistics()
+        statistics['flow_fields'] = self.flow_fields.get_statistics()
+        statistics['entity_hash'] = self.entity_hash.get_statistics()
+        if self.chunk_store is not None:
+            statistics['store'] = self.chunk_store.get_statistics()
+        return statistics
         
     def set_spritesheets(self, spritesheets):
         self.spritesheets = spritesheets
         self.terrain_types = terrain.Terrain(spritesheets[TYPE_TERRAIN])
+        if self.tile_window is not None:
+            self.tile_window.invalidate()
             
     def get_spritesheets(self):
         return self.spritesheets
 
-    def get_relevant_terrain_chunks(self, screen):
-        """Generate a list of relevant terrain_chunks based on the current player and NPC positions."""
+    def get_relevant_terrain_chunks(self, viewport, blocking=False):
+        """
+        Generate a list of relevant terrain_chunks based on the current player and NPC positions. Unless blocking is set,
+        chunks that are not generated yet are queued and represented by a PlaceholderChunk until they are ready. Ahead
+        of time, the chunks the player is heading towards are generated first, then a ring of
+        terrain.generation.prefetch_ring chunks around the visible ones.
+        """
         new_relevant_terrain_chunks = set()
 
-        terrain_chunk_width = self.terrain_chunk_size * self.spritesheets[TYPE_TERRAIN].tile_width
-        terrain_chunk_height = self.terrain_chunk_size * self.spritesheets[TYPE_TERRAIN].tile_height
+        if not self.chunk_jobs.threaded:
+            self.chunk_jobs.process(_chunks_per_frame.value)
+        self.collect_generated_chunks()
 
         # Find the terrain_chunks relevant to the player's position
-        player_terrain_chunk_x = self.player_position[0] // self.terrain_chunk_size
-        player_terrain_chunk_y = self.player_position[1] // self.terrain_chunk_size
-        for dx in range(-math.floor(screen.get_width() / terrain_chunk_width / 2) - 1, math.ceil(screen.get_width() / terrain_chunk_width / 2) + 1):
-            for dy in range(-math.floor(screen.get_height() / terrain_chunk_height / 2) - 1, math.ceil(screen.get_height() / terrain_chunk_height / 2) + 1):
-                new_relevant_terrain_chunks.add(TerrainChunk.get_or_create((player_terrain_chunk_x + dx) * self.terrain_chunk_size,
-                                                              (player_terrain_chunk_y + dy) * self.terrain_chunk_size,
-                                                              self.terrain_chunk_size,
-                                                              self))
-
-        # TODO: Select terrain_chunks for active creatures
-            
+        visible_origins = self.get_chunk_origins_around(viewport, self.player_position, 0)
+        newly_visible = [origin for origin in visible_origins if origin not in self.visible_origins]
+        self.chunk_predictor.record_visibility(visible_origins, len(newly_visible), sum(1 for origin in newly_visible if TerrainChunk.is_resident(*origin, self.terrain_chunk_size)))
+        self.visible_origins = visible_origins
+
+        if blocking:
+            # Missing chunks are generated together in one batch
+            new_relevant_terrain_chunks.update(TerrainChunk.get_or_create_many(list(visible_origins), self.terrain_chunk_size, self))
+        else:
+            wanted = {}
+            for origin, distance in visible_origins.items():
+                terrain_chunk = TerrainChunk.get_if_resident(*origin, self.terrain_chunk_size)
+                if terrain_chunk is None:
+                    terrain_chunk = PlaceholderChunk(*origin, self.terrain_chunk_size, self)
+                    wanted[origin] = (0, distance)
+                new_relevant_terrain_chunks.add(terrain_chunk)
+
+            # Chunks along the player's heading come next, soonest first. Predictions that no longer hold are left out
+            # of wanted, which cancels them.
+            predictions = self.chunk_predictor.predict(self.player_position, lambda position: self.get_chunk_origins_around(viewport, position, 0))
+            for origin, seconds in predictions.items():
+                if origin not in visible_origins and not TerrainChunk.is_resident(*origin, self.terrain_chunk_size):
+                    wanted[origin] = (1, seconds)
+
+            # Prefetch the ring around the visible chunks at the lowest priority
+            prefetch_ring = _prefetch_ring.value
+            for origin, distance in self.get_chunk_origins_around(viewport, self.player_position, prefetch_ring).items():
+                if origin not in visible_origins and origin not in wanted and not TerrainChunk.is_resident(*origin, self.terrain_chunk_size):
+                    wanted[origin] = (2, distance)
+
+        # Creatures near enough to the player to be simulated keep the chunks they stand on, whether visible or not
+        creature_origins = self.get_active_creature_origins(viewport) - visible_origins.keys()
+        if blocking:
+            new_relevant_terrain_chunks.update(TerrainChunk.get_or_create_many(sorted(creature_origins), self.terrain_chunk_size, self))
+        else:
+            for origin in creature_origins:
+                terrain_chunk = TerrainChunk.get_if_resident(*origin, self.terrain_chunk_size)
+                if terrain_chunk is None:
+                    wanted.setdefault(origin, (2, 0))
+                else:
+                    new_relevant_terrain_chunks.add(terrain_chunk)
+            self.chunk_jobs.update(wanted)
+
         # Mark previous terrain_chunks that are no longer relevant as invalid
         current_terrain_chunks_set = set(self.terrain_chunks)
         for terrain_chunk in current_terrain_chunks_set - new_relevant_terrain_chunks:
             TerrainChunk.mark_as_invalid(terrain_chunk.world_x, terrain_chunk.world_y, terrain_chunk.size)
 
         return new_relevant_terrain_chunks
+
+    def get_active_creature_origins(self, viewport):
+        """The origins of the chunks holding creatures within entities.active_margin chunks of the visible ones."""
+        origins = self.get_chunk_origins_around(viewport, self.player_position, _active_margin.value)
+        xs = [x for x, _ in origins]
+        ys = [y for _, y in origins]
+        ids = self.entity_hash.query_rectangle(min(xs), min(ys), max(xs) + self.terrain_chunk_size, max(ys) + self.terrain_chunk_size)
+        ids = ids[self.entities.type[ids] == TYPE_CREATURE]
+        return self.entity_hash.get_chunk_origins(ids)
+
+    def get_chunk_origins_around(self, viewport, position, margin):
+        """Map the origins of the chunks covering the viewport centered on position, widened by margin chunks on every side, to their distance in chunks from the center chunk."""
+        terrain_chunk_width = self.terrain_chunk_size * self.spritesheets[TYPE_TERRAIN].tile_width
+        terrain_chunk_height = self.terrain_chunk_size * self.spritesheets[TYPE_TERRAIN].tile_height
+
+        player_terrain_chunk_x = position[0] // self.terrain_chunk_size
+        player_terrain_chunk_y = position[1] // self.terrain_chunk_size
+        origins = {}
+        viewport_width, viewport_height = get_viewport_size(viewport)
+        for dx in range(-math.floor(viewport_width / terrain_chunk_width / 2) - 1 - margin, math.ceil(viewport_width / terrain_chunk_width / 2) + 1 + margin):
+            for dy in range(-math.floor(viewport_height / terrain_chunk_height / 2) - 1 - margin, math.ceil(viewport_height / terrain_chunk_height / 2) + 1 + margin):
+                origins[((player_terrain_chunk_x + dx) * self.terrain_chunk_size, (player_terrain_chunk_y + dy) * self.terrain_chunk_size)] = max(abs(dx), abs(dy))
+        return origins
+
+    def collect_generated_chunks(self):
+        """Move the chunks finished by self.chunk_jobs into the cache. They only become valid once they are visible."""
+        for _, terrain_chunk in self.chunk_jobs.collect():
+            TerrainChunk.insert_generated(terrain_chunk, valid=False)
      
-    def update_positions(self, screen, new_player_position):
+    def update_positions(self, viewport, new_player_position, blocking=False):
         """
         Update the player's and NPCs' positions, and refresh the list of relevant terrain_chunks.
         """
-        self.player_position = new_player_position
-        self.terrain_chunks = self.get_relevant_terrain_chunks(screen)
+        with profiler.scope('update_positions'):
+            self.player_position = new_player_position
+            self.chunk_predictor.observe(new_player_position)
+            self.set_terrain_chunks(self.get_relevant_terrain_chunks(viewport, blocking))
+
+    def has_pending_work(self):
+        """Whether chunks are still being generated, so that updating the relevant terrain_chunks may change them."""
+        return self.chunk_jobs.has_work()
+
+    def set_terrain_chunks(self, terrain_chunks):
+        self.terrain_chunks = terrain_chunks
+        self.terrain_chunks_by_origin = {(terrain_chunk.world_x, terrain_chunk.world_y): terrain_chunk for terrain_chunk in terrain_chunks}
+
+    def get_terrain_chunk_at(self, world_x, world_y):
+        """The relevant terrain_chunk that contains a position, or None."""
+        return self.terrain_chunks_by_origin.get((world_x - world_x % self.terrain_chunk_size, world_y - world_y % self.terrain_chunk_size))
         
-    def render(self, display, center_x, center_y):
-        # Render terrain_chunks
-        for terrain_chunk in self.terrain_chunks:
-            terrain_chunk.render(display, center_x, center_y)
+    def render(self, display, center_x, center_y, player_position=None):
+        """Draw the world with (center_x, center_y) at the center of the display. player_position may be fractional to draw the player between tiles."""
+        # Render terrain, one pass per layer for everything on the display
+        if _per_chunk_terrain.value:
+            if self.tile_window is not None:
+                # Its textures and queued tile changes would only go stale
+                self.tile_window.cleanup()
+                self.tile_window = None
+            for terrain_chunk in self.terrain_chunks:
+                terrain_chunk.render(display, center_x, center_y)
+        else:
+            if self.tile_window is None:
+                from tile_window import TileWindow
+                self.tile_window = TileWindow(self, configuration.get('terrain.rendering.window_margin', 16))
+            self.tile_window.render(display, center_x, center_y)
+
+        # Render items, then creatures on top of them, culled to the screen
+        with profiler.scope('draw.entities'):
+            for entity_type in (TYPE_ITEM, TYPE_CREATURE):
+                spritesheet = self.get_spritesheets()[entity_type]
+                half_width = display.get_width() / spritesheet.tile_width / 2 + 1
+                half_height = display.get_height() / spritesheet.tile_height / 2 + 1
+                ids = self.entities.get_ids_in_rectangle(math.floor(center_x - half_width), math.floor(center_y - half_height),
+                                                         math.ceil(center_x + half_width), math.ceil(center_y + half_height), entity_type)
+                if len(ids) > 0:
+                    spritesheet.render(display, self.entities.get_sprite_parameters(ids), center_x, center_y)
             
-        # Render player
+        # Render player. Sprite positions are whole tiles, so a fractional position shifts the camera instead
+        player_x, player_y = self.player_position if player_position is None else player_position
         sprite_parameters = []
         avatar_id = 0
-        sprite_parameters.append(self.player_position[0])
-        sprite_parameters.append(self.player_position[1])
+        sprite_parameters.append(math.floor(player_x))
+        sprite_parameters.append(math.floor(player_y))
         sprite_parameters.append(avatar_id)
         avatar_spritesheet = self.get_spritesheets()[TYPE_AVATAR]
-        avatar_spritesheet.render(display, np.array(sprite_parameters, dtype=np.int32), center_x, center_y)
+        avatar_spritesheet.render(display, np.array(sprite_parameters, dtype=np.int32), center_x - (player_x - math.floor(player_x)), center_y - (player_y - math.floor(player_y)))
         
+    def get_tiles(self, layer_type, x0, y0, x1, y1, generate_missing=False):
+        """
+        Tile indices of a layer for the world rectangle x0 <= x < x1, y0 <= y < y1 as an array indexed [y, x]. When the
+        rectangle lies in a single resident chunk, the result is a read-only view of that chunk's storage. Otherwise it
+        is stitched from every resident chunk it overlaps; tiles of chunks that are not resident are -1 unless
+        generate_missing is set, in which case those chunks are generated in one batch.
+        """
+        dtype = get_index_dtype(self.spritesheets[layer_type].get_tile_count())
+        return self._stitch_chunk_arrays(lambda terrain_chunk: terrain_chunk.get_layer_indices(layer_type), x0, y0, x1, y1, -1, dtype, generate_missing)
+
+    def get_passability(self, x0, y0, x1, y1, generate_missing=False):
+        """Like get_tiles, but for the passability bitmaps. Tiles of chunks that are not resident are impassable."""
+        return self._stitch_chunk_arrays(lambda terrain_chunk: terrain_chunk.passable, x0, y0, x1, y1, False, bool, generate_missing)
+
+    def is_area_resident(self, x0, y0, x1, y1):
+        """Whether every chunk overlapping the world rectangle x0 <= x < x1, y0 <= y < y1 has been generated."""
+        return all(TerrainChunk.is_resident(*origin, self.terrain_chunk_size) for origin in self._get_origins_in_rectangle(x0, y0, x1, y1))
+
+    def _get_origins_in_rectangle(self, x0, y0, x1, y1):
+        size = self.terrain_chunk_size
+        return [(origin_x, origin_y)
+                for origin_y in range(y0 - y0 % size, y1, size)
+                for origin_x in range(x0 - x0 % size, x1, size)]
+
+    def _stitch_chunk_arrays(self, get_array, x0, y0, x1, y1, fill_value, dtype, generate_missing):
+        # get_array(terrain_chunk) returns a (size, size) array indexed [y, x], or None
+        size = self.terrain_chunk_size
+        origins = self._get_origins_in_rectangle(x0, y0, x1, y1)
+        terrain_chunks = {origin: TerrainChunk.peek_resident(*origin, size) for origin in origins}
+
+        if generate_missing:
+            missing_origins = [origin for origin, terrain_chunk in terrain_chunks.items() if terrain_chunk is None]
+            if missing_origins:
+                for origin, terrain_chunk in zip(missing_origins, TerrainChunk.get_or_create_many(missing_origins, size, self)):
+                    terrain_chunks[origin] = terrain_chunk
+                    # Chunks made for a query stay evictable unless they are on screen
+                    if origin not in self.visible_origins:
+                        TerrainChunk.mark_as_invalid(*origin, size)
+
+        if len(origins) == 1 and terrain_chunks[origins[0]] is not None:
+            origin_x, origin_y = origins[0]
+            array = get_array(terrain_chunks[origins[0]])
+            if array is not None:
+                # Read-only, so that tiles can only be changed through the chunk and reach the tile change listeners
+                view = array[y0 - origin_y:y1 - origin_y, x0 - origin_x:x1 - origin_x]
+                view.flags.writeable = False
+                return view
+
+        stitched = np.full((max(0, y1 - y0), max(0, x1 - x0)), fill_value, dtype=dtype)
+        for (origin_x, origin_y), terrain_chunk in terrain_chunks.items():
+            array = get_array(terrain_chunk) if terrain_chunk is not None else None
+            if array is None:
+                continue
+            left, top = max(x0, origin_x), max(y0, origin_y)
+            right, bottom = min(x1, origin_x + size), min(y1, origin_y + size)
+            stitched[top - y0:bottom - y0, left - x0:right - x0] = array[top - origin_y:bottom - origin_y, left - origin_x:right - origin_x]
+        return stitched
+
+    def find_path(self, start, goal):
+        """A list of (x, y) tiles from start to goal through resident terrain, or None. See HierarchicalPathfinder."""
+        return self.pathfinder.find_path(start, goal)
+
+    def get_flow_field(self, goal):
+        """The FlowField that leads everything within flow_fields.radius tiles of goal towards it."""
+        return self.flow_fields.get_field(goal)
+
+    def add_tile_change_listener(self, listener):
+        """listener(layer_type, world_x, world_y) is called whenever a tile of a chunk is changed."""
+        self.tile_change_listeners.append(listener)
+
+    def remove_tile_change_listener(self, listener):
+        if listener in self.tile_change_listeners:
+            self.tile_change_listeners.remove(listener)
+
+    def notify_tile_changed(self, layer_type, world_x, world_y):
+        for listener in self.tile_change_listeners:
+            listener(layer_type, world_x, world_y)
+
     def is_passable_at(self, world_x, world_y):
-        for terrain_chunk in self.terrain_chunks:
-            if terrain_chunk.contains_position(world_x, world_y):
-                terrain_index = terrain_chunk.get_layer_index_at(TYPE_TERRAIN, world_x, world_y)
-                if not self.terrain_types.is_passable(terrain_index):
-                    return False
-            
-        return True
+        terrain_chunk = self.get_terrain_chunk_at(world_x, world_y)
+        return terrain_chunk is None or terrain_chunk.is_passable_at(world_x, world_y)
+
+    def are_passable(self, world_xs, world_ys):
+        '''Vectorized is_passable_at for arrays of world coordinates.'''
+        world_xs = np.asarray(world_xs, dtype=np.int64)
+        world_ys = np.asarray(world_ys, dtype=np.int64)
+        shape = world_xs.shape
+        world_xs = world_xs.ravel()
+        world_ys = world_ys.ravel()
+        passable = np.ones(len(world_xs), dtype=bool)
+        if len(world_xs) == 0:
+            return passable.reshape(shape)
+        size = self.terrain_chunk_size
+        chunk_xs = world_xs // size
+        chunk_ys = world_ys // size
+
+        # One integer key per chunk, sorted once so that the positions of each chunk form a contiguous run
+        min_chunk_x, min_chunk_y = chunk_xs.min(), chunk_ys.min()
+        keys = (chunk_ys - min_chunk_y) * (chunk_xs.max() - min_chunk_x + 1) + (chunk_xs - min_chunk_x)
+        if keys[0] == keys.min() == keys.max():
+            order = np.arange(len(keys))
+            run_starts = np.zeros(1, dtype=np.int64)
+        else:
+            order = np.argsort(keys)
+            run_starts = np.concatenate(([0], np.flatnonzero(np.diff(keys[order])) + 1))
+        run_ends = np.append(run_starts[1:], len(order))
+
+        for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+            first = order[start]
+            origin_x, origin_y = int(chunk_xs[first]) * size, int(chunk_ys[first]) * size
+            terrain_chunk = self.terrain_chunks_by_origin.get((origin_x, origin_y))
+            if terrain_chunk is not None:
+                positions = order[start:end]
+                passable[positions] = terrain_chunk.are_passable(world_xs[positions], world_ys[positions])
+        return passable.reshape(shape)
 
         
         
\ No newline at end of file